@@ -0,0 +1,251 @@
+"""
+Benchmarks for the loading, rendering and export paths of slackviewer,
+run against a synthetic export (see benchmarks/synthetic.py).
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --compare results.json
+
+Results are written as JSON. With --compare, every benchmark whose best time
+is more than --threshold slower than in the given earlier run is reported as
+a regression and the command exits with status 1.
+"""
+
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from datetime import datetime
+
+import click
+
+from benchmarks.synthetic import DEFAULTS, generate_export
+
+
+def _config(archive, **kwargs):
+    from slackviewer.config import Config
+
+    config = {
+        "archive": archive,
+        "show_dms": True,
+        "thread_note": True,
+        "skip_channel_member_change": False,
+        "since": None,
+        "no_sidebar": False,
+        "no_external_references": False,
+        "debug": False,
+    }
+    config.update(kwargs)
+    return Config(config)
+
+
+def _measure(func, repeat, setup=None):
+    """Runs func repeat times and returns the timings in seconds"""
+    timings = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        func(arg)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _use_temp_paths(workdir):
+    """
+    Points the temporary paths of slackviewer (extractions, the fingerprint
+    cache, compiled templates) into workdir, so the cache of the user is
+    neither used nor touched
+    """
+    from slackviewer import archive, cli, constants, templating
+
+    temp_path = os.path.join(workdir, "_slackviewer")
+    for module in (constants, archive, cli):
+        module.SLACKVIEWER_TEMP_PATH = temp_path
+    # outside of temp_path, which is removed between the extraction runs
+    templating.JINJA_CACHE_PATH = os.path.join(workdir, "jinja_cache")
+    return temp_path
+
+
+def run_benchmarks(workdir, params, repeat):
+    from slackviewer import archive
+    from slackviewer.utils.timing import timer
+
+    temp_path = _use_temp_paths(workdir)
+
+    zip_path = os.path.join(workdir, "synthetic.zip")
+    generate_export(zip_path, **params)
+
+    results = {}
+
+    def record(name, timings, **extra):
+        results[name] = dict(
+            best_s=min(timings),
+            mean_s=statistics.mean(timings),
+            runs=len(timings),
+            **extra
+        )
+        print(f"  {name:<20} best {min(timings):9.4f}s  mean {statistics.mean(timings):9.4f}s")
+
+    def clean_extraction():
+        shutil.rmtree(temp_path, ignore_errors=True)
+
+    record("extract_archive", _measure(lambda _: archive.extract_archive(zip_path), repeat, clean_extraction))
+    extracted = archive.extract_archive(zip_path)
+
+    from slackviewer.reader import Reader
+
+    config = _config(extracted)
+
+    # compile_channels, with the JSON parsing and thread building phases
+    # taken from the timing report of the same runs
+    phases = {}
+    compile_timings = []
+    for _ in range(repeat):
+        timer.reset()
+        timer.enable()
+        start = time.perf_counter()
+        channels = Reader(config).compile_channels()
+        compile_timings.append(time.perf_counter() - start)
+        for phase in timer.report()["phases"]:
+            phases.setdefault(phase["name"], []).append(phase["wall_s"])
+    timer.reset()
+    message_count = sum(len(m) for m in channels.values())
+    record("compile_channels", compile_timings, messages=message_count)
+    record("parse_day_files", phases["parse_day_files"])
+    record("build_threads", phases["build_threads"])
+
+    # SlackFormatter.render_text over every message text
+    messages = [m for msgs in channels.values() for m in msgs]
+    formatter = messages[0]._formatter if messages else None
+    texts = [m._message.get("text", "") for m in messages]
+    record("render_text", _measure(lambda _: [formatter.render_text(t) for t in texts], repeat), messages=len(texts))
+
+    # Flask page render of every channel
+    import flask
+    from slackviewer.app import app
+    from slackviewer.main import configure_app
+    from slackviewer.utils.page_cache import page_cache
+
+    configure_app(app, config)
+    client = app.test_client()
+    names = list(flask._app_ctx_stack.channels)
+
+    def render_pages(_):
+        for name in names:
+            response = client.get(f"/channel/{name}/")
+            assert response.status_code == 200
+
+    # pages are cached after their first render (not in debug mode), every
+    # run starts without them so the rendering itself is timed
+    record("flask_render", _measure(render_pages, repeat, page_cache.clear), pages=len(names))
+    render_pages(None)
+    record("flask_render_cached", _measure(render_pages, repeat), pages=len(names))
+
+    # freeze of the whole app
+    from slackviewer.freezer import CustomFreezer
+
+    app.config["FREEZER_RELATIVE_URLS"] = True
+    freezer = CustomFreezer(app)
+    freezer.cf_output_dir = os.path.join(workdir, "html_output")
+
+    @freezer.register_generator
+    def channel_name():
+        for channel in flask._app_ctx_stack.channels:
+            yield {"name": channel}
+
+    record("freeze", _measure(lambda _: freezer.freeze(), repeat, page_cache.clear))
+
+    # cli export, in-process to exclude the interpreter start up
+    from click.testing import CliRunner
+    from slackviewer.cli import cli
+
+    runner = CliRunner()
+    export_dir = os.path.join(workdir, "export")
+    os.makedirs(export_dir)
+
+    def export(_):
+        cwd = os.getcwd()
+        os.chdir(export_dir)
+        try:
+            result = runner.invoke(cli, ["export", "--show-dms", extracted])
+            assert result.exit_code == 0, result.output
+        finally:
+            os.chdir(cwd)
+
+    record("cli_export", _measure(export, repeat))
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Returns the benchmarks that got slower than baseline by more than threshold"""
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            continue
+        ratio = result["best_s"] / old["best_s"] if old["best_s"] else 1.0
+        marker = ""
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            marker = "  <-- REGRESSION"
+        print(f"  {name:<20} {old['best_s']:9.4f}s -> {result['best_s']:9.4f}s ({ratio:5.2f}x){marker}")
+    return regressions
+
+
+@click.command(help="Runs the slackviewer benchmarks against a synthetic export")
+@click.option("--channels", default=DEFAULTS["channels"], type=click.INT, show_default=True)
+@click.option("--days", default=DEFAULTS["days"], type=click.INT, show_default=True)
+@click.option("--messages-per-day", default=DEFAULTS["messages_per_day"], type=click.INT, show_default=True)
+@click.option("--users", default=DEFAULTS["users"], type=click.INT, show_default=True)
+@click.option("--thread-ratio", default=DEFAULTS["thread_ratio"], type=click.FLOAT, show_default=True)
+@click.option("--reaction-ratio", default=DEFAULTS["reaction_ratio"], type=click.FLOAT, show_default=True)
+@click.option("--file-ratio", default=DEFAULTS["file_ratio"], type=click.FLOAT, show_default=True)
+@click.option("--block-ratio", default=DEFAULTS["block_ratio"], type=click.FLOAT, show_default=True)
+@click.option("--seed", default=DEFAULTS["seed"], type=click.INT, show_default=True)
+@click.option("--repeat", default=3, type=click.IntRange(min=1), show_default=True, help="Runs per benchmark")
+@click.option("-o", "--output", default=None, type=click.Path(dir_okay=False), help="Write the results to this JSON file")
+@click.option("--compare", "baseline", default=None, type=click.File("r"), help="Compare with the results of an earlier run")
+@click.option("--threshold", default=0.2, type=click.FLOAT, show_default=True, help="Allowed slowdown with --compare")
+def main(repeat, output, baseline, threshold, **params):
+    workdir = tempfile.mkdtemp(prefix="slackviewer-bench-")
+    try:
+        print(f"Running benchmarks with {params}")
+        results = run_benchmarks(workdir, params, repeat)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    from slackviewer import __version__
+
+    report = {
+        "meta": {
+            "date": datetime.now().isoformat(),
+            "slackviewer": __version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "params": params,
+        },
+        "results": results,
+    }
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {output}")
+
+    if baseline:
+        baseline = json.load(baseline)
+        if baseline.get("meta", {}).get("params") != params:
+            print("WARNING: the baseline was run with different parameters")
+        regressions = compare(results, baseline, threshold)
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
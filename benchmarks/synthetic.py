@@ -0,0 +1,274 @@
+"""
+Generator for synthetic Slack exports of configurable size.
+
+The output uses the layout of the official Slack export (users.json,
+channels.json, dms.json, mpims.json and one <conversation>/<date>.json file
+per day) and can be written as a directory or a zip file.
+
+    python -m benchmarks.synthetic --channels 20 --days 30 --messages-per-day 200 /tmp/synthetic.zip
+"""
+
+import datetime
+import json
+import os
+import random
+import shutil
+import tempfile
+import zipfile
+
+import click
+
+
+DEFAULTS = {
+    "channels": 5,
+    "days": 10,
+    "messages_per_day": 50,
+    "users": 20,
+    "dms": 2,
+    "mpims": 1,
+    "thread_ratio": 0.1,
+    "replies_per_thread": 3,
+    "reaction_ratio": 0.2,
+    "file_ratio": 0.05,
+    "block_ratio": 0.3,
+    "seed": 42,
+}
+
+_START = datetime.datetime(2020, 1, 1, 9, 0, tzinfo=datetime.timezone.utc)
+
+_WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua deploy release build review "
+    "meeting ticket coffee lunch"
+).split()
+
+_EMOJI = ["smile", "thumbsup", "tada", "eyes", "white_check_mark", "simple_smile", "woman-shrugging"]
+
+
+def generate_export(path, **params):
+    """
+    Writes a synthetic export to path. If path ends with .zip a zip file
+    is written, otherwise a directory.
+
+    :param params: overrides of DEFAULTS
+
+    :return: the used parameters
+    """
+    unknown = set(params) - set(DEFAULTS)
+    if unknown:
+        raise TypeError(f"Unknown parameters: {', '.join(sorted(unknown))}")
+    p = dict(DEFAULTS, **params)
+
+    if path.endswith(".zip"):
+        tmp = tempfile.mkdtemp()
+        try:
+            _write_export(tmp, p)
+            with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+                for root, dirs, files in os.walk(tmp):
+                    dirs.sort()
+                    for name in sorted(files):
+                        full = os.path.join(root, name)
+                        z.write(full, os.path.relpath(full, tmp))
+        finally:
+            shutil.rmtree(tmp)
+    else:
+        _write_export(path, p)
+
+    return p
+
+
+def _write_export(root, p):
+    rnd = random.Random(p["seed"])
+    os.makedirs(root, exist_ok=True)
+
+    users = [_user(i) for i in range(p["users"])]
+    user_ids = [u["id"] for u in users]
+    _dump(os.path.join(root, "users.json"), users)
+
+    channels = [
+        {"id": f"C{i:08d}", "name": f"channel-{i}", "created": int(_START.timestamp()),
+         "members": rnd.sample(user_ids, min(len(user_ids), 5))}
+        for i in range(p["channels"])
+    ]
+    _dump(os.path.join(root, "channels.json"), channels)
+
+    dms = [
+        {"id": f"D{i:08d}", "members": rnd.sample(user_ids, min(len(user_ids), 2))}
+        for i in range(p["dms"])
+    ]
+    _dump(os.path.join(root, "dms.json"), dms)
+
+    mpims = []
+    for i in range(p["mpims"]):
+        members = rnd.sample(user_ids, min(len(user_ids), 3))
+        mpims.append({"id": f"G{i:08d}", "name": f"mpdm-{'--'.join(members).lower()}-{i}", "members": members})
+    _dump(os.path.join(root, "mpims.json"), mpims)
+
+    conversations = [(c["name"], c["members"]) for c in channels]
+    conversations += [(d["id"], d["members"]) for d in dms]
+    conversations += [(m["name"], m["members"]) for m in mpims]
+
+    for name, members in conversations:
+        os.makedirs(os.path.join(root, name))
+        for day in range(p["days"]):
+            date = _START + datetime.timedelta(days=day)
+            messages = _day_messages(rnd, p, date, members, user_ids, channels)
+            _dump(os.path.join(root, name, date.strftime("%Y-%m-%d.json")), messages)
+
+
+def _day_messages(rnd, p, date, members, user_ids, channels):
+    messages = []
+    # spread the messages over ten hours of the day
+    step = 36000.0 / max(p["messages_per_day"], 1)
+    base = date.timestamp()
+    count = 0
+    while count < p["messages_per_day"]:
+        ts = base + count * step
+        msg = _message(rnd, p, ts, rnd.choice(members), user_ids, channels)
+        messages.append(msg)
+        count += 1
+
+        if rnd.random() < p["thread_ratio"]:
+            replies = []
+            for r in range(min(p["replies_per_thread"], p["messages_per_day"] - count)):
+                reply_ts = ts + (r + 1) * step / (p["replies_per_thread"] + 1)
+                reply = _message(rnd, p, reply_ts, rnd.choice(members), user_ids, channels)
+                reply["thread_ts"] = msg["ts"]
+                reply["parent_user_id"] = msg["user"]
+                replies.append({"user": reply["user"], "ts": reply["ts"]})
+                messages.append(reply)
+                count += 1
+            if replies:
+                msg["thread_ts"] = msg["ts"]
+                msg["reply_count"] = len(replies)
+                msg["replies"] = replies
+
+    # the exports are not guaranteed to be sorted
+    rnd.shuffle(messages)
+    return messages
+
+
+def _message(rnd, p, ts, user, user_ids, channels):
+    words = rnd.sample(_WORDS, rnd.randint(3, 12))
+    if rnd.random() < 0.3:
+        words.insert(rnd.randrange(len(words)), f"<@{rnd.choice(user_ids)}>")
+    if rnd.random() < 0.2:
+        words.insert(rnd.randrange(len(words)), f":{rnd.choice(_EMOJI)}:")
+    if rnd.random() < 0.1:
+        words.insert(rnd.randrange(len(words)), "<https://example.com/page|a link>")
+    if rnd.random() < 0.1:
+        words.insert(0, "*important*")
+
+    msg = {
+        "type": "message",
+        "user": user,
+        "text": " ".join(words),
+        "ts": f"{ts:.6f}",
+    }
+
+    if rnd.random() < p["block_ratio"]:
+        msg["blocks"] = _blocks(rnd, words, user_ids, channels)
+    if rnd.random() < p["reaction_ratio"]:
+        msg["reactions"] = [
+            {"name": rnd.choice(_EMOJI), "users": rnd.sample(user_ids, min(len(user_ids), 2)), "count": 2}
+        ]
+    if rnd.random() < p["file_ratio"]:
+        msg["files"] = [_file(rnd, ts, user)]
+    return msg
+
+
+def _blocks(rnd, words, user_ids, channels):
+    section = [{"type": "text", "text": " ".join(words[:3]) + " "}]
+    section.append({"type": "text", "text": words[-1], "style": {"bold": True}})
+    section.append({"type": "user", "user_id": rnd.choice(user_ids)})
+    section.append({"type": "emoji", "name": rnd.choice(_EMOJI), "unicode": "1f604"})
+    section.append({"type": "link", "url": "https://example.com/some_page", "text": "some_page"})
+    elements = [{"type": "rich_text_section", "elements": section}]
+    if rnd.random() < 0.3:
+        elements.append({
+            "type": "rich_text_list", "style": rnd.choice(["bullet", "ordered"]),
+            "elements": [{"type": "rich_text_section", "elements": [{"type": "text", "text": w}]} for w in words[:3]],
+        })
+    if rnd.random() < 0.2:
+        elements.append({"type": "rich_text_preformatted", "elements": [{"type": "text", "text": "snake_case_code()"}]})
+    if rnd.random() < 0.2:
+        elements.append({"type": "rich_text_quote", "elements": [{"type": "text", "text": " ".join(words)}]})
+    blocks = [{"type": "rich_text", "block_id": "b1", "elements": elements}]
+    if rnd.random() < 0.1:
+        blocks.append({"type": "section", "text": {"type": "mrkdwn", "text": " ".join(words)}})
+        blocks.append({"type": "context", "elements": [{"type": "mrkdwn", "text": "context"}]})
+        blocks.append({"type": "divider"})
+    return blocks
+
+
+def _file(rnd, ts, user):
+    file_id = f"F{int(ts * 1000) % 10 ** 10:010d}"
+    size = rnd.randint(10 ** 3, 10 ** 7)
+    is_image = rnd.random() < 0.6
+    name = f"file_{file_id}.png" if is_image else f"file_{file_id}.pdf"
+    f = {
+        "id": file_id,
+        "created": int(ts),
+        "name": name,
+        "title": name,
+        "mimetype": "image/png" if is_image else "application/pdf",
+        "filetype": "png" if is_image else "pdf",
+        "user": user,
+        "size": size,
+        "url_private": f"https://files.slack.com/files-pri/T00000000-{file_id}/{name}",
+        "url_private_download": f"https://files.slack.com/files-pri/T00000000-{file_id}/download/{name}",
+        "permalink": f"https://example.slack.com/files/{user}/{file_id}/{name}",
+    }
+    if is_image:
+        f.update({
+            "thumb_360": f"https://files.slack.com/files-tmb/T00000000-{file_id}-abc/{name[:-4]}_360.png",
+            "thumb_360_w": 360,
+            "thumb_360_h": 240,
+        })
+    return f
+
+
+def _user(i):
+    user_id = f"U{i:08d}"
+    return {
+        "id": user_id,
+        "name": f"user{i}",
+        "real_name": f"User {i}",
+        "deleted": False,
+        "is_bot": False,
+        "profile": {
+            "display_name": f"user{i}",
+            "real_name": f"User {i}",
+            "email": f"user{i}@example.com",
+            "image_72": f"https://avatars.slack-edge.com/{user_id}_72.png",
+            "image_512": f"https://avatars.slack-edge.com/{user_id}_512.png",
+        },
+    }
+
+
+def _dump(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1)
+
+
+@click.command(help="Generates a synthetic Slack export (directory, or zip file if PATH ends with .zip)")
+@click.option("--channels", default=DEFAULTS["channels"], type=click.INT, show_default=True)
+@click.option("--days", default=DEFAULTS["days"], type=click.INT, show_default=True)
+@click.option("--messages-per-day", default=DEFAULTS["messages_per_day"], type=click.INT, show_default=True)
+@click.option("--users", default=DEFAULTS["users"], type=click.INT, show_default=True)
+@click.option("--dms", default=DEFAULTS["dms"], type=click.INT, show_default=True)
+@click.option("--mpims", default=DEFAULTS["mpims"], type=click.INT, show_default=True)
+@click.option("--thread-ratio", default=DEFAULTS["thread_ratio"], type=click.FLOAT, show_default=True)
+@click.option("--replies-per-thread", default=DEFAULTS["replies_per_thread"], type=click.INT, show_default=True)
+@click.option("--reaction-ratio", default=DEFAULTS["reaction_ratio"], type=click.FLOAT, show_default=True)
+@click.option("--file-ratio", default=DEFAULTS["file_ratio"], type=click.FLOAT, show_default=True)
+@click.option("--block-ratio", default=DEFAULTS["block_ratio"], type=click.FLOAT, show_default=True)
+@click.option("--seed", default=DEFAULTS["seed"], type=click.INT, show_default=True)
+@click.argument("path")
+def main(path, **params):
+    generate_export(path, **params)
+    print(f"Synthetic export written to {path}")
+
+
+if __name__ == "__main__":
+    main()
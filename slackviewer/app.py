@@ -2,28 +2,77 @@ import os
 
 import flask
 
+from slackviewer import state
+from slackviewer.attachments import send_attachment
+from slackviewer.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, MessageIndex
+from slackviewer.templating import bytecode_cache
+from slackviewer.utils.page_cache import cached_page
+
 
 app = flask.Flask(
     __name__,
     template_folder="templates",
     static_folder="static"
 )
+app.jinja_options = dict(app.jinja_options, bytecode_cache=bytecode_cache("viewer"))
+# multi.ArchiveRegistry in --multi mode, see state.current
+app.archives = None
+# state.LoadedArchive served otherwise, replaced by --watch
+app.archive = None
 
 def read_css_file(file_path):
     with open(file_path, 'r') as file:
         return file.read()
 
+def _conversations(kind):
+    archive = state.current()
+    return {
+        "channel": archive.channels,
+        "group": archive.groups,
+        "dm": archive.dms,
+        "mpim": archive.mpims,
+    }.get(kind, {})
+
+
+def _message_index(kind, name, messages):
+    # built on first use, the conversations are not changed after loading
+    indexes = state.current().message_indexes
+    index = indexes.get((kind, name))
+    if index is None or index.messages is not messages:
+        index = indexes[(kind, name)] = MessageIndex(messages)
+    return index
+
+
+def _first_page(kind, name, messages):
+    """
+    Template arguments for the messages of a viewer page. With --page-size,
+    only the newest messages are rendered and older ones are loaded by
+    viewer.html from messages_api while scrolling up.
+    """
+    if not app.page_size:
+        return {"messages": messages}
+    messages, older = _message_index(kind, name, messages).page(limit=app.page_size)
+    return {
+        "messages": messages,
+        "older": older,
+        "messages_api": flask.url_for("messages_api", kind=kind, name=name),
+        "page_size": app.page_size,
+    }
+
+
 @app.route("/channel/<name>/")
+@cached_page
 def channel_name(name):
-    messages = flask._app_ctx_stack.channels[name]
-    channels = list(flask._app_ctx_stack.channels.keys())
-    groups = list(flask._app_ctx_stack.groups.keys()) if flask._app_ctx_stack.groups else {}
-    dm_users = list(flask._app_ctx_stack.dm_users)
-    mpim_users = list(flask._app_ctx_stack.mpim_users)
+    archive = state.current()
+    messages = archive.channels[name]
+    channels = list(archive.channels.keys())
+    groups = list(archive.groups.keys()) if archive.groups else {}
+    dm_users = list(archive.dm_users)
+    mpim_users = list(archive.mpim_users)
 
     viewer_css_contents = read_css_file(os.path.join(app.static_folder, 'viewer.css')) if app.no_external_references else None
 
-    return flask.render_template("viewer.html", messages=messages,
+    return flask.render_template("viewer.html", **_first_page("channel", name, messages),
                                  name=name.format(name=name),
                                  channels=sorted(channels),
                                  groups=sorted(groups) if groups else {},
@@ -36,20 +85,22 @@ def channel_name(name):
 
 @app.route("/channel/<name>/attachments/<attachment>")
 def channel_name_attachment(name, attachment):
-    return flask.send_file(os.path.join(flask._app_ctx_stack.path, name, "attachments", attachment))
+    return send_attachment(name, attachment)
 
 
 @app.route("/group/<name>/")
+@cached_page
 def group_name(name):
-    messages = flask._app_ctx_stack.groups[name]
-    channels = list(flask._app_ctx_stack.channels.keys())
-    groups = list(flask._app_ctx_stack.groups.keys())
-    dm_users = list(flask._app_ctx_stack.dm_users)
-    mpim_users = list(flask._app_ctx_stack.mpim_users)
+    archive = state.current()
+    messages = archive.groups[name]
+    channels = list(archive.channels.keys())
+    groups = list(archive.groups.keys())
+    dm_users = list(archive.dm_users)
+    mpim_users = list(archive.mpim_users)
 
     viewer_css_contents = read_css_file(os.path.join(app.static_folder, 'viewer.css')) if app.no_external_references else None
 
-    return flask.render_template("viewer.html", messages=messages,
+    return flask.render_template("viewer.html", **_first_page("group", name, messages),
                                  name=name.format(name=name),
                                  channels=sorted(channels),
                                  groups=sorted(groups),
@@ -62,20 +113,22 @@ def group_name(name):
 
 @app.route("/group/<name>/attachments/<attachment>")
 def group_name_attachment(name, attachment):
-    return flask.send_file(os.path.join(flask._app_ctx_stack.path, name, "attachments", attachment))
+    return send_attachment(name, attachment)
 
 
 @app.route("/dm/<id>/")
+@cached_page
 def dm_id(id):
-    messages = flask._app_ctx_stack.dms[id]
-    channels = list(flask._app_ctx_stack.channels.keys())
-    groups = list(flask._app_ctx_stack.groups.keys())
-    dm_users = list(flask._app_ctx_stack.dm_users)
-    mpim_users = list(flask._app_ctx_stack.mpim_users)
+    archive = state.current()
+    messages = archive.dms[id]
+    channels = list(archive.channels.keys())
+    groups = list(archive.groups.keys())
+    dm_users = list(archive.dm_users)
+    mpim_users = list(archive.mpim_users)
 
     viewer_css_contents = read_css_file(os.path.join(app.static_folder, 'viewer.css')) if app.no_external_references else None
 
-    return flask.render_template("viewer.html", messages=messages,
+    return flask.render_template("viewer.html", **_first_page("dm", id, messages),
                                  id=id.format(id=id),
                                  channels=sorted(channels),
                                  groups=sorted(groups),
@@ -88,20 +141,22 @@ def dm_id(id):
 
 @app.route("/dm/<name>/attachments/<attachment>")
 def dm_name_attachment(name, attachment):
-    return flask.send_file(os.path.join(flask._app_ctx_stack.path, name, "attachments", attachment))
+    return send_attachment(name, attachment)
 
 
 @app.route("/mpim/<name>/")
+@cached_page
 def mpim_name(name):
-    messages = flask._app_ctx_stack.mpims.get(name, list())
-    channels = list(flask._app_ctx_stack.channels.keys())
-    groups = list(flask._app_ctx_stack.groups.keys())
-    dm_users = list(flask._app_ctx_stack.dm_users)
-    mpim_users = list(flask._app_ctx_stack.mpim_users)
+    archive = state.current()
+    messages = archive.mpims.get(name, list())
+    channels = list(archive.channels.keys())
+    groups = list(archive.groups.keys())
+    dm_users = list(archive.dm_users)
+    mpim_users = list(archive.mpim_users)
 
     viewer_css_contents = read_css_file(os.path.join(app.static_folder, 'viewer.css')) if app.no_external_references else None
 
-    return flask.render_template("viewer.html", messages=messages,
+    return flask.render_template("viewer.html", **_first_page("mpim", name, messages),
                                  name=name.format(name=name),
                                  channels=sorted(channels),
                                  groups=sorted(groups),
@@ -114,15 +169,63 @@ def mpim_name(name):
 
 @app.route("/mpim/<name>/attachments/<attachment>")
 def mpim_name_attachment(name, attachment):
-    return flask.send_file(os.path.join(flask._app_ctx_stack.path, name, "attachments", attachment))
+    return send_attachment(name, attachment)
+
+
+@app.route("/api/<kind>/<name>/messages")
+@cached_page
+def messages_api(kind, name):
+    """
+    JSON page of pre-rendered messages of a conversation, in chronological
+    order. Without ?before=<cursor> the newest messages are returned, with
+    it the messages before the "before" cursor of the previous response.
+    ?limit=<n> is the number of top level messages, threads are always
+    complete.
+    """
+    messages = _conversations(kind).get(name)
+    if messages is None:
+        flask.abort(404)
+    before = flask.request.args.get("before", type=float)
+    limit = flask.request.args.get("limit", DEFAULT_PAGE_SIZE, type=int)
+    page, older = _message_index(kind, name, messages).page(before, max(1, min(limit, MAX_PAGE_SIZE)))
+
+    render_message = flask.get_template_attribute("util.html", "render_message")
+    return flask.jsonify(
+        messages=[
+            {
+                "id": message.id,
+                "ts": message._message.get("ts"),
+                "html": str(render_message(message, None, app.no_external_references)),
+            }
+            for message in page if message.msg or message.files
+        ],
+        before=older,
+    )
+
+
+@app.route("/stats/")
+@cached_page
+def stats():
+    viewer_css_contents = read_css_file(os.path.join(app.static_folder, 'viewer.css')) if app.no_external_references else None
+
+    return flask.render_template("stats.html", stats=state.current().stats,
+                                 no_external_references=app.no_external_references,
+                                 viewer_css_contents=viewer_css_contents)
 
 
 @app.route("/")
+@cached_page
 def index():
-    channels = list(flask._app_ctx_stack.channels.keys())
-    groups = list(flask._app_ctx_stack.groups.keys())
-    dms = list(flask._app_ctx_stack.dms.keys())
-    mpims = list(flask._app_ctx_stack.mpims.keys())
+    if app.archives is not None and state.ARCHIVE_KEY not in flask.request.environ:
+        return flask.render_template("archives.html", archives=app.archives.archives,
+                                     no_external_references=app.no_external_references,
+                                     viewer_css_contents=read_css_file(os.path.join(app.static_folder, 'viewer.css'))
+                                     if app.no_external_references else None)
+    archive = state.current()
+    channels = list(archive.channels.keys())
+    groups = list(archive.groups.keys())
+    dms = list(archive.dms.keys())
+    mpims = list(archive.mpims.keys())
     if channels:
         if "general" in channels:
             return channel_name("general")
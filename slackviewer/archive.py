@@ -1,16 +1,51 @@
 import hashlib
 import json
 import os
+import re
+import shutil
+import struct
+import threading
+import time
 import zipfile
 import io
 
 from os.path import basename, splitext
 
+try:
+    import fcntl
+except ImportError:  # Windows, extractions in use are not protected from eviction
+    fcntl = None
+
 import slackviewer
 from slackviewer.constants import SLACKVIEWER_TEMP_PATH
+from slackviewer.utils.timing import timer
 from slackviewer.utils.six import to_unicode, to_bytes
 
 
+# sidecar cache of fingerprint_file, relative to SLACKVIEWER_TEMP_PATH
+FINGERPRINT_CACHE = "fingerprints.json"
+
+# written into every extraction once it is usable
+ARCHIVE_INFO = ".slackviewer_archive_info.json"
+
+# CRC and size of every member of the zip file, so the extraction of a later
+# export can reuse the files that did not change
+MEMBER_MANIFEST = ".slackviewer_members.json"
+
+# upper bound of threads decompressing members concurrently
+MAX_EXTRACT_WORKERS = 8
+
+# extractions are stored in SLACKVIEWER_TEMP_PATH/<hash>/<slack name>
+_EXTRACTION_DIR_PAT = re.compile(r"^[0-9a-f]{40}$")
+
+# last_access of a cached extraction is only rewritten if older than this
+TOUCH_INTERVAL = 60
+
+# shared lock held on this file by every process serving the extraction,
+# see use_extraction
+USE_LOCK = ".slackviewer_in_use"
+
+
 def SHA1_file(filepath, extra=b''):
     """
     Returns hex digest of SHA1 hash of file at filepath
@@ -31,12 +66,72 @@ def SHA1_file(filepath, extra=b''):
     return h.hexdigest()
 
 
-def extract_archive(filepath):
+def fingerprint_file(filepath, extra=b''):
+    """
+    Returns a fingerprint of the zip file at filepath, much cheaper than
+    SHA1_file: only the central directory (names, CRC32s and sizes of all
+    members), the file size and the mtime are hashed.
+
+    The result is also kept in a small sidecar cache in
+    SLACKVIEWER_TEMP_PATH keyed by path and stat, so an unchanged archive is
+    recognized without opening it.
+
+    :param str filepath: Zip file to fingerprint
+
+    :param bytes extra: Extra content added to the hash
+
+    :return: hex digest of the fingerprint
+
+    :rtype: str
+    """
+    stat = os.stat(filepath)
+    key = os.path.abspath(filepath)
+    cache_file = os.path.join(SLACKVIEWER_TEMP_PATH, FINGERPRINT_CACHE)
+    cache = _read_json(cache_file) or {}
+
+    entry = cache.get(key)
+    if (entry and entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns
+            and entry.get("extra") == extra.hex()):
+        return entry["fingerprint"]
+
+    h = hashlib.sha1()
+    h.update(struct.pack("<QQ", stat.st_size, stat.st_mtime_ns))
+    with zipfile.ZipFile(filepath) as zip:
+        for info in zip.infolist():
+            h.update(info.filename.encode("utf-8"))
+            h.update(struct.pack("<IQQ", info.CRC, info.file_size, info.compress_size))
+    h.update(extra)
+    fingerprint = h.hexdigest()
+
+    cache[key] = {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "extra": extra.hex(),
+        "fingerprint": fingerprint,
+    }
+    _write_json(cache_file, cache)
+
+    return fingerprint
+
+
+@timer.timed("extract_archive")
+def extract_archive(filepath, hash_mode="fast", lazy=False, cache_max_size=None):
     """
     Returns the path of the archive
 
     :param str filepath: Path to file to extract or read
 
+    :param str hash_mode: how the extraction cache is keyed, "fast" for
+    fingerprint_file or "sha1" for a SHA1 of the whole file
+
+    :param bool lazy: only extract the top level metadata files (users.json,
+    channels.json, ...). The conversation directories are extracted on
+    demand with extract_conversations.
+
+    :param int cache_max_size: if set, the least recently used extractions of
+    other archives are removed after extracting, until all extractions
+    together take at most this many bytes
+
     :return: path of the archive
 
     :rtype: str
@@ -54,38 +149,424 @@ def extract_archive(filepath):
         # Misuse of TypeError? :P
         raise TypeError("{} is not a zipfile".format(filepath))
 
-    archive_sha = SHA1_file(
-        filepath=filepath,
-        # Add version of slackviewer to hash as well so we can invalidate the cached copy
-        #  if there are new features added
-        extra=to_bytes(slackviewer.__version__)
-    )
+    hash_file = SHA1_file if hash_mode == "sha1" else fingerprint_file
+    with timer.phase("archive_hash", bytes=os.path.getsize(filepath)):
+        archive_sha = hash_file(
+            filepath=filepath,
+            # Add version of slackviewer to hash as well so we can invalidate the cached copy
+            #  if there are new features added
+            extra=to_bytes(slackviewer.__version__)
+        )
     # use the zip file name as full path. This allows then slack name to be
     # extracted from the path later in reader.py when creating direct slack URLs
     slack_name = splitext(basename(filepath))[0]
 
     extracted_path = os.path.join(SLACKVIEWER_TEMP_PATH, archive_sha, slack_name)
 
-    if os.path.exists(extracted_path):
+    # The info file is written last, so an interrupted extraction is redone
+    archive_info = _read_json(os.path.join(extracted_path, ARCHIVE_INFO))
+    extracted_dirs = archive_info.get("extracted_dirs") if archive_info else None
+
+    if archive_info and (lazy or extracted_dirs is None):
         print("{} already exists".format(extracted_path))
+        touch_extraction(extracted_path, archive_info)
     else:
-        # Extract zip
         with zipfile.ZipFile(filepath) as zip:
-            print("{} extracting to {}...".format(filepath, extracted_path))
-            zip.extractall(path=extracted_path)
+            infos = zip.infolist()
+        manifest = _member_manifest(infos)
+        reuse = _previous_extraction(manifest, extracted_path)
+        size = 0
+        if lazy:
+            # only the metadata files at the top level
+            infos = [i for i in infos if "/" not in i.filename]
+            extracted_dirs = []
+        elif extracted_dirs:
+            # complete an earlier lazy extraction
+            infos = [i for i in infos if _top_level_dir(i.filename) not in extracted_dirs]
+            extracted_dirs = None
+            size = archive_info.get("size") or 0
 
+        print("{} extracting to {}...".format(filepath, extracted_path))
+        os.makedirs(extracted_path, exist_ok=True)
+        extracted, reused = _extract_members(filepath, infos, extracted_path, reuse=reuse)
+        if reused:
+            print("{} unchanged files reused from {}, {} new or changed files extracted".format(
+                reused, reuse[0], extracted))
         print("{} extracted to {}".format(filepath, extracted_path))
 
         # Add additional file with archive info
-        create_archive_info(filepath, extracted_path, archive_sha)
+        size += sum(i.file_size for i in infos)
+        _write_json(os.path.join(extracted_path, MEMBER_MANIFEST), manifest)
+        create_archive_info(filepath, extracted_path, archive_sha, hash_mode, extracted_dirs, size,
+                            reuse[0] if reuse else None)
+
+        if cache_max_size is not None:
+            for entry in evict_extractions(max_size=cache_max_size, keep=[archive_sha]):
+                print("Removed least recently used extraction {} ({} MB)".format(
+                    entry["path"], entry["size"] // 2 ** 20))
 
     return extracted_path
 
 
+def extract_conversations(filepath, extracted_path, names):
+    """
+    Makes sure the directories of the given conversations of a lazily
+    extracted archive exist in extracted_path. Does nothing if the archive
+    was extracted completely.
+
+    :param str filepath: zip file the archive was extracted from
+    :param str extracted_path: path returned by extract_archive
+    :param [str] names: channel names or dm ids
+    """
+    info_path = os.path.join(extracted_path, ARCHIVE_INFO)
+    archive_info = _read_json(info_path)
+    if not archive_info or archive_info.get("extracted_dirs") is None:
+        return
+
+    extracted_dirs = set(archive_info["extracted_dirs"])
+    missing = set(names) - extracted_dirs
+    if not missing:
+        return
+
+    with zipfile.ZipFile(filepath) as zip:
+        infos = [i for i in zip.infolist() if _top_level_dir(i.filename) in missing]
+    reuse = None
+    if archive_info.get("reused_from"):
+        reuse = (archive_info["reused_from"], _read_json(os.path.join(archive_info["reused_from"], MEMBER_MANIFEST)))
+    _extract_members(filepath, infos, extracted_path, reuse=reuse if reuse and reuse[1] else None)
+
+    archive_info["extracted_dirs"] = sorted(extracted_dirs | missing)
+    archive_info["size"] = (archive_info.get("size") or 0) + sum(i.file_size for i in infos)
+    archive_info["last_access"] = time.time()
+    _write_json(info_path, archive_info)
+
+
+def touch_extraction(extracted_path, archive_info=None):
+    """Records the use of a cached extraction for the LRU eviction"""
+    info_path = os.path.join(extracted_path, ARCHIVE_INFO)
+    if archive_info is None:
+        archive_info = _read_json(info_path)
+    if not archive_info:
+        return
+    now = time.time()
+    if now - (archive_info.get("last_access") or 0) > TOUCH_INTERVAL:
+        archive_info["last_access"] = now
+        _write_json(info_path, archive_info)
+
+
+def use_extraction(extracted_path):
+    """
+    Marks a cached extraction as in use, evict_extractions skips it until
+    the returned file is closed (or the process and its forked children
+    exited). A server holds it for as long as it serves the archive.
+
+    :return: the locked file, None if extracted_path is not a cached
+    extraction or locking is not supported
+    """
+    if fcntl is None or not os.path.isfile(os.path.join(extracted_path, ARCHIVE_INFO)):
+        return None
+    touch_extraction(extracted_path)
+    try:
+        f = open(os.path.join(extracted_path, USE_LOCK), "a")
+    except OSError:
+        return None
+    fcntl.flock(f, fcntl.LOCK_SH)
+    return f
+
+
+def _in_use(path):
+    """True if a process holds the use lock of an extraction below path"""
+    if fcntl is None:
+        return False
+    for slack_name in os.listdir(path):
+        try:
+            f = open(os.path.join(path, slack_name, USE_LOCK), "rb")
+        except OSError:
+            continue
+        with f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+    return False
+
+
+def cached_extractions():
+    """
+    Lists the extractions in SLACKVIEWER_TEMP_PATH, least recently used
+    first, as dicts with path, sha, size (bytes) and last_access (epoch).
+
+    Size and last access are taken from the archive info. Extractions
+    without one (interrupted, or made by older versions) are measured on
+    disk and use the modification time. reused_from lists the extractions
+    files were linked from, the size includes these shared files.
+    """
+    try:
+        names = os.listdir(SLACKVIEWER_TEMP_PATH)
+    except OSError:
+        return []
+
+    entries = []
+    for name in names:
+        path = os.path.join(SLACKVIEWER_TEMP_PATH, name)
+        if not _EXTRACTION_DIR_PAT.match(name) or not os.path.isdir(path):
+            continue
+        size, last_access, reused_from = 0, None, []
+        for slack_name in os.listdir(path):
+            archive_info = _read_json(os.path.join(path, slack_name, ARCHIVE_INFO)) or {}
+            if archive_info.get("reused_from"):
+                reused_from.append(archive_info["reused_from"])
+            if archive_info.get("size") is not None:
+                size += archive_info["size"]
+            else:
+                size += _disk_usage(os.path.join(path, slack_name))
+            accessed = archive_info.get("last_access") or os.path.getmtime(os.path.join(path, slack_name))
+            last_access = max(last_access or 0, accessed)
+        entries.append({
+            "path": path,
+            "sha": name,
+            "size": size,
+            "last_access": last_access or os.path.getmtime(path),
+            "reused_from": reused_from,
+        })
+    entries.sort(key=lambda e: e["last_access"])
+    return entries
+
+
+def evict_extractions(max_size=None, max_age=None, keep=(), dry_run=False):
+    """
+    Removes cached extractions, least recently used first.
+
+    :param int max_size: remove extractions until the rest takes at most this
+    many bytes
+    :param float max_age: remove extractions not used for this many seconds
+    :param keep: hashes of extractions that are never removed
+    :param bool dry_run: only return what would be removed
+
+    Extractions in use by a server (see use_extraction) are kept as well.
+
+    :return: the removed entries, see cached_extractions
+    """
+    entries = cached_extractions()
+    # files linked between extractions take their space once, these
+    # extractions are measured by inode instead of by their archive info
+    sharing = {os.path.dirname(p) for e in entries for p in e["reused_from"]}
+    sharing.update(e["path"] for e in entries if e["reused_from"])
+    inodes = {e["path"]: _inodes(e["path"]) for e in entries if e["path"] in sharing}
+    links = {}
+    for files in inodes.values():
+        for key, size in files.items():
+            links[key] = (links.get(key, (0, size))[0] + 1, size)
+    total = sum(e["size"] for e in entries if e["path"] not in inodes)
+    total += sum(size for _, size in links.values())
+
+    entries = [e for e in entries if e["sha"] not in keep]
+    now = time.time()
+
+    removed = []
+    for entry in entries:
+        stale = max_age is not None and now - entry["last_access"] > max_age
+        too_big = max_size is not None and total > max_size
+        if not (stale or too_big) or _in_use(entry["path"]):
+            continue
+        if not dry_run:
+            _remove_extraction(entry["path"])
+        if entry["path"] in inodes:
+            # only files no other extraction links to are freed
+            for key, size in inodes[entry["path"]].items():
+                count = links[key][0] - 1
+                links[key] = (count, size)
+                if not count:
+                    total -= size
+        else:
+            total -= entry["size"]
+        removed.append(entry)
+    return removed
+
+
+def _remove_extraction(path):
+    # renamed first, so other processes never see a partially removed extraction
+    trash = "{}.removing-{}".format(path, os.getpid())
+    try:
+        os.rename(path, trash)
+    except OSError:
+        return
+    shutil.rmtree(trash, ignore_errors=True)
+
+
+def _disk_usage(path):
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _inodes(path):
+    """{(device, inode): size} of the files below path"""
+    files = {}
+    for root, dirs, names in os.walk(path):
+        for name in names:
+            try:
+                stat = os.lstat(os.path.join(root, name))
+            except OSError:
+                continue
+            files[(stat.st_dev, stat.st_ino)] = stat.st_size
+    return files
+
+
+def _top_level_dir(member_name):
+    return member_name.split("/", 1)[0] if "/" in member_name else None
+
+
+def _member_manifest(infos):
+    return {i.filename: [i.CRC, i.file_size] for i in infos if not i.is_dir()}
+
+
+def _previous_extraction(manifest, extracted_path):
+    """
+    The cached extraction sharing the most unchanged members with the zip
+    file of manifest (successive exports of a workspace mostly contain the
+    same day files), as (path, manifest of it). None if there is none.
+    """
+    best, best_shared = None, 0
+    for entry in cached_extractions():
+        for slack_name in os.listdir(entry["path"]):
+            path = os.path.join(entry["path"], slack_name)
+            if path == extracted_path:
+                continue
+            previous = _read_json(os.path.join(path, MEMBER_MANIFEST))
+            if not previous:
+                continue
+            shared = sum(1 for name, member in previous.items() if manifest.get(name) == member)
+            if shared > best_shared:
+                best, best_shared = (path, previous), shared
+    return best
+
+
+def _reuse_members(infos, path, reuse):
+    """
+    Hardlinks (or copies, where links are not possible) the members of infos
+    that are unchanged in the extraction reuse = (path, manifest) into path.
+
+    :return: the members still to be extracted
+    """
+    previous_path, previous = reuse
+    root = os.path.abspath(path)
+    remaining = []
+    for info in infos:
+        target = os.path.abspath(os.path.join(root, info.filename))
+        source = os.path.join(previous_path, info.filename)
+        if (info.is_dir() or previous.get(info.filename) != [info.CRC, info.file_size]
+                or not target.startswith(root + os.sep) or not os.path.isfile(source)):
+            remaining.append(info)
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.lexists(target):
+            os.unlink(target)
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copyfile(source, target)
+    return remaining
+
+
+@timer.timed("extract_members", lambda counts: {"files": counts[0], "reused": counts[1]})
+def _extract_members(filepath, infos, path, workers=None, reuse=None):
+    """
+    Extracts the given members of the zip file concurrently. zlib releases
+    the GIL while decompressing, so threads scale with the number of cores.
+    Every thread uses its own ZipFile handle.
+
+    :param reuse: (path, manifest) of an earlier extraction, its unchanged
+    members are linked instead of extracted
+
+    :return: (number of members extracted, number of members taken from reuse)
+    """
+    reused = 0
+    if reuse:
+        remaining = _reuse_members(infos, path, reuse)
+        reused, infos = len(infos) - len(remaining), remaining
+    if not infos:
+        return 0, reused
+
+    if workers is None:
+        workers = min(MAX_EXTRACT_WORKERS, os.cpu_count() or 1)
+    workers = max(1, min(workers, len(infos)))
+
+    # balance the buckets by uncompressed size, biggest members first
+    buckets = [[] for _ in range(workers)]
+    sizes = [0] * workers
+    for info in sorted(infos, key=lambda i: i.file_size, reverse=True):
+        smallest = sizes.index(min(sizes))
+        buckets[smallest].append(info)
+        sizes[smallest] += info.file_size
+
+    # ZipFile.extract creates missing parent directories without exist_ok,
+    # threads creating the same one would race
+    for directory in {_member_dir(info, path) for info in infos}:
+        os.makedirs(directory, exist_ok=True)
+
+    errors = []
+
+    def extract(bucket):
+        try:
+            with zipfile.ZipFile(filepath) as zip:
+                for info in bucket:
+                    zip.extract(info, path)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=extract, args=(bucket,)) for bucket in buckets[1:]]
+    for thread in threads:
+        thread.start()
+    # the first bucket is extracted by the calling thread
+    extract(buckets[0])
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+    return len(infos), reused
+
+
+def _member_dir(info, path):
+    """Directory ZipFile.extract writes the member info to, its name sanitized the same way"""
+    arcname = info.filename.replace("/", os.path.sep)
+    if os.path.altsep:
+        arcname = arcname.replace(os.path.altsep, os.path.sep)
+    arcname = os.path.splitdrive(arcname)[1]
+    parts = [p for p in arcname.split(os.path.sep) if p not in ("", os.path.curdir, os.path.pardir)]
+    if not info.is_dir():
+        parts = parts[:-1]
+    return os.path.join(path, *parts)
+
+
+def _read_json(path):
+    try:
+        with io.open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    """Writes data to path atomically, so concurrent readers never see a partial file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = "{}.{}.tmp".format(path, os.getpid())
+    with io.open(tmp, 'w', encoding="utf-8") as f:
+        f.write(to_unicode(json.dumps(data, ensure_ascii=False)))
+    os.replace(tmp, path)
+
+
 # Saves archive info
 # When loading empty dms and there is no info file then this is called to
 # create a new archive file
-def create_archive_info(filepath, extracted_path, archive_sha=None):
+def create_archive_info(filepath, extracted_path, archive_sha=None, hash_mode=None, extracted_dirs=None,
+                        size=None, reused_from=None):
     """
     Saves archive info to a json file
 
@@ -94,17 +575,35 @@ def create_archive_info(filepath, extracted_path, archive_sha=None):
     :param str extracted_path: Path to directory of archive
 
     :param str archive_sha: SHA string created when archive was extracted from zip
+
+    :param str hash_mode: how archive_sha was computed, see extract_archive
+
+    :param [str] extracted_dirs: for lazy extractions, the conversation
+    directories extracted so far. None if the archive was extracted completely.
+
+    :param int size: uncompressed size of the extracted files in bytes
+
+    :param str reused_from: extraction the unchanged files were linked from
     """
 
     archive_info = {
         "sha1": archive_sha,
         "filename": os.path.split(filepath)[1],
+        "last_access": time.time(),
     }
+    if size is not None:
+        archive_info["size"] = size
+    if hash_mode:
+        archive_info["hash_mode"] = hash_mode
+    if extracted_dirs is not None:
+        archive_info["extracted_dirs"] = extracted_dirs
+    if reused_from:
+        archive_info["reused_from"] = reused_from
 
     with io.open(
         os.path.join(
             extracted_path,
-            ".slackviewer_archive_info.json",
+            ARCHIVE_INFO,
         ), 'w+', encoding="utf-8"
     ) as f:
         s = json.dumps(archive_info, ensure_ascii=False)
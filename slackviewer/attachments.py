@@ -0,0 +1,67 @@
+"""Serving of the files in the attachments directories of the conversations"""
+
+import os
+
+from urllib.parse import quote
+
+import flask
+
+from slackviewer import state
+
+
+# attachments of an archive never change, so browsers may keep them a while
+ATTACHMENT_MAX_AGE = 30 * 24 * 60 * 60
+
+
+def build_attachment_index(path, conversations):
+    """
+    Maps (conversation, file name) to the path of every file in the
+    attachments directory of the given conversations.
+
+    Only files found here can be served, so a request can never reach a
+    path outside of these directories.
+
+    :param str path: extracted archive
+    :param conversations: conversation directory names
+    """
+    index = {}
+    for name in conversations:
+        directory = os.path.join(path, name, "attachments")
+        try:
+            entries = os.scandir(directory)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_file():
+                    index[(name, entry.name)] = entry.path
+    return index
+
+
+def send_attachment(name, attachment):
+    """
+    Response for an attachment of the conversation name, 404 if unknown.
+
+    Supports conditional and range requests (for seeking in videos and
+    partial PDF loads). With app.x_accel_prefix set, only an X-Accel-Redirect
+    header is sent and the file is served by the front proxy (nginx). With
+    USE_X_SENDFILE set, Flask sends an X-Sendfile header instead.
+    """
+    archive = state.current()
+    filepath = archive.attachments.get((name, attachment))
+    if filepath is None:
+        flask.abort(404)
+
+    prefix = getattr(flask.current_app, "x_accel_prefix", None)
+    if prefix:
+        relpath = os.path.relpath(filepath, archive.path).replace(os.sep, "/")
+        response = flask.current_app.response_class(mimetype=None)
+        response.headers["X-Accel-Redirect"] = prefix.rstrip("/") + "/" + quote(relpath)
+        # the proxy serves the file with the Content-Type of its own config
+        del response.headers["Content-Type"]
+        return response
+
+    response = flask.send_file(filepath, conditional=True, max_age=ATTACHMENT_MAX_AGE)
+    # werkzeug only sets it on 206 responses, players need it to offer seeking
+    response.accept_ranges = "bytes"
+    return response
@@ -0,0 +1,248 @@
+"""
+Renderer for the Block Kit "blocks" of Slack messages.
+
+Blocks and rich text elements are rendered by handlers looked up by their
+type, which append their output to a list that is joined once at the end.
+Further types can be supported with register_block() and
+register_element(). The output is text for SlackFormatter.render_text.
+"""
+
+import logging
+
+import emoji
+
+
+# handler(renderer, block, out) per block type
+_BLOCK_HANDLERS = {}
+# handler(renderer, element, out) per rich text element type
+_ELEMENT_HANDLERS = {}
+
+# how often the same warning is logged before it is suppressed
+WARNING_LIMIT = 3
+_warning_counts = {}
+
+
+def register_block(block_type):
+    """Decorator registering a handler(renderer, block, out) for a block type"""
+    def decorator(handler):
+        _BLOCK_HANDLERS[block_type] = handler
+        return handler
+    return decorator
+
+
+def register_element(element_type):
+    """Decorator registering a handler(renderer, element, out) for a rich text element type"""
+    def decorator(handler):
+        _ELEMENT_HANDLERS[element_type] = handler
+        return handler
+    return decorator
+
+
+def _warn(key, msg, *args):
+    """logging.warning, but only WARNING_LIMIT times per key"""
+    count = _warning_counts.get(key, 0) + 1
+    _warning_counts[key] = count
+    if count < WARNING_LIMIT:
+        logging.warning(msg, *args)
+    elif count == WARNING_LIMIT:
+        logging.warning(msg + " (further warnings of this kind are suppressed)", *args)
+
+
+class BlockRenderer(object):
+
+    def __init__(self, formatter, slack_name):
+        """
+        :param SlackFormatter formatter: used to look up users and channels
+        :param str slack_name: workspace name used in channel links
+        """
+        self.formatter = formatter
+        self.slack_name = slack_name
+
+    def render(self, blocks):
+        """Renders a message["blocks"] list"""
+        out = []
+        for block in blocks:
+            _BLOCK_HANDLERS.get(block.get("type"), _render_container)(self, block, out)
+        return "".join(out)
+
+    def render_element(self, element, out):
+        """Renders a rich text element (and its nested elements) into out"""
+        handler = _ELEMENT_HANDLERS.get(element["type"])
+        if handler is None:
+            _warn(("element", element["type"]), "Unsupported rich text element type '%s' for %s", element["type"], element)
+            return
+        handler(self, element, out)
+
+    def render_elements(self, elements, out):
+        for element in elements:
+            self.render_element(element, out)
+
+
+##########
+# Blocks #
+##########
+
+@register_block("rich_text")
+@register_block("rich_text_quote")
+def _render_rich_text(renderer, block, out):
+    renderer.render_elements(block["elements"], out)
+
+
+@register_block("image")
+def _render_image(renderer, block, out):
+    out.append(_format_block_text(block, "image"))
+
+
+def _render_container(renderer, block, out):
+    """Blocks made of text objects: section, context, actions, divider, ..."""
+    if "fields" in block:
+        for field in block["fields"]:
+            out.append(_format_block_text(field, block["type"]))
+    elif "elements" in block:
+        for element in block["elements"]:
+            out.append(_format_block_text(element, block["type"]))
+    elif block.get("type") == "divider":
+        out.append("---\n")
+    else:
+        _warn(("block", block.get("type")), "Unknown block type: %s", block)
+
+
+def _unsupported(b_type, text_obj, reason, *args):
+    _warn(("block", b_type, reason), "Block Type %s: " + reason, b_type, *args)
+    return f"unsupported_block({b_type}: {text_obj})\n\n"
+
+
+def _format_block_text(text_obj, b_type):
+    """Renders a text object (or image element) of a block of type b_type"""
+    if b_type == "image":
+        if "image_url" not in text_obj:
+            return _unsupported(b_type, text_obj, "Missing 'image_url' in %s", text_obj)
+        title = text_obj.get("title", {}).get("text", "")
+        return f"<img src='{text_obj['image_url']}' alt='{text_obj.get('alt_text', '')}' title='{title}'>\n"
+
+    if b_type == "context":
+        if text_obj.get("type") == "image":
+            if "image_url" not in text_obj:
+                return _unsupported(b_type, text_obj, "Missing 'image_url' in %s", text_obj)
+            return f"<img src='{text_obj['image_url']}' alt='{text_obj.get('alt_text', '')}'>\n"
+        if "text" not in text_obj:
+            return _unsupported(b_type, text_obj, "Missing 'text' in %s", text_obj)
+        return f"<small>{text_obj['text']}</small>\n"
+
+    if "text" not in text_obj:
+        return _unsupported(b_type, text_obj, "Missing 'text' in %s", text_obj)
+
+    text = text_obj["text"]
+    text_type = text_obj.get("type")
+    if "type" in text_obj and text_type not in ("plain_text", "mrkdwn", "button"):
+        _warn(("text", b_type, text_type), "Block Type %s: Unsupported text type '%s' for %s", b_type, text_type, text_obj)
+        return f"unsupported_block({b_type}: {text})\n\n"
+
+    if text_type == "button" and isinstance(text, dict) and "text" in text:
+        text = f"Slack_Button({text['text']})"
+
+    if b_type == "header":
+        return f"*{text}*\n\n"
+    if b_type == "section":
+        return f"{text}\n\n"
+    if b_type == "actions":
+        return f"Slack_Action({text})\n"
+    _warn(("block", b_type), "Unsupported block type '%s' for %s", b_type, text_obj)
+    return f"unsupported_block({b_type}: {text_obj}\n\n)"
+
+
+######################
+# Rich text elements #
+######################
+
+@register_element("rich_text_section")
+def _render_section(renderer, element, out):
+    renderer.render_elements(element["elements"], out)
+
+
+@register_element("rich_text_quote")
+def _render_quote(renderer, element, out):
+    out.append("<blockquote>")
+    renderer.render_elements(element["elements"], out)
+    out.append("</blockquote>")
+
+
+@register_element("rich_text_list")
+def _render_list(renderer, element, out):
+    tag = {"bullet": "ul", "ordered": "ol"}.get(element["style"])
+    if tag is None:
+        _warn(("list", element["style"]), "Unsupported rich text list style '%s' for %s", element["style"], element)
+        return
+    out.append(f"<{tag}>")
+    for i, nested in enumerate(element["elements"]):
+        if i:
+            out.append("\n")
+        out.append("<li>")
+        renderer.render_element(nested, out)
+        out.append("</li>")
+    out.append(f"</{tag}>\n")
+
+
+@register_element("rich_text_preformatted")
+def _render_preformatted(renderer, element, out):
+    out.append("<pre>")
+    for nested in element["elements"]:
+        if nested["type"] == "text":
+            # keeps underscores from being formatted as italic
+            nested = dict(nested, text=nested["text"].replace("_", "&#95;"))
+        renderer.render_element(nested, out)
+    out.append("</pre>")
+
+
+@register_element("text")
+def _render_text(renderer, element, out):
+    text = element["text"]
+    style = element.get("style")
+    if style:
+        if style.get("bold"):
+            text = f"<b>{text}</b>"
+        if style.get("italic"):
+            text = f"<i>{text}</i>"
+    out.append(text)
+
+
+@register_element("link")
+def _render_link(renderer, element, out):
+    url = element["url"]
+    text = element.get("text", url).replace("_", "&#95;")
+    out.append(f"<a href='{url}'>{text}</a>")
+
+
+@register_element("user")
+def _render_user(renderer, element, out):
+    user = renderer.formatter.find_user({"user": element["user_id"]})
+    if user:
+        out.append(f"<b>@{user.display_name}</b>")
+    else:
+        out.append(f"<b>[ Unknown user {element['user_id']} ]</b>")
+
+
+# emoji.emojize is slow compared to everything else here, and the same few
+# emoji are used over and over
+_emojized = {}
+
+
+@register_element("emoji")
+def _render_emoji(renderer, element, out):
+    name = element["name"]
+    if "unicode" not in element:
+        out.append(name)
+        return
+    rendered = _emojized.get(name)
+    if rendered is None:
+        rendered = _emojized[name] = emoji.emojize(f":{name}:", language='alias')
+    out.append(rendered)
+
+
+@register_element("channel")
+def _render_channel(renderer, element, out):
+    channel_id = element["channel_id"]
+    channel_name = renderer.formatter.find_channel(channel_id)
+    if not channel_name:
+        channel_name = f"[ Unknown channel {channel_id} ]"
+    out.append(f"<a href='https://{renderer.slack_name}.slack.com/archives/{channel_id}'>{channel_name}</a>")
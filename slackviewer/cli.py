@@ -1,14 +1,12 @@
 import click
-import pkgutil
+import os
 import shutil
-import os.path
 
-from datetime import datetime
-
-from jinja2 import Environment, PackageLoader
 from slackviewer.config import Config
 from slackviewer.constants import SLACKVIEWER_TEMP_PATH
-from slackviewer.reader import Reader
+
+# The modules needed to read and render an archive (jinja2, markdown2, emoji,
+# ...) are imported by the commands using them, so --help and clean start fast
 
 
 @click.group()
@@ -25,7 +23,23 @@ def cli():
     Preserve external_resources directory when cleaning
     Environment var: SEV_PRESERVE_EXTERNAL_RESOURCES (default: true)
     """)
-def clean(wet, preserve_external_resources):
+@click.option("--stale-days", default=None, type=click.FloatRange(min=0), envvar='SEV_CLEAN_STALE_DAYS', help="""\b
+    Only remove extracted archives not used for this many days, keep everything else
+    Environment var: SEV_CLEAN_STALE_DAYS (default: None)
+    """)
+def clean(wet, preserve_external_resources, stale_days):
+    if stale_days is not None:
+        from slackviewer.archive import evict_extractions
+
+        stale = evict_extractions(max_age=stale_days * 24 * 60 * 60, dry_run=not wet)
+        for entry in stale:
+            print("{} {} ({} MB)".format("Removed" if wet else "Stale:", entry["path"], entry["size"] // 2 ** 20))
+        if not stale:
+            print("No extraction unused for {} days".format(stale_days))
+        elif not wet:
+            print("Run with -w to remove them")
+        return
+
     if wet:
         if os.path.exists(SLACKVIEWER_TEMP_PATH):
             print("Removing {}...".format(SLACKVIEWER_TEMP_PATH))
@@ -100,19 +114,74 @@ def clean(wet, preserve_external_resources):
     Comma separated list of channels to hide.
     Environment var: SEV_HIDE_CHANNELS (default: None)
     """)
+@click.option("--shards", default=None, type=click.Path(file_okay=False), envvar="SEV_SHARDS", help="""\b
+    Write one file per channel, DM and MPIM plus an index.html into this directory
+    instead of a single file.
+    Environment var: SEV_SHARDS (default: None)
+    """)
+@click.option("-j", "--jobs", default=None, type=click.IntRange(min=1), envvar="SEV_JOBS", help="""\b
+    Number of worker processes used with --shards.
+    Environment var: SEV_JOBS (default: number of cores)
+    """)
+@click.option("--archive-hash", default="fast", type=click.Choice(["fast", "sha1"]), envvar='SEV_ARCHIVE_HASH', help="""\b
+    How a zip archive is identified in the extraction cache: "fast" hashes the zip directory, size and mtime,
+    "sha1" hashes the whole file.
+    Environment var: SEV_ARCHIVE_HASH (default: fast)
+    """)
+@click.option("--lazy-extract", is_flag=True, default=False, envvar='SEV_LAZY_EXTRACT', help="""\b
+    Only extract the metadata files of a zip archive up front and every conversation when it is loaded,
+    so hidden or not selected channels are never extracted.
+    Environment var: SEV_LAZY_EXTRACT (default: false)
+    """)
+@click.option("--cache-max-size", default=None, type=click.IntRange(min=1), metavar="MB", envvar='SEV_CACHE_MAX_SIZE', help="""\b
+    Maximum size of all extracted archives in the temporary directory. After extracting a new archive
+    the least recently used extractions are removed until they fit.
+    Environment var: SEV_CACHE_MAX_SIZE (default: unlimited)
+    """)
+@click.option("--timings", default=None, type=click.Path(dir_okay=False), envvar='SEV_TIMINGS', help="""\b
+    Write a JSON report with wall/CPU time, counts and peak RSS per loading phase to this file.
+    Environment var: SEV_TIMINGS (default: None)
+    """)
+@click.option("--profile-dir", default=None, type=click.Path(file_okay=False), envvar='SEV_PROFILE_DIR', help="""\b
+    Write a cProfile dump per loading phase into this directory.
+    Environment var: SEV_PROFILE_DIR (default: None)
+    """)
 @click.argument('archive')
 def export(**kwargs):
+    import pkgutil
+
+    from datetime import datetime
+
+    from slackviewer.export import dm_titles, mpim_titles, export_sharded
+    from slackviewer.reader import Reader
+    from slackviewer.templating import create_environment
+    from slackviewer.utils.timing import timer
+
     config = Config(kwargs)
 
+    if config.timings or config.profile_dir:
+        timer.enable(config.profile_dir)
+
     css = pkgutil.get_data('slackviewer', 'static/viewer.css').decode('utf-8')
 
-    tmpl = Environment(loader=PackageLoader('slackviewer')).get_template("export_single.html")
-    if config.template:
-        tmpl = Environment(loader=PackageLoader('slackviewer')).from_string(config.template.read())
+    template_source = config.template.read() if config.template else None
+    env = create_environment()
+    tmpl = env.from_string(template_source) if template_source else env.get_template("export_single.html")
     r = Reader(config)
-    channel_list = sorted(
-        [{"channel_name": k, "messages": v} for (k, v) in r.compile_channels().items()],
-        key=lambda d: d["channel_name"]
+
+    if config.shards:
+        with timer.phase("export_sharded") as phase:
+            shards = export_sharded(config, r, css, template_source, config.shards, config.jobs)
+            phase.count(conversations=len(shards))
+        print(f"Exported {len(shards)} conversations to {os.path.join(config.shards, 'index.html')}")
+        timer.write_report(config.timings)
+        return
+
+    # Everything below is lazy: every conversation is loaded, thread-built,
+    # rendered and written while the template is streamed to the output file,
+    # and released before the next one is loaded.
+    channel_list = (
+        {"channel_name": k, "messages": v} for (k, v) in r.iter_channels(sort=True)
     )
 
     dm_list = []
@@ -120,33 +189,21 @@ def export(**kwargs):
     if config.show_dms:
         #
         # Direct DMs
-        dm_list = r.compile_dm_messages()
-        dm_users = r.compile_dm_users()
-
-        # make list better lookupable. Also hide own user in 1:1 DMs
-        dm_users = {dm['id']: dm['users'][0].display_name for dm in dm_users}
+        dm_users = dm_titles(r)
 
         # replace id with slack username
-        dm_list = [{'name': dm_users[k], 'messages': v} for k, v in dm_list.items()]
+        dm_list = ({'name': dm_users[k], 'messages': v} for k, v in r.iter_dm_messages())
 
         #
         # Group DMs
-        mpims = r.compile_mpim_messages()
-        mpim_users = r.compile_mpim_users()
-
-        # make list better lookupable
-        mpim_users = {g['name']: g['users'] for g in mpim_users}
-        # Get the username instead of object
-        mpim_users = {k: [u.display_name for u in v] for k, v in mpim_users.items()}
-        # make the name a string
-        mpim_users = {k: ', '.join(v) for k, v in mpim_users.items()}
+        mpim_users = mpim_titles(r)
 
         # replace id with group member list
-        mpims = [{'name': mpim_users[k], 'messages': v} for k, v in mpims.items()]
+        mpims = ({'name': mpim_users[k], 'messages': v} for k, v in r.iter_mpim_messages())
 
     r.warn_not_found_to_hide_channels()
 
-    html = tmpl.render(
+    stream = tmpl.stream(
         css=css,
         generated_on=datetime.now(),
         workspace_name=r.slack_name(),
@@ -156,7 +213,102 @@ def export(**kwargs):
         mpims=mpims,
     )
     filename = f"{r.slack_name()}.html"
-    with open(filename, 'wb') as outfile:
-        outfile.write(html.encode('utf-8'))
+    # includes loading the conversations, which happens while streaming
+    with open(filename, 'wb') as outfile, timer.phase("render"):
+        stream.dump(outfile, encoding='utf-8')
 
     print(f"Exported to {filename}")
+    timer.write_report(config.timings)
+
+
+@cli.command(help="Publishes the messages of an archive to a Microsoft Teams channel through an incoming webhook")
+@click.option("--webhook-url", default=None, envvar='SEV_WEBHOOK_URL', help="""\b
+    Incoming webhook URL of the Teams channel
+    Environment var: SEV_WEBHOOK_URL (default: None)
+    """)
+@click.option("--publish-state", default="publish_state.sqlite3", type=click.Path(dir_okay=False), envvar='SEV_PUBLISH_STATE', help="""\b
+    SQLite database recording what was queued and sent. Running again with the same database only
+    publishes new messages and resumes an interrupted run.
+    Environment var: SEV_PUBLISH_STATE (default: publish_state.sqlite3)
+    """)
+@click.option("--batch-size", default=10, type=click.IntRange(min=1), envvar='SEV_PUBLISH_BATCH_SIZE', help="""\b
+    Messages per card, cards are also kept below the payload limit of Teams
+    Environment var: SEV_PUBLISH_BATCH_SIZE (default: 10)
+    """)
+@click.option("--import-legacy", default=None, type=click.Path(exists=True, file_okay=False), envvar='SEV_IMPORT_LEGACY', help="""\b
+    Directory with the sent_messages.json and uploaded_files.json of the node scripts. Messages sent by
+    them are skipped and the SharePoint links of uploaded files are used in the cards.
+    Environment var: SEV_IMPORT_LEGACY (default: None)
+    """)
+@click.option("--dry-run", is_flag=True, default=False, envvar='SEV_DRY_RUN', help="""\b
+    Only queue the new messages, do not send anything
+    Environment var: SEV_DRY_RUN (default: false)
+    """)
+@click.option("--channels", type=click.STRING, default=None, envvar='SEV_CHANNELS', help="""\b
+    A comma separated list of channels to publish.
+    Environment var: SEV_CHANNELS (default: None)
+    """)
+@click.option('--show-dms/--no-show-dms', default=False, envvar='SEV_SHOW_DMS', help="""\b
+    Publish direct messages as well
+    Environment var: SEV_SHOW_DMS (default: false)
+    """)
+@click.option("--since", default=None, type=click.DateTime(formats=["%Y-%m-%d"]), envvar='SEV_SINCE', help="""\b
+    Only publish messages since the given date
+    Environment var: SEV_SINCE (default: None)
+    """)
+@click.option("--hide-channels", default=None, type=str, envvar="SEV_HIDE_CHANNELS", help="""\b
+    Comma separated list of channels to skip.
+    Environment var: SEV_HIDE_CHANNELS (default: None)
+    """)
+@click.option('--skip-channel-member-change', is_flag=True, default=False, envvar='SEV_SKIP_CHANNEL_MEMBER_CHANGE', help="""\b
+    Skip channel join/leave messages
+    Environment var: SEV_SKIP_CHANNEL_MEMBER_CHANGE (default: false)
+    """)
+@click.argument('archive')
+def publish(**kwargs):
+    from slackviewer.export import dm_titles, mpim_titles
+    from slackviewer.publish import PublishError, PublishState, Publisher, plan
+    from slackviewer.reader import Reader
+
+    config = Config(kwargs)
+    if not config.webhook_url and not config.dry_run:
+        raise click.UsageError("--webhook-url is required unless --dry-run is given")
+
+    state = PublishState(config.publish_state)
+    try:
+        if config.import_legacy:
+            sent, files = state.import_legacy(config.import_legacy)
+            print(f"📋 Imported {sent} sent messages and {files} file links from {config.import_legacy}")
+
+        legacy, file_urls = state.legacy_sent(), state.file_urls()
+
+        def queue(title, conversation, messages):
+            return plan(state, title, conversation, messages, config.batch_size, legacy=legacy, file_urls=file_urls)
+
+        # conversations are read and queued one at a time
+        r = Reader(config)
+        queued = 0
+        for name, messages in r.iter_channels(config.channels, sort=True):
+            queued += queue(f"#{name}", f"channel/{name}", messages)
+        for name, messages in r.iter_groups():
+            queued += queue(f"🔒 {name}", f"group/{name}", messages)
+        if config.show_dms:
+            titles = dm_titles(r)
+            for dm_id, messages in r.iter_dm_messages():
+                queued += queue(titles.get(dm_id, dm_id), f"dm/{dm_id}", messages)
+            titles = mpim_titles(r)
+            for name, messages in r.iter_mpim_messages():
+                queued += queue(titles.get(name, name), f"mpim/{name}", messages)
+        r.warn_not_found_to_hide_channels()
+
+        sent, pending = state.stats()
+        print(f"{queued} new messages queued, {pending} cards to send ({sent} sent before)")
+        if config.dry_run or not pending:
+            return
+        try:
+            sent = Publisher(state, config.webhook_url).run()
+        except PublishError as e:
+            raise click.ClickException(f"{e}. Run again to resume.")
+        print(f"✅ {sent} cards sent")
+    finally:
+        state.close()
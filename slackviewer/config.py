@@ -17,6 +17,11 @@ class Config(object):
         # Args used by both webserver and cli
         self.archive = config.get("archive")
         self.debug = config.get("debug")
+        self.archive_hash = config.get("archive_hash") or "fast"
+        self.lazy_extract = config.get("lazy_extract")
+        self.cache_max_size = config.get("cache_max_size")
+        self.timings = config.get("timings")
+        self.profile_dir = config.get("profile_dir")
 
         self.hide_channels = []
         if 'hide_channels' in config and config.get("hide_channels"):
@@ -29,6 +34,13 @@ class Config(object):
 
         # CLI only
         self.template = config.get("template")
+        self.shards = config.get("shards")
+        self.jobs = config.get("jobs")
+        self.webhook_url = config.get("webhook_url")
+        self.publish_state = config.get("publish_state")
+        self.batch_size = config.get("batch_size")
+        self.import_legacy = config.get("import_legacy")
+        self.dry_run = config.get("dry_run")
         # Another branch exists already to unify them
 
         # webserver only setting
@@ -41,16 +53,28 @@ class Config(object):
         self.no_sidebar = config.get("no_sidebar")
         self.output_dir = config.get("output_dir")
         self.port = config.get("port")
+        self.workers = config.get("workers") or 1
+        self.multi = config.get("multi")
+        self.max_loaded_archives = config.get("max_loaded_archives") or 4
+        self.watch = config.get("watch")
+        self.page_size = config.get("page_size")
+        self.x_sendfile = config.get("x_sendfile")
+        self.x_accel_prefix = config.get("x_accel_prefix")
         self.test = config.get("test")
         
         # 외부 리소스 다운로드 옵션
         self.download_external = config.get("download_external")
+        self.thumbnails = config.get("thumbnails")
         
         # Slack 토큰 (Bearer 인증용)
         self.slack_token = config.get("slack_token")
 
         self.sanity_check()
 
+    def replace(self, **changes):
+        """A copy of this config with the given settings changed"""
+        return Config(dict(self._config, **changes))
+
     def sanity_check(self):
         """Make sure all variables exist"""
         for key in self._config:
@@ -0,0 +1,152 @@
+import hashlib
+import os
+import re
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from slackviewer.config import Config
+from slackviewer.reader import Reader
+from slackviewer.templating import create_environment
+
+
+def dm_titles(reader):
+    """dm id -> name shown in the export (the first member)"""
+    # make list better lookupable. Also hide own user in 1:1 DMs
+    return {dm['id']: dm['users'][0].display_name for dm in reader.compile_dm_users()}
+
+
+def mpim_titles(reader):
+    """mpim name -> comma separated list of the member names"""
+    return {
+        g['name']: ', '.join(u.display_name for u in g['users'])
+        for g in reader.compile_mpim_users()
+    }
+
+
+def export_sharded(config, reader, css, template_source, output_dir, jobs=None):
+    """
+    Writes one export_single.html styled file per channel, group, DM and MPIM
+    into output_dir, plus an index.html linking to all of them.
+
+    Every conversation is rendered in a separate worker process, so the
+    export time scales with the number of cores.
+
+    :param Config config: export config
+    :param Reader reader: reader of the archive, used to list the conversations
+    :param str css: css inlined into every file
+    :param str template_source: custom template or None for export_single.html
+    :param str output_dir: directory the files are written to
+    :param int jobs: number of worker processes, defaults to the number of cores
+
+    :return: list of the written conversations as used by the index page
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    # (kind, name, title). Groups are rendered like channels by the template.
+    tasks = [("channel", name, name) for name in reader.channel_names(config.channels, sort=True)]
+    tasks += [("group", name, name) for name in reader.group_names()]
+    if config.show_dms:
+        titles = dm_titles(reader)
+        tasks += [("dm", dm_id, titles.get(dm_id, dm_id)) for dm_id in reader.dm_ids()]
+        titles = mpim_titles(reader)
+        tasks += [("mpim", name, titles.get(name, name)) for name in reader.mpim_names()]
+
+    reader.warn_not_found_to_hide_channels()
+
+    # The workers read the extracted archive directly, so the zip is neither
+    # hashed nor extracted again in every process. The conversations are
+    # filtered here already.
+    kwargs = {
+        "archive": reader.archive_path(),
+        "since": config.since,
+        "skip_channel_member_change": config.skip_channel_member_change,
+        "thread_note": config.thread_note,
+    }
+    generated_on = datetime.now()
+    source_file = os.path.basename(config.archive)
+    archive_path = reader.archive_path()
+
+    reader.ensure_extracted([t[1] for t in tasks])
+
+    # start with the biggest conversations to keep all workers busy until the end
+    tasks.sort(key=lambda t: _conversation_size(os.path.join(archive_path, t[1])), reverse=True)
+
+    written = {}
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_worker,
+        initargs=(kwargs, css, template_source, generated_on, source_file),
+    ) as executor:
+        futures = [executor.submit(_export_conversation, task, output_dir) for task in tasks]
+        for future in as_completed(futures):
+            result = future.result()
+            if result:
+                written[(result["kind"], result["name"])] = result
+
+    # index in the same order as the single file export: DMs, MPIMs, channels
+    order = {"dm": 0, "mpim": 1, "channel": 2, "group": 2}
+    shards = sorted(written.values(), key=lambda r: (order[r["kind"]], r["title"]))
+
+    env = create_environment()
+    env.get_template("export_index.html").stream(
+        css=css,
+        generated_on=generated_on,
+        workspace_name=reader.slack_name(),
+        source_file=source_file,
+        shards=shards,
+    ).dump(os.path.join(output_dir, "index.html"), encoding='utf-8')
+
+    return shards
+
+
+def _conversation_size(path):
+    try:
+        return sum(e.stat().st_size for e in os.scandir(path) if e.is_file())
+    except OSError:
+        return 0
+
+
+def _shard_filename(kind, name):
+    safe_name = re.sub(r"[^\w.-]", "_", name)
+    if safe_name != name:
+        # "a b" and "a_b" would end up in the same file
+        safe_name += "-" + hashlib.sha1(name.encode("utf-8")).hexdigest()[:8]
+    return f"{kind}-{safe_name}.html"
+
+
+# Per worker process state, set up once by _init_worker
+_worker = {}
+
+
+def _init_worker(kwargs, css, template_source, generated_on, source_file):
+    # users.json and the metadata files are read once per worker by its
+    # reader, not once per conversation
+    env = create_environment()
+    _worker["template"] = env.from_string(template_source) if template_source else env.get_template("export_single.html")
+    _worker["reader"] = Reader(Config(kwargs))
+    _worker["context"] = {
+        "css": css,
+        "generated_on": generated_on,
+        "source_file": source_file,
+    }
+
+
+def _export_conversation(task, output_dir):
+    kind, name, title = task
+    reader = _worker["reader"]
+
+    messages = reader.conversation_messages(kind, name)
+    if not messages:
+        return None
+
+    context = dict(_worker["context"], workspace_name=reader.slack_name(), channels=[], dms=[], mpims=[])
+    if kind in ("channel", "group"):
+        context["channels"] = [{"channel_name": title, "messages": messages}]
+    else:
+        context[kind + "s"] = [{"name": title, "messages": messages}]
+
+    filename = _shard_filename(kind, name)
+    _worker["template"].stream(**context).dump(os.path.join(output_dir, filename), encoding='utf-8')
+
+    return {"kind": kind, "name": name, "title": title, "filename": filename, "messages": len(messages)}
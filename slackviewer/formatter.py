@@ -51,6 +51,11 @@ class SlackFormatter(object):
             return self.__USER_DATA.get(user_id)
         logging.error("unable to find user in %s", message)
 
+    def find_channel(self, channel_id):
+        """Name of the channel (or group, DM, MPIM) with the given id, None if unknown"""
+        channel = self.__CHANNEL_DATA.get(channel_id)
+        return channel.get("name") if channel else None
+
     def render_text(self, message, process_markdown=True):
         message = message.replace("<!channel>", "@channel")
         message = message.replace("<!channel|@channel>", "@channel")
@@ -4,6 +4,8 @@ import shutil
 import os
 import tempfile
 
+from slackviewer.utils.timing import timer
+
 class CustomFreezer(Freezer):
 
     cf_output_dir = None
@@ -93,6 +95,7 @@ class CustomFreezer(Freezer):
                 if not any(pattern in file_path for pattern in ignore):
                     yield os.path.relpath(file_path, directory)
     
+    @timer.timed("freeze", lambda urls: {"pages": len(urls)})
     def freeze(self):
         """
         Override freeze method to use our custom freeze_yield
@@ -1,46 +1,51 @@
-import webbrowser
+import gc
 import os
 
 import click
-import flask
 
-from slackviewer.app import app
 from slackviewer.config import Config
-from slackviewer.freezer import CustomFreezer
-from slackviewer.reader import Reader
-from slackviewer.utils.downloader import ExternalResourceDownloader
+from slackviewer.utils.timing import timer
 
+# flask, the reader and the downloader (requests) are imported when they are
+# used, so --help does not have to load them
 
-def configure_app(app, config, downloader=None):
+
+def _configure_settings(app, config):
     app.debug = config.debug
     app.no_sidebar = config.no_sidebar
     app.no_external_references = config.no_external_references
+    app.x_accel_prefix = config.x_accel_prefix
+    # the static HTML output has no API to load more messages from
+    app.page_size = 0 if config.html_only else (config.page_size or 0)
+    app.config["USE_X_SENDFILE"] = bool(config.x_sendfile)
     if app.debug:
         print("WARNING: DEBUG MODE IS ENABLED!")
     app.config["PROPAGATE_EXCEPTIONS"] = True
 
-    reader = Reader(config, downloader)
 
+def _install_archive(app, archive):
+    """Makes the state.LoadedArchive archive the one app serves"""
+    import flask
+
+    from slackviewer.utils.page_cache import page_cache
+
+    app.archive = archive
+    # for code reading the archive outside of requests, like the freezer
     top = flask._app_ctx_stack
-    top.path = reader.archive_path()
-    top.channels = reader.compile_channels(config.channels)
-    top.groups = reader.compile_groups()
-    top.dms = {}
-    top.dm_users = []
-    top.mpims = {}
-    top.mpim_users = []
-    if config.show_dms:
-        top.dms = reader.compile_dm_messages()
-        top.dm_users = reader.compile_dm_users()
-        top.mpims = reader.compile_mpim_messages()
-        top.mpim_users = reader.compile_mpim_users()
-
-    reader.warn_not_found_to_hide_channels()
-
-    # remove any empty channels & groups. DM's are needed for now
-    # since the application loads the first
-    top.channels = {k: v for k, v in top.channels.items() if v}
-    top.groups = {k: v for k, v in top.groups.items() if v}
+    for key, value in vars(archive).items():
+        setattr(top, key, value)
+
+    # pages rendered from an earlier configuration must not be served anymore
+    page_cache.clear()
+
+
+@timer.timed("configure_app")
+def configure_app(app, config, downloader=None):
+    from slackviewer.state import load_archive
+
+    _configure_settings(app, config)
+    _install_archive(app, load_archive(config, downloader))
+    top = app.archive
     
     # 외부 리소스 다운로드 (download_external 옵션이 활성화된 경우)
     if downloader and config.download_external:
@@ -73,6 +78,21 @@ def configure_app(app, config, downloader=None):
         print(f"다운로드 완료: {downloaded}/{total} 개의 외부 리소스")
 
 
+def configure_multi_app(app, config):
+    """
+    Serves every archive in the directory config.archive under /<name>/,
+    loaded on first request (see multi.ArchiveRegistry)
+    """
+    from slackviewer.multi import ArchiveRegistry, MountMiddleware
+    from slackviewer.utils.page_cache import page_cache
+
+    _configure_settings(app, config)
+    app.archive = None
+    app.archives = ArchiveRegistry(config.archive, config, config.max_loaded_archives)
+    app.wsgi_app = MountMiddleware(app.wsgi_app, app.archives)
+    page_cache.clear()
+
+
 @click.command()
 @click.option('-p', '--port', default=5000, envvar='SEV_PORT', type=click.INT, help="""\b
     Host port to serve your content on
@@ -147,25 +167,122 @@ def configure_app(app, config, downloader=None):
     Slack Bearer token for downloading authenticated resources (xoxb-...).
     Environment var: SEV_SLACK_TOKEN (default: None)
     """)
+@click.option("--thumbnails", is_flag=True, default=False, envvar='SEV_THUMBNAILS', help="""\b
+    With --download-external, scale downloaded images down to the size they are displayed in
+    and reference the small copies. Needs Pillow.
+    Environment var: SEV_THUMBNAILS (default: false)
+    """)
+@click.option("-w", "--workers", default=1, type=click.IntRange(min=1), envvar='SEV_WORKERS', help="""\b
+    Number of worker processes serving the viewer. The archive is loaded once and shared by all workers.
+    Environment var: SEV_WORKERS (default: 1)
+    """)
+@click.option("--page-size", default=0, type=click.IntRange(min=0), envvar='SEV_PAGE_SIZE', help="""\b
+    Only render the newest N messages (threads count as one) of a conversation and load older ones while
+    scrolling up. 0 renders the whole conversation. Not used with --html-only.
+    Environment var: SEV_PAGE_SIZE (default: 0)
+    """)
+@click.option("--x-sendfile", is_flag=True, default=False, envvar='SEV_X_SENDFILE', help="""\b
+    Let a front proxy (Apache mod_xsendfile, lighttpd) send attachments by responding with an X-Sendfile header.
+    Environment var: SEV_X_SENDFILE (default: false)
+    """)
+@click.option("--x-accel-prefix", default=None, type=click.STRING, envvar='SEV_X_ACCEL_PREFIX', help="""\b
+    Let nginx send attachments by responding with an X-Accel-Redirect header to this internal location,
+    which has to map to the extracted archive.
+    Environment var: SEV_X_ACCEL_PREFIX (default: None)
+    """)
+@click.option("--archive-hash", default="fast", type=click.Choice(["fast", "sha1"]), envvar='SEV_ARCHIVE_HASH', help="""\b
+    How a zip archive is identified in the extraction cache: "fast" hashes the zip directory, size and mtime,
+    "sha1" hashes the whole file.
+    Environment var: SEV_ARCHIVE_HASH (default: fast)
+    """)
+@click.option("--lazy-extract", is_flag=True, default=False, envvar='SEV_LAZY_EXTRACT', help="""\b
+    Only extract the metadata files of a zip archive up front and every conversation when it is loaded,
+    so hidden or not selected channels are never extracted.
+    Environment var: SEV_LAZY_EXTRACT (default: false)
+    """)
+@click.option("--cache-max-size", default=None, type=click.IntRange(min=1), metavar="MB", envvar='SEV_CACHE_MAX_SIZE', help="""\b
+    Maximum size of all extracted archives in the temporary directory. After extracting a new archive
+    the least recently used extractions are removed until they fit.
+    Environment var: SEV_CACHE_MAX_SIZE (default: unlimited)
+    """)
+@click.option("--multi", is_flag=True, default=False, envvar='SEV_MULTI', help="""\b
+    Serve every archive (.zip file or export directory) in the directory given with --archive,
+    each under /<archive name>/. Archives are loaded on their first request.
+    Environment var: SEV_MULTI (default: false)
+    """)
+@click.option("--max-loaded-archives", default=4, type=click.IntRange(min=1), envvar='SEV_MAX_LOADED_ARCHIVES', help="""\b
+    With --multi, the number of archives kept in memory. The least recently used one is unloaded
+    when another one is requested.
+    Environment var: SEV_MAX_LOADED_ARCHIVES (default: 4)
+    """)
+@click.option("--watch", is_flag=True, default=False, envvar='SEV_WATCH', help="""\b
+    Check the archive directory for new or changed day files every few seconds and reload the
+    conversations they belong to, without restarting the server. Needs an export directory as --archive.
+    Environment var: SEV_WATCH (default: false)
+    """)
+@click.option("--timings", default=None, type=click.Path(dir_okay=False), envvar='SEV_TIMINGS', help="""\b
+    Write a JSON report with wall/CPU time, counts and peak RSS per loading phase to this file.
+    Environment var: SEV_TIMINGS (default: None)
+    """)
+@click.option("--profile-dir", default=None, type=click.Path(file_okay=False), envvar='SEV_PROFILE_DIR', help="""\b
+    Write a cProfile dump per loading phase into this directory.
+    Environment var: SEV_PROFILE_DIR (default: None)
+    """)
 def main(**kwargs):
+    import webbrowser
+
+    import flask
+
+    from slackviewer.app import app
+    from slackviewer.freezer import CustomFreezer
+    from slackviewer.server import serve
+    from slackviewer.utils.downloader import ExternalResourceDownloader
+
     config = Config(kwargs)
     if not config.archive:
         raise ValueError("Empty path provided for archive")
 
+    if config.timings or config.profile_dir:
+        timer.enable(config.profile_dir)
+
+    if config.multi:
+        if config.html_only:
+            raise click.UsageError("--multi can not be combined with --html-only")
+        if not os.path.isdir(config.archive):
+            raise click.UsageError("--multi needs a directory of archives as --archive")
+
+    if config.watch:
+        if config.html_only or config.multi:
+            raise click.UsageError("--watch can not be combined with --html-only or --multi")
+        if not os.path.isdir(config.archive):
+            raise click.UsageError("--watch needs an export directory as --archive")
+        if config.workers > 1:
+            raise click.UsageError("--watch can not be combined with --workers")
+
+    if (config.workers > 1 and hasattr(os, "fork") and not config.debug
+            and not config.html_only and not config.test and not config.multi):
+        # no collections while loading, so the objects are packed densely
+        # before they are shared with the forked workers (see server.serve)
+        gc.disable()
+
     # 다운로더 초기화 (download_external 옵션이 활성화된 경우)
     downloader = None
     if config.download_external:
         if not config.html_only:
             print("WARNING: --download-external is only supported with --html-only mode")
         else:
-            downloader = ExternalResourceDownloader(config.output_dir, slack_token=config.slack_token)
+            downloader = ExternalResourceDownloader(config.output_dir, slack_token=config.slack_token,
+                                                    thumbnails=config.thumbnails)
             print(f"외부 리소스 다운로더가 초기화되었습니다. 저장 위치: {downloader.download_dir}")
             if config.slack_token:
                 print("Slack 토큰이 설정되어 인증된 리소스 다운로드를 시도합니다.")
             else:
                 print("WARNING: Slack 토큰이 설정되지 않아 인증이 필요한 리소스는 다운로드되지 않을 수 있습니다.")
 
-    configure_app(app, config, downloader)
+    if config.multi:
+        configure_multi_app(app, config)
+    else:
+        configure_app(app, config, downloader)
 
     if config.html_only:
         # We need relative URLs, otherwise channel refs do not work
@@ -227,14 +344,21 @@ def main(**kwargs):
             
             print("🔗 모든 HTML 파일의 링크 수정이 완료되었습니다!")
 
+        timer.write_report(config.timings)
+
         if not config.no_browser:
             webbrowser.open("file:///{}/index.html"
                             .format(os.path.abspath(config.output_dir)))
 
-    elif not config.test:
+    elif config.test:
+        timer.write_report(config.timings)
+
+    else:
+        timer.write_report(config.timings)
+        if config.watch:
+            from slackviewer.watch import ArchiveWatcher
+
+            ArchiveWatcher(config, app.archive, lambda archive: _install_archive(app, archive)).start()
         if not config.no_browser:
             webbrowser.open("http://{}:{}".format(config.ip, config.port))
-        app.run(
-            host=config.ip,
-            port=config.port
-        )
+        serve(app, config.ip, config.port, config.workers)
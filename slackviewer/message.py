@@ -4,6 +4,8 @@ import datetime
 import logging
 import emoji
 
+from slackviewer.blocks import BlockRenderer
+
 
 class Message(object):
 
@@ -22,6 +24,8 @@ class Message(object):
         self.slack_name = slack_name
         # 다운로더 인스턴스
         self._downloader = downloader
+        # rendered text, see msg
+        self._msg = None
 
     def __repr__(self):
         message = self._message.get("text")
@@ -43,6 +47,11 @@ class Message(object):
         else:
             logging.error("No user ID on %s", self._message)
 
+    @property
+    def sender_id(self):
+        """User or bot id as used by find_user, None without an error for messages of nobody"""
+        return self._message.get("user") or self._message.get("bot_id")
+
 
     @property
     def user(self):
@@ -88,6 +97,12 @@ class Message(object):
 
     @property
     def msg(self):
+        # Rendered once, the templates use it more than once per message
+        if self._msg is None:
+            self._msg = self._render_msg()
+        return self._msg
+
+    def _render_msg(self):
         # Slack recommends to use blocks, while the
         # 'text' field is the fall back. 'text' field also seems to be used
         # for notifications text
@@ -97,7 +112,7 @@ class Message(object):
         # All observed messages here have been
         # done through the Slack API.
         if "blocks" in self._message and self._message["blocks"]:
-            text = self._generate_blocks_text(self._message["blocks"])
+            text = BlockRenderer(self._formatter, self.slack_name).render(self._message["blocks"])
         else:
             text = self._message.get("text", "")
             if not text or text.strip() == "":
@@ -106,186 +121,6 @@ class Message(object):
         return self._formatter.render_text(text)
 
 
-    def _generate_blocks_text(self, blocks):
-        """Build a message together from various message["blocks"]"""
-        text = ""
-        for block in blocks:
-            if block["type"] in ["rich_text", "rich_text_quote"]:
-                for element in block["elements"]:
-                    text += self._format_rich_text_element(element)
-
-            elif "fields" in block:
-                for field in block["fields"]:
-                    text += self._format_block_type(field, block["type"])
-
-            elif "elements" in block:
-                for element in block["elements"]:
-                    text += self._format_block_type(element, block["type"])
-
-            elif "type" in block and block["type"] == "divider":
-                text += "---\n"
-
-            else:
-                logging.warning(f"Unknown block type: {block}")
-
-        return text
-
-    def _format_rich_text_element(self, element):
-        """Format rich text elements based on their type and styles"""
-        if element["type"] == "rich_text_quote":
-            # Start the quote block
-            quote_text = "<blockquote>"
-            # Recursively format nested elements
-            quote_text += ''.join(self._format_rich_text_element(nested_element) for nested_element in element["elements"])
-            # Close the quote block
-            quote_text += "</blockquote>"
-            return quote_text
-
-        elif element["type"] == "rich_text_section":
-            # Recursively format nested elements
-            return ''.join(self._format_rich_text_element(nested_element) for nested_element in element["elements"])
-
-        elif element["type"] == "text":
-            text = element["text"]
-            if "style" in element:
-                if "bold" in element["style"] and element["style"]["bold"]:
-                    text = f"<b>{text}</b>"
-                if "italic" in element["style"] and element["style"]["italic"]:
-                    text = f"<i>{text}</i>"
-            return text
-
-        elif element["type"] == "link":
-            text = element.get('text', element['url']).replace("_", "&#95;")
-            return f"<a href='{element['url']}'>{text}</a>"
-
-
-        elif element["type"] == "user":
-            user = self._formatter.find_user(self.user_message(element['user_id']))
-            if user:
-                return f"<b>@{user.display_name}</b>"
-            else:
-                return f"<b>[ Unknown user {element['user_id']} ]</b>"
-
-        elif element["type"] == "rich_text_list":
-            list_text = ""
-            if element["style"] == "bullet":
-                list_text += "<ul>"
-                list_text += "\n".join(f"<li>{self._format_rich_text_element(nested_element)}</li>" for nested_element in element["elements"])
-                list_text += "</ul>\n"
-            elif element["style"] == "ordered":
-                list_text += "<ol>"
-                list_text += "\n".join(f"<li>{self._format_rich_text_element(nested_element)}</li>" for nested_element in element["elements"])
-                list_text += "</ol>\n"
-            else:
-                logging.warning(f"Unsupported rich text list style '{element['style']}' for {element}")
-            return list_text
-
-        elif element["type"] == "emoji":
-            if "unicode" in element:
-                return emoji.emojize(f":{element['name']}:", language='alias')
-            else:
-                return element["name"]
-
-        # Prevent unwanted formatting of preformatted text
-        elif element["type"] == "rich_text_preformatted":
-            preformatted_text = ""
-            for nested_element in element["elements"]:
-                if nested_element["type"] == "text":
-                    nested_element["text"] = nested_element["text"].replace("_", "&#95;")
-                preformatted_text += self._format_rich_text_element(nested_element)
-            return f"<pre>{preformatted_text}</pre>"
-
-        elif element["type"] == "channel":
-            channel_id = element["channel_id"]
-            channel_name = self._formatter.find_channel(channel_id)
-            if channel_name:
-                return f"<a href='https://{self.slack_name}.slack.com/archives/{channel_id}'>{channel_name}</a>"
-            else:
-                return f"<a href='https://{self.slack_name}.slack.com/archives/{channel_id}'>[ Unknown channel {channel_id} ]</a>"
-
-        logging.warning(f"Unsupported rich text element type '{element['type']}' for {element}")
-        return ""
-
-
-
-
-    def _format_block_type(self, text_obj, b_type):
-        """Format the text based on the block type"""
-        if b_type == "image":
-            if "image_url" in text_obj:
-                image_url = text_obj["image_url"]
-                alt_text = text_obj.get("alt_text", "")
-                title = text_obj.get("title", {}).get("text", "")
-                return f"<img src='{image_url}' alt='{alt_text}' title='{title}'>\n"
-            else:
-                logging.warning(f"Block Type {b_type}: Missing 'image_url' in {text_obj}")
-                return f"unsupported_block({b_type}: {text_obj})\n\n"
-
-        if b_type == "context":
-            if "type" in text_obj and text_obj["type"] == "image":
-                if "image_url" in text_obj:
-                    image_url = text_obj["image_url"]
-                    alt_text = text_obj.get("alt_text", "")
-                    return f"<img src='{image_url}' alt='{alt_text}'>\n"
-                else:
-                    logging.warning(f"Block Type {b_type}: Missing 'image_url' in {text_obj}")
-                    return f"unsupported_block({b_type}: {text_obj})\n\n"
-            elif "text" in text_obj:
-                text = text_obj["text"]
-                return f"<small>{text}</small>\n"
-            else:
-                logging.warning(f"Block Type {b_type}: Missing 'text' in {text_obj}")
-                return f"unsupported_block({b_type}: {text_obj})\n\n"
-
-        if "text" not in text_obj:
-            logging.warning(f"Block Type {b_type}: Missing 'text' in {text_obj}")
-            return f"unsupported_block({b_type}: {text_obj})\n\n"
-
-        text = text_obj["text"]
-
-        if "type" in text_obj and text_obj["type"] not in ["plain_text", "mrkdwn", "button"]:
-            logging.warning(f"Block Type {b_type}: Unsupported text type '{text_obj['type']}' for {text_obj}")
-            return f"unsupported_block({b_type}: {text})\n\n"
-
-        if "type" in text_obj and text_obj["type"] == "button":
-            if "text" in text_obj['text']:
-                text = f"Slack_Button({text['text']})"
-
-        if b_type == "header":
-            return f"*{text}*\n\n"
-        elif b_type == "section":
-            return f"{text}\n\n"
-        elif b_type == "actions":
-            return f"Slack_Action({text})\n"
-        else:
-            logging.warning(f"Unsupported block type '{b_type}' for {text_obj}")
-            return f"unsupported_block({b_type}: {text_obj}\n\n)"
-
-
-
-    def _generate_blocks_text(self, blocks):
-        """Build a message together from various message["blocks"]"""
-        text = ""
-        for block in blocks:
-            if block["type"] == "image":
-                text += self._format_block_type(block, block["type"])
-            elif block["type"] in ["rich_text", "rich_text_quote"]:
-                for element in block["elements"]:
-                    text += self._format_rich_text_element(element)
-            elif "fields" in block:
-                for field in block["fields"]:
-                    text += self._format_block_type(field, block["type"])
-            elif "elements" in block:
-                for element in block["elements"]:
-                    text += self._format_block_type(element, block["type"])
-            elif "type" in block and block["type"] == "divider":
-                text += "---\n"
-            else:
-                logging.warning(f"Unknown block type: {block}")
-        return text
-
-
-
     def user_message(self, user_id):
         return {"user": user_id}
 
@@ -317,7 +152,7 @@ class Message(object):
             original_url = self.user.image_url(self._DEFAULT_USER_ICON_SIZE)
             if self._downloader and original_url:
                 # 다운로더가 있으면 로컬 경로로 변환 시도
-                local_path = self._downloader.get_local_path(original_url)
+                local_path = self._downloader.get_local_path(original_url, self._DEFAULT_USER_ICON_SIZE)
                 if local_path:
                     return local_path
             return original_url
@@ -328,6 +163,10 @@ class Message(object):
     def id(self):
         return self.time
 
+    @property
+    def ts(self):
+        return self._message.get("ts")
+
     @property
     def subtype(self):
         return self._message.get("subtype")
@@ -371,12 +210,16 @@ class LinkAttachment():
             original_url = self._raw["image_url"]
             if self._downloader:
                 # 다운로더가 있으면 로컬 경로로 변환 시도
-                local_path = self._downloader.get_local_path(original_url)
+                local_path = self._downloader.get_local_path(original_url, size)
                 if local_path:
+                    width, height = self._raw.get("image_width"), self._raw.get("image_height")
+                    if local_path != self._downloader.get_local_path(original_url):
+                        # downscaled copy, see ExternalResourceDownloader.create_thumbnails
+                        width, height = self._fit(width, height, size)
                     return {
                         "src": local_path,
-                        "width": self._raw.get("image_width"),
-                        "height": self._raw.get("image_height"),
+                        "width": width,
+                        "height": height,
                     }
             return {
                 "src": original_url,
@@ -401,7 +244,7 @@ class LinkAttachment():
                 original_url = self._raw[thumb_key]
                 if self._downloader:
                     # 다운로더가 있으면 로컬 경로로 변환 시도
-                    local_path = self._downloader.get_local_path(original_url)
+                    local_path = self._downloader.get_local_path(original_url, size)
                     if local_path:
                         return {
                             "src": local_path,
@@ -416,6 +259,14 @@ class LinkAttachment():
             else:
                 logging.info("No thumbnail found for [%s]", self._raw.get("title"))
 
+    @staticmethod
+    def _fit(width, height, size):
+        """width and height scaled down to fit into size x size pixels"""
+        if not width or not height or max(width, height) <= size:
+            return width, height
+        scale = size / max(width, height)
+        return max(1, round(width * scale)), max(1, round(height * scale))
+
     @property
     def is_image(self):
         return self._raw.get("mimetype", "").startswith("image/")
@@ -0,0 +1,146 @@
+"""Serving all archives of a directory from one app, each under /<slug>/"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import weakref
+
+from collections import OrderedDict
+
+from slackviewer.state import ARCHIVE_KEY, load_archive
+from slackviewer.user import User
+
+
+# archives kept loaded at the same time, the least recently used is dropped
+DEFAULT_MAX_LOADED_ARCHIVES = 4
+
+# first path segments the app itself needs at the top level
+_RESERVED_SLUGS = frozenset(["static"])
+
+
+def slugify(name):
+    slug = re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+    return slug or "archive"
+
+
+def find_archives(directory):
+    """
+    The archives in directory (zip files and extracted exports), as an
+    ordered mapping of a URL slug of their name to their path.
+    """
+    archives = OrderedDict()
+    for entry in sorted(os.scandir(directory), key=lambda e: e.name):
+        if entry.is_file() and entry.name.lower().endswith(".zip"):
+            name = entry.name[:-len(".zip")]
+        elif entry.is_dir() and os.path.isfile(os.path.join(entry.path, "users.json")):
+            name = entry.name
+        else:
+            continue
+        slug = base = slugify(name)
+        suffix = 1
+        while slug in archives or slug in _RESERVED_SLUGS:
+            suffix += 1
+            slug = "{}-{}".format(base, suffix)
+        archives[slug] = entry.path
+    return archives
+
+
+class UserTable(object):
+    """
+    Shares the User objects of identical users.json entries between the
+    loaded archives (successive exports of a workspace mostly contain the
+    same users). Entries are dropped with the last archive using them.
+    """
+
+    def __init__(self):
+        self._users = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._users)
+
+    def intern(self, raw):
+        key = hashlib.sha1(json.dumps(raw, sort_keys=True).encode("utf-8")).digest()
+        with self._lock:
+            user = self._users.get(key)
+            if user is None:
+                user = self._users[key] = User(raw)
+            return user
+
+
+class ArchiveRegistry(object):
+    """
+    Loads the archives of a directory on first request and keeps at most
+    max_loaded of them, dropping the least recently used one.
+    """
+
+    def __init__(self, directory, config, max_loaded=DEFAULT_MAX_LOADED_ARCHIVES):
+        self.archives = find_archives(directory)
+        self.max_loaded = max_loaded
+        self.users = UserTable()
+        self._config = config
+        self._loaded = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def loaded(self):
+        """Slugs of the loaded archives, least recently used first"""
+        with self._lock:
+            return list(self._loaded)
+
+    def get(self, slug):
+        """LoadedArchive of slug, loaded if needed"""
+        with self._lock:
+            archive = self._loaded.get(slug)
+            if archive is not None:
+                self._loaded.move_to_end(slug)
+                return archive
+            # concurrent requests for an archive that is not loaded wait for
+            # one load instead of loading it several times
+            loading = self._loading.setdefault(slug, threading.Lock())
+
+        with loading:
+            try:
+                with self._lock:
+                    archive = self._loaded.get(slug)
+                if archive is None:
+                    archive = load_archive(self._config.replace(archive=self.archives[slug]), users=self.users)
+                with self._lock:
+                    self._loaded[slug] = archive
+                    self._loaded.move_to_end(slug)
+                    while len(self._loaded) > self.max_loaded:
+                        self._loaded.popitem(last=False)
+            finally:
+                # also after a failed load, the next request tries again
+                with self._lock:
+                    self._loading.pop(slug, None)
+        return archive
+
+
+class MountMiddleware(object):
+    """
+    WSGI middleware mounting the archives of an ArchiveRegistry: requests
+    for /<slug>/<path> reach the app as <path> with SCRIPT_NAME /<slug>, so
+    url_for() links stay inside the archive. Other paths are passed on as
+    they are.
+    """
+
+    def __init__(self, wsgi_app, registry):
+        self.wsgi_app = wsgi_app
+        self.registry = registry
+
+    def __call__(self, environ, start_response):
+        path = environ.get("PATH_INFO", "")
+        slug, slash, rest = path.lstrip("/").partition("/")
+        if slug not in self.registry.archives:
+            return self.wsgi_app(environ, start_response)
+
+        script_name = environ.get("SCRIPT_NAME", "").rstrip("/") + "/" + slug
+        if not slash:
+            start_response("301 Moved Permanently", [("Location", script_name + "/"), ("Content-Length", "0")])
+            return [b""]
+        environ = dict(environ, SCRIPT_NAME=script_name, PATH_INFO="/" + rest)
+        environ[ARCHIVE_KEY] = slug
+        return self.wsgi_app(environ, start_response)
@@ -0,0 +1,58 @@
+"""Pages of the threaded message lists, addressed by timestamp cursors"""
+
+import bisect
+
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+class MessageIndex(object):
+    """
+    Sorted timestamps of the top level messages of one conversation.
+
+    In the lists built by the Reader, thread replies follow their parent
+    message, so pages are counted in top level messages and a thread is
+    never split between two pages.
+    """
+
+    def __init__(self, messages):
+        self.messages = messages
+        # list position and ts of every top level message
+        self.positions = []
+        self.timestamps = []
+        latest = 0.0
+        for position, message in enumerate(messages):
+            if message.is_thread_msg:
+                continue
+            try:
+                ts = float(message._message.get("ts", 0))
+            except ValueError:
+                ts = 0.0
+            # keeps the list sorted for bisect, even if a day file is not
+            latest = max(latest, ts)
+            self.positions.append(position)
+            self.timestamps.append(latest)
+
+    def page(self, before=None, limit=DEFAULT_PAGE_SIZE):
+        """
+        Returns the newest limit top level messages (with their replies)
+        older than before, in chronological order, and the cursor for the
+        page before them, None if there are no older messages.
+
+        :param float before: cursor returned for the previous page, None for
+        the newest messages
+        :param int limit: number of top level messages
+        """
+        end = len(self.positions) if before is None else bisect.bisect_left(self.timestamps, before)
+        start = max(0, end - limit)
+        if start == end:
+            return [], None
+        # messages with the same ts as the cursor are all on this page,
+        # otherwise the next page would skip them
+        start = bisect.bisect_left(self.timestamps, self.timestamps[start], 0, start)
+
+        first = self.positions[start]
+        last = self.positions[end] if end < len(self.positions) else len(self.messages)
+        cursor = f"{self.timestamps[start]:.6f}" if start > 0 else None
+        return self.messages[first:last], cursor
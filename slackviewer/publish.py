@@ -0,0 +1,305 @@
+"""Republishing the messages of an archive to a Microsoft Teams incoming webhook"""
+
+import json
+import os
+import sqlite3
+import time
+
+import requests
+
+from slackviewer.utils.scheduler import Scheduler, THROTTLE_STATUS, parse_retry_after
+
+
+# messages per card and the largest payload Teams accepts (28 KB) with some room
+DEFAULT_BATCH_SIZE = 10
+MAX_PAYLOAD_BYTES = 27 * 1024
+# (seconds, requests) windows of the Teams connector rate limits
+TEAMS_LIMITS = ((1, 4), (30, 60), (3600, 100), (7200, 150), (86400, 1800))
+# attempts per batch before publishing stops
+MAX_ATTEMPTS = 8
+
+# Teams sometimes answers throttled requests with 200 and this in the body
+_THROTTLED_BODY = "HTTP error 429"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    id INTEGER PRIMARY KEY,
+    conversation TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    sent_at REAL
+);
+CREATE INDEX IF NOT EXISTS batches_sent_at ON batches (sent_at);
+CREATE TABLE IF NOT EXISTS messages (
+    conversation TEXT NOT NULL,
+    ts TEXT NOT NULL,
+    batch INTEGER NOT NULL REFERENCES batches (id),
+    PRIMARY KEY (conversation, ts)
+);
+CREATE TABLE IF NOT EXISTS legacy_sent (
+    time TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS files (
+    name TEXT PRIMARY KEY,
+    url TEXT NOT NULL
+);
+"""
+
+
+class PublishError(Exception):
+    pass
+
+
+class PublishState(object):
+    """
+    Publishing progress in a SQLite database: the batches (card payloads)
+    planned for every message and whether they were sent, and the links of
+    files uploaded elsewhere. Every change is committed right away, so a
+    crashed run is resumed where it stopped.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.executescript(_SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def import_legacy(self, directory):
+        """
+        Imports sent_messages.json (sent message times) and uploaded_files.json
+        (file name -> URL) of the node publishing scripts from directory.
+
+        :return: (number of sent messages, number of files) imported
+        """
+        sent, files = [], {}
+        sent_path = os.path.join(directory, "sent_messages.json")
+        if os.path.isfile(sent_path):
+            with open(sent_path, encoding="utf8") as f:
+                sent = json.load(f)
+        files_path = os.path.join(directory, "uploaded_files.json")
+        if os.path.isfile(files_path):
+            with open(files_path, encoding="utf8") as f:
+                files = json.load(f)
+        with self._db:
+            self._db.executemany("INSERT OR IGNORE INTO legacy_sent (time) VALUES (?)", [(t,) for t in sent])
+            self._db.executemany("INSERT OR REPLACE INTO files (name, url) VALUES (?, ?)", files.items())
+        return len(sent), len(files)
+
+    def file_urls(self):
+        return dict(self._db.execute("SELECT name, url FROM files"))
+
+    def known(self, conversation):
+        """ts of the messages of conversation already planned or sent"""
+        return {ts for ts, in self._db.execute("SELECT ts FROM messages WHERE conversation = ?", (conversation,))}
+
+    def legacy_sent(self):
+        """Message times sent by the node scripts"""
+        return {t for t, in self._db.execute("SELECT time FROM legacy_sent")}
+
+    def add_batch(self, conversation, payload, timestamps):
+        with self._db:
+            cursor = self._db.execute("INSERT INTO batches (conversation, payload) VALUES (?, ?)",
+                                      (conversation, json.dumps(payload, ensure_ascii=False)))
+            self._db.executemany("INSERT OR IGNORE INTO messages (conversation, ts, batch) VALUES (?, ?, ?)",
+                                 [(conversation, ts, cursor.lastrowid) for ts in timestamps])
+        return cursor.lastrowid
+
+    def pending(self):
+        """(id, payload) of the batches not sent yet, in the order they were planned"""
+        rows = self._db.execute("SELECT id, payload FROM batches WHERE sent_at IS NULL ORDER BY id").fetchall()
+        return [(batch_id, json.loads(payload)) for batch_id, payload in rows]
+
+    def attempted(self, batch_id):
+        with self._db:
+            self._db.execute("UPDATE batches SET attempts = attempts + 1 WHERE id = ?", (batch_id,))
+        return self._db.execute("SELECT attempts FROM batches WHERE id = ?", (batch_id,)).fetchone()[0]
+
+    def mark_sent(self, batch_id, sent_at):
+        with self._db:
+            self._db.execute("UPDATE batches SET sent_at = ? WHERE id = ?", (sent_at, batch_id))
+
+    def sent_since(self, since):
+        """Number of batches sent after the epoch time since"""
+        return self._db.execute("SELECT COUNT(*) FROM batches WHERE sent_at > ?", (since,)).fetchone()[0]
+
+    def stats(self):
+        """(sent, pending) number of batches"""
+        sent, total = self._db.execute("SELECT COUNT(sent_at), COUNT(*) FROM batches").fetchone()
+        return sent, total - sent
+
+
+def _file_name(attachment):
+    for key in ("name", "title"):
+        try:
+            if attachment[key]:
+                return attachment[key]
+        except KeyError:
+            pass
+    return attachment.link
+
+
+def _username(message):
+    try:
+        return message.username or "Unknown User"
+    except AttributeError:
+        # a user that is neither in users.json nor a bot, the templates show nothing for it
+        return "Unknown User"
+
+
+def message_section(message, file_urls):
+    """MessageCard section of a Message, in the layout of the node scripts"""
+    section = {
+        "activityTitle": "{}**{}** ({})".format("↳ " if message.is_thread_msg else "", _username(message), message.time),
+    }
+    if message.msg and message.msg.strip():
+        section["activitySubtitle"] = message.msg
+    facts = []
+    for number, attachment in enumerate(message.files, 1):
+        name = _file_name(attachment)
+        link = file_urls.get(name) or attachment.link
+        facts.append({"name": "📎 파일 {}".format(number), "value": "[{}]({})".format(name, link) if link else name})
+    if message.reactions:
+        facts.append({"name": "👍 반응", "value": ", ".join(
+            "{} {}".format(r["name"], ", ".join(r["usernames"])) for r in message.reactions)})
+    if facts:
+        section["facts"] = facts
+    return section
+
+
+def card(title, sections):
+    return {
+        "@type": "MessageCard",
+        "@context": "http://schema.org/extensions",
+        "themeColor": "0076D7",
+        "summary": title,
+        "title": title,
+        "activityImage": "https://img.icons8.com/color/48/000000/user.png",
+        "sections": sections,
+    }
+
+
+def _size(payload):
+    return len(json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+
+
+def _fit(title, section, max_bytes):
+    """section, with its text shortened if a card of it alone is too large"""
+    over = _size(card(title, [section])) - max_bytes
+    text = section.get("activitySubtitle")
+    if over <= 0 or not text:
+        return section
+    # shortened by characters, which are at least one byte each
+    return dict(section, activitySubtitle=text[:max(0, len(text) - over - 3)] + "...")
+
+
+def plan(state, title, conversation, messages, batch_size=DEFAULT_BATCH_SIZE, max_bytes=MAX_PAYLOAD_BYTES,
+         legacy=None, file_urls=None):
+    """
+    Adds batches for the messages of conversation that are not planned yet.
+    Messages sent by the node scripts (by their time) are skipped, as are
+    messages without a ts and repeated ones.
+
+    :param set legacy: state.legacy_sent(), read from state if not given
+    :param dict file_urls: state.file_urls(), read from state if not given
+
+    :return: number of messages added
+    """
+    known = state.known(conversation)
+    if legacy is None:
+        legacy = state.legacy_sent()
+    if file_urls is None:
+        file_urls = state.file_urls()
+    sections, timestamps, added = [], [], 0
+
+    def flush():
+        state.add_batch(conversation, card(title, sections), timestamps)
+
+    for message in messages:
+        if message.ts is None or message.ts in known or message.time in legacy:
+            continue
+        known.add(message.ts)
+        section = _fit(title, message_section(message, file_urls), max_bytes)
+        if sections and (len(sections) >= batch_size or _size(card(title, sections + [section])) > max_bytes):
+            flush()
+            sections, timestamps = [], []
+        sections.append(section)
+        timestamps.append(message.ts)
+        added += 1
+    if sections:
+        flush()
+    return added
+
+
+class Publisher(object):
+    """
+    Sends the pending batches of a PublishState to a webhook, one at a time
+    and in order. The windows of limits are counted from the send times in
+    the state, so they hold across restarts. Throttled requests (429, 5xx
+    or Teams' throttling answer) are retried after their Retry-After or a
+    growing delay.
+    """
+
+    def __init__(self, state, webhook_url, limits=TEAMS_LIMITS, session=None, scheduler=None,
+                 clock=time.time, sleep=time.sleep, timeout=30):
+        self.state = state
+        self.webhook_url = webhook_url
+        self.limits = limits
+        self.session = session or requests.Session()
+        self.scheduler = scheduler or Scheduler(rate=float(limits[0][1]) / limits[0][0], burst=1, max_concurrency=1)
+        self.timeout = timeout
+        self._clock = clock
+        self._sleep = sleep
+
+    def _window_wait(self):
+        """Seconds until another request fits into every window"""
+        now = self._clock()
+        wait = 0.0
+        for seconds, requests_allowed in self.limits:
+            if self.state.sent_since(now - seconds) >= requests_allowed:
+                # the window frees up when its oldest request leaves it,
+                # checked again after waiting
+                wait = max(wait, min(seconds, 60.0))
+        return wait
+
+    def _send(self, batch_id, payload):
+        """True once sent, False if throttled"""
+        with self.scheduler.slot(self.webhook_url) as slot:
+            self.state.attempted(batch_id)
+            # UTF-8 as measured by _size, json= would escape every non-ASCII character
+            response = self.session.post(self.webhook_url, data=json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"}, timeout=self.timeout)
+            if response.status_code in THROTTLE_STATUS or _THROTTLED_BODY in response.text:
+                slot.throttle(parse_retry_after(response.headers.get("Retry-After")))
+                return False
+            if response.status_code >= 400:
+                raise PublishError("{} answered {}: {}".format(self.webhook_url, response.status_code, response.text))
+        self.state.mark_sent(batch_id, self._clock())
+        return True
+
+    def run(self, max_attempts=MAX_ATTEMPTS):
+        """
+        Sends all pending batches.
+
+        :return: number of batches sent
+        """
+        sent = 0
+        for batch_id, payload in self.state.pending():
+            attempt = 0
+            while True:
+                wait = self._window_wait()
+                while wait > 0:
+                    self._sleep(wait)
+                    wait = self._window_wait()
+                try:
+                    if self._send(batch_id, payload):
+                        break
+                except requests.RequestException as e:
+                    print("⚠️ Batch {} failed: {}".format(batch_id, e))
+                attempt += 1
+                if attempt >= max_attempts:
+                    raise PublishError("Batch {} was not accepted after {} attempts".format(batch_id, attempt))
+                self._sleep(self.scheduler.backoff(self.webhook_url, attempt - 1))
+            sent += 1
+        return sent
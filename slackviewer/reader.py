@@ -1,17 +1,27 @@
 from collections import OrderedDict
 
 import glob
-import io
-import json
 import os
 import datetime
 import logging
 import pathlib
+import zipfile
 
 from slackviewer.formatter import SlackFormatter
 from slackviewer.message import Message
 from slackviewer.user import User, deleted_user
-from slackviewer.archive import extract_archive
+from slackviewer.archive import extract_archive, extract_conversations
+from slackviewer.utils.json_files import load_json
+from slackviewer.utils.timing import timer, count_messages
+
+
+# metadata file of each kind of conversation
+_CONVERSATION_FILES = {
+    "channel": "channels.json",
+    "group": "groups.json",
+    "dm": "dms.json",
+    "mpim": "mpims.json",
+}
 
 
 class Reader(object):
@@ -19,39 +29,65 @@ class Reader(object):
     Reader object will read all of the archives' data from the json files
     """
 
-    def __init__(self, config, downloader=None):
+    def __init__(self, config, downloader=None, users=None):
         self._config = config
-        self._PATH = extract_archive(config.archive)
+        cache_max_size = config.cache_max_size * 2 ** 20 if config.cache_max_size else None
+        self._PATH = extract_archive(config.archive, config.archive_hash, config.lazy_extract, cache_max_size)
         self._since = config.since
         self._downloader = downloader
 
         # keep list of all channels to hide to flag not found ones
         self._remaining_unhidden_channels = config.hide_channels.copy()
 
+        # metadata files by name, see _read_from_json
+        self._json_files = {}
+        # see conversation_index
+        self._conversation_index = None
+        # (formatter, name -> channel id) by metadata file, see _iter_messages
+        self._formatters = {}
+
         # slack name that is in the url https://<slackname>.slack.com
         self._slack_name = self._get_slack_name()
         # TODO: Make sure this works
-        with io.open(os.path.join(self._PATH, "users.json"), encoding="utf8") as f:
-            self.__USER_DATA = {u["id"]: User(u) for u in json.load(f)}
-            slackbot = {
-                "id": "USLACKBOT",
-                "name": "slackbot",
-                "profile": {
-                    "image_24": "https://a.slack-edge.com/0180/img/slackbot_24.png",
-                    "image_32": "https://a.slack-edge.com/2fac/plugins/slackbot/assets/service_32.png",
-                    "image_48": "https://a.slack-edge.com/2fac/plugins/slackbot/assets/service_48.png",
-                    "image_72": "https://a.slack-edge.com/0180/img/slackbot_72.png",
-                    "image_192": "https://a.slack-edge.com/66f9/img/slackbot_192.png",
-                    "image_512": "https://a.slack-edge.com/1801/img/slackbot_512.png",
-                }
+        # users (multi.UserTable) shares the User objects with other archives
+        make_user = users.intern if users is not None else User
+        self.__USER_DATA = {u["id"]: make_user(u) for u in load_json(os.path.join(self._PATH, "users.json"))}
+        slackbot = {
+            "id": "USLACKBOT",
+            "name": "slackbot",
+            "profile": {
+                "image_24": "https://a.slack-edge.com/0180/img/slackbot_24.png",
+                "image_32": "https://a.slack-edge.com/2fac/plugins/slackbot/assets/service_32.png",
+                "image_48": "https://a.slack-edge.com/2fac/plugins/slackbot/assets/service_48.png",
+                "image_72": "https://a.slack-edge.com/0180/img/slackbot_72.png",
+                "image_192": "https://a.slack-edge.com/66f9/img/slackbot_192.png",
+                "image_512": "https://a.slack-edge.com/1801/img/slackbot_512.png",
             }
-            self.__USER_DATA.setdefault("USLACKBOT", User(slackbot))
+        }
+        self.__USER_DATA.setdefault("USLACKBOT", User(slackbot))
 
     ##################
     # Public Methods #
     ##################
 
+    @timer.timed("compile_channels", count_messages)
     def compile_channels(self, channels=None):
+        return dict(self.iter_channels(channels))
+
+    def iter_channels(self, channels=None, sort=False):
+        """
+        Same as compile_channels, but returns a generator which loads and
+        thread-builds one channel at a time, yielding (name, messages).
+        Only the channel currently being consumed is kept in memory.
+
+        :param bool sort: yield the channels sorted by name
+        """
+        channel_names = self.channel_names(channels, sort)
+
+        return self._iter_messages(channel_names, "channels.json")
+
+    def channel_names(self, channels=None, sort=False):
+        """Names of the channels compile_channels would return, without reading any messages"""
         if isinstance(channels, str):
             channels = channels.split(',')
 
@@ -59,38 +95,62 @@ class Reader(object):
         channel_names = [c["name"] for c in channel_data.values() if not channels or c["name"] in channels]
 
         channel_names = self._remove_hidden_channels(channel_names)
+        if sort:
+            channel_names = sorted(channel_names)
 
-        return self._create_messages(channel_names, channel_data)
+        return channel_names
 
+    @timer.timed("compile_groups", count_messages)
     def compile_groups(self):
         """Get private channels"""
+        return dict(self.iter_groups())
 
-        group_data = self._read_from_json("groups.json")
-        group_names = [c["name"] for c in group_data.values()]
+    def iter_groups(self, names=None):
+        """
+        Generator version of compile_groups, see iter_channels
+
+        :param [str] names: only yield these groups
+        """
 
-        group_names = self._remove_hidden_channels(group_names)
+        return self._iter_messages(self.group_names(names), "groups.json")
 
-        return self._create_messages(group_names, group_data)
+    def group_names(self, names=None):
+        """Names of the groups compile_groups would return, without reading any messages"""
 
+        group_data = self._read_from_json("groups.json")
+        group_names = [c["name"] for c in group_data.values() if not names or c["name"] in names]
+
+        return self._remove_hidden_channels(group_names)
+
+    @timer.timed("compile_dm_messages", count_messages)
     def compile_dm_messages(self):
-        # Gets list of dm objects with dm ID and array of members ids
-        dm_data = self._read_from_json("dms.json")
-        dm_ids = [c["id"] for c in dm_data.values()]
+        return dict(self.iter_dm_messages())
+
+    def iter_dm_messages(self, ids=None):
+        """
+        Generator version of compile_dm_messages, see iter_channels
+
+        :param [str] ids: only yield the dms with these ids
+        """
+        return self._iter_messages(self.dm_ids(ids), "dms.json")
 
-        # True is passed here to let the create messages function know that
-        # it is dm data being passed to it
-        return self._create_messages(dm_ids, dm_data, True)
+    def dm_ids(self, ids=None):
+        """Ids of all dms, without reading any messages"""
+        dm_data = self._read_from_json("dms.json")
+        return [c["id"] for c in dm_data.values() if not ids or c["id"] in ids]
 
+    @timer.timed("compile_dm_users", lambda dms: {"conversations": len(dms)})
     def compile_dm_users(self):
         """
         Gets the info for the members within the dm
 
-        Returns a list of all dms with the members that have ever existed
+        Returns a list of all dms with messages and the members that have ever existed
 
         :rtype: [object]
         {
             id: <id>
-            users: [<user_id>]
+            users: [<User>]
+            names: [<name shown in the sidebar>]
         }
 
         """
@@ -98,51 +158,69 @@ class Reader(object):
         dm_data = self._read_from_json("dms.json")
         dms = dm_data.values()
         all_dms_users = []
+        index = self.conversation_index()
 
         for dm in dms:
             # checks if messages actually exist
-            if dm["id"] not in self._EMPTY_DMS:
+            if dm["id"] in index:
                 # added try catch for users from shared workspaces not in current workspace
                 try:
                     if "members" in dm:
                         users = dm["members"]
                     if "user" in dm:
                         users = [dm["user"]]
-                    dm_members = {"id": dm["id"], "users": [self.__USER_DATA.setdefault(m, deleted_user(m)) for m in users]}
+                    dm_users = [self._find_user(m) for m in users]
+                    dm_members = {"id": dm["id"], "users": dm_users, "names": [self._sidebar_name(u) for u in dm_users]}
                     all_dms_users.append(dm_members)
                 except KeyError:
                     dm_members = None
 
         return all_dms_users
 
+    @timer.timed("compile_mpim_messages", count_messages)
     def compile_mpim_messages(self):
         """Return multiple person DM groups"""
 
-        mpim_data = self._read_from_json("mpims.json")
-        mpim_names = [c["name"] for c in mpim_data.values()]
+        return dict(self.iter_mpim_messages())
+
+    def iter_mpim_messages(self, names=None):
+        """
+        Generator version of compile_mpim_messages, see iter_channels
+
+        :param [str] names: only yield these mpims
+        """
 
-        return self._create_messages(mpim_names, mpim_data)
+        return self._iter_messages(self.mpim_names(names), "mpims.json")
 
+    def mpim_names(self, names=None):
+        """Names of all mpims, without reading any messages"""
+        mpim_data = self._read_from_json("mpims.json")
+        return [c["name"] for c in mpim_data.values() if not names or c["name"] in names]
+
+    @timer.timed("compile_mpim_users", lambda mpims: {"conversations": len(mpims)})
     def compile_mpim_users(self):
         """
         Gets the info for the members within the multiple person instant message
 
-        Returns a list of all dms with the members that have ever existed
+        Returns a list of all mpims with messages and the members that have ever existed
 
         :rtype: [object]
         {
             name: <name>
-            users: [<user_id>]
+            users: [<User>]
+            names: [<name shown in the sidebar>]
         }
 
         """
 
         mpim_data = self._read_from_json("mpims.json")
-        mpims = [c for c in mpim_data.values()]
+        index = self.conversation_index()
+        mpims = [c for c in mpim_data.values() if c["name"] in index]
         all_mpim_users = []
 
         for mpim in mpims:
-            mpim_members = {"name": mpim["name"], "users": [] if "members" not in mpim.keys() else [self.__USER_DATA.setdefault(m, deleted_user(m)) for m in mpim["members"]]}
+            mpim_users = [] if "members" not in mpim.keys() else [self._find_user(m) for m in mpim["members"]]
+            mpim_members = {"name": mpim["name"], "users": mpim_users, "names": [self._sidebar_name(u) for u in mpim_users]}
             all_mpim_users.append(mpim_members)
 
         return all_mpim_users
@@ -155,6 +233,49 @@ class Reader(object):
         except KeyError:
             return 0
 
+    def conversation_index(self):
+        """
+        Names of the conversation directories with at least one day file.
+        Built from the directory listing (the zip directory with
+        --lazy-extract) without reading or extracting any file.
+
+        :rtype: frozenset
+        """
+        if self._conversation_index is None:
+            if self._config.lazy_extract and not os.path.isdir(self._config.archive):
+                with zipfile.ZipFile(self._config.archive) as z:
+                    names = [n.split("/") for n in z.namelist()]
+                index = {p[0] for p in names if len(p) == 2 and self._is_day_file(p[1])}
+            else:
+                index = set()
+                with os.scandir(self._PATH) as entries:
+                    for entry in entries:
+                        if entry.is_dir() and self._has_day_files(entry.path):
+                            index.add(entry.name)
+            self._conversation_index = frozenset(index)
+        return self._conversation_index
+
+    def conversation_messages(self, kind, name):
+        """
+        Messages of a single conversation, None if it has none. Unlike the
+        iter_* methods, this neither lists the other conversations nor
+        applies --channels and --hide-channels.
+
+        :param str kind: "channel", "group", "dm" or "mpim"
+        :param str name: name of the conversation, the id for a dm
+        """
+        for _, messages in self._iter_messages([name], _CONVERSATION_FILES[kind]):
+            return messages
+        return None
+
+    def ensure_extracted(self, names):
+        """
+        With --lazy-extract, extracts the directories of the given
+        conversations if they have not been extracted yet
+        """
+        if self._config.lazy_extract and not os.path.isdir(self._config.archive):
+            extract_conversations(self._config.archive, self._PATH, names)
+
     def slack_name(self):
         """Returns the (guessed) slack name"""
         return self._slack_name
@@ -172,37 +293,41 @@ class Reader(object):
     # Private Methods #
     ###################
 
-    def _create_messages(self, names, data, isDms=False):
-        """
-        Creates object of arrays of messages from each json file specified by the names or ids
-
-        :param [str] names: names of each group of messages
+    @staticmethod
+    def _is_day_file(name):
+        # what glob("*.json") matches
+        return name.endswith(".json") and not name.startswith(".")
 
-        :param [object] data: array of objects detailing where to get the messages from in
-        the directory structure
+    @staticmethod
+    def _has_day_files(path):
+        with os.scandir(path) as entries:
+            return any(Reader._is_day_file(e.name) for e in entries)
 
-        :param bool isDms: boolean value used to tell if the data is dm data so the function can
-        collect the empty dm directories and store them in memory only
+    def _find_user(self, user_id):
+        """User of user_id, a deleted user if users.json has none"""
+        user = self.__USER_DATA.get(user_id)
+        if user is None:
+            user = self.__USER_DATA[user_id] = deleted_user(user_id)
+        return user
 
-        :return: object of arrays of messages
+    @staticmethod
+    def _sidebar_name(user):
+        """The real_name of the users.json entry of user, its name if it has none"""
+        try:
+            return user["real_name"] or user["name"]
+        except KeyError:
+            return user["name"]
 
-        :rtype: object
+    def _iter_messages(self, names, file):
         """
+        Reads, sorts and thread-builds the messages of one name at a time and
+        yields (name, messages). Names without any day files are skipped.
 
-        chats = {}
-        empty_dms = []
-        formatter = SlackFormatter(self.__USER_DATA, data)
+        :param str file: metadata file of the conversations (channels.json, ...)
+        """
 
-        # Channel name to channel id mapping. Needed to create a messages
-        # permalink with at least slackdump exports
-        channel_name_to_id = {}
-        for c in data.values():
-            if "name" in c:
-                channel_name_to_id[c["name"]] = c["id"]
-            else:
-                # direct messages have no channel name and are also
-                # stored with the the id's folder.
-                channel_name_to_id[c["id"]] = c["id"]
+        formatter, channel_name_to_id = self._formatter(file)
+        self.ensure_extracted(names)
 
         for name in names:
             # gets path to dm directory that holds the json archive
@@ -213,14 +338,12 @@ class Reader(object):
 
             # this is where it's skipping the empty directories
             if not day_files:
-                if isDms:
-                    empty_dms.append(name)
                 continue
 
-            for day in sorted(day_files):
-                with io.open(os.path.join(self._PATH, day), encoding="utf8") as f:
+            with timer.phase("parse_day_files", files=len(day_files)) as phase:
+                for day in sorted(day_files):
                     # loads all messages
-                    day_messages = json.load(f)
+                    day_messages = load_json(os.path.join(self._PATH, day))
 
                     # Check if day_messages is a list, if not, skip this file
                     if not isinstance(day_messages, list):
@@ -232,15 +355,32 @@ class Reader(object):
 
                     c_id = channel_name_to_id[name]
                     messages.extend([Message(formatter, d, c_id, self._slack_name, self._downloader) for d in day_messages])
+                phase.count(messages=len(messages))
+
+            # channels without messages in the --since timeframe are dropped
+            # by _build_threads
+            threaded = self._build_threads({name: messages})
+            if name in threaded:
+                yield name, threaded[name]
+
+    def _formatter(self, file):
+        """(SlackFormatter, name -> channel id) of the conversations in the metadata file, built once"""
+        if file not in self._formatters:
+            data = self._read_from_json(file)
+            # Channel name to channel id mapping. Needed to create a messages
+            # permalink with at least slackdump exports
+            channel_name_to_id = {}
+            for c in data.values():
+                if "name" in c:
+                    channel_name_to_id[c["name"]] = c["id"]
+                else:
+                    # direct messages have no channel name and are also
+                    # stored with the the id's folder.
+                    channel_name_to_id[c["id"]] = c["id"]
+            self._formatters[file] = (SlackFormatter(self.__USER_DATA, data), channel_name_to_id)
+        return self._formatters[file]
 
-            chats[name] = messages
-        chats = self._build_threads(chats)
-
-        if isDms:
-            self._EMPTY_DMS = empty_dms
-
-        return chats
-
+    @timer.timed("build_threads", count_messages)
     def _build_threads(self, channel_data):
         """
         Re-orders the JSON to allow for thread building.
@@ -327,7 +467,8 @@ class Reader(object):
 
     def _read_from_json(self, file):
         """
-        Reads the file specified from json and creates an object based on the id of each element
+        Reads the file specified from json and creates an object based on the id of each element.
+        Every file is only read once, the result is shared by all callers and must not be changed.
 
         :param str file: Path to file of json to read
 
@@ -336,12 +477,16 @@ class Reader(object):
         :rtype: object
         """
 
-        try:
-            with io.open(os.path.join(self._PATH, file), encoding="utf8") as f:
-                return {u["id"]: u for u in json.load(f)}
-        except IOError:
-            return {}
+        data = self._json_files.get(file)
+        if data is None:
+            try:
+                data = {u["id"]: u for u in load_json(os.path.join(self._PATH, file))}
+            except IOError:
+                data = {}
+            self._json_files[file] = data
+        return data
 
+    @timer.timed("since_filter", count_messages)
     def _message_filter_timeframe(self, channel_data):
         """
         It might be more efficient to filter the messages in the thread sorting
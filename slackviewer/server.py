@@ -0,0 +1,121 @@
+"""Pre-fork WSGI server used by slack-export-viewer --workers"""
+
+import gc
+import os
+import signal
+import sys
+import time
+import traceback
+
+from werkzeug.serving import make_server
+
+
+# workers exiting sooner than this after their start are replaced with a
+# growing delay (doubled per early exit up to the maximum), so a worker
+# that fails right away does not fork in a loop
+MIN_WORKER_UPTIME = 5.0
+RESPAWN_DELAY = 0.5
+MAX_RESPAWN_DELAY = 30.0
+
+def serve(app, host, port, workers=1):
+    """
+    Serves app on host:port with the given number of worker processes.
+
+    The listening socket is bound once and inherited by workers forked from
+    this process, which is expected to have loaded the archive already. The
+    loaded messages are therefore shared copy-on-write by all workers instead
+    of being parsed and held once per worker. Every worker handles requests
+    in threads, like the development server.
+
+    Dead workers are replaced. Falls back to the single process development
+    server for one worker, in debug mode or where fork is not available.
+
+    :param flask.Flask app: configured app
+    :param str host: host to listen on
+    :param int port: port to listen on
+    :param int workers: number of worker processes
+    """
+    if workers > 1 and not hasattr(os, "fork"):
+        print("WARNING: --workers is not supported on this platform, serving with one process")
+        workers = 1
+    if workers > 1 and app.debug:
+        print("WARNING: --workers is ignored in debug mode")
+        workers = 1
+    if workers <= 1:
+        # the cli disables the collector while loading for the workers
+        gc.enable()
+        app.run(host=host, port=port)
+        return
+
+    server = make_server(host, port, app, threaded=True)
+    print(f"Serving on http://{host}:{server.server_port}/ with {workers} workers (master pid {os.getpid()})")
+
+    # compiled once here instead of in every worker
+    for template in ("viewer.html", "util.html", "stats.html"):
+        app.jinja_env.get_template(template)
+
+    # Everything allocated so far (the parsed archive) is moved into the
+    # permanent generation, so the garbage collector of the workers never
+    # writes to these objects and their pages stay shared
+    gc.collect()
+    gc.freeze()
+
+    # pid -> start time of the worker
+    children = {}
+    early_exits = 0
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(server)
+        children[pid] = time.monotonic()
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        for _ in range(workers):
+            spawn()
+        while True:
+            pid, status = os.wait()
+            if pid in children:
+                uptime = time.monotonic() - children.pop(pid)
+                if uptime < MIN_WORKER_UPTIME:
+                    delay = min(RESPAWN_DELAY * 2 ** early_exits, MAX_RESPAWN_DELAY)
+                    early_exits += 1
+                    print(f"Worker {pid} exited with status {status} after {uptime:.1f}s, "
+                          f"starting a new one in {delay:.1f}s")
+                    time.sleep(delay)
+                else:
+                    early_exits = 0
+                    print(f"Worker {pid} exited with status {status}, starting a new one")
+                spawn()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in children:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        server.server_close()
+
+
+def _run_worker(server):
+    """Runs in a forked worker until it is terminated, never returns"""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    gc.enable()
+    status = 0
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    except BaseException:
+        traceback.print_exc()
+        status = 1
+    finally:
+        # skip the atexit handlers and finally blocks of the master
+        os._exit(status)
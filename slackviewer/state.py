@@ -0,0 +1,104 @@
+"""The loaded archive a request is answered from"""
+
+from datetime import datetime, timezone
+
+import flask
+
+from slackviewer.utils.timing import timer
+
+
+# WSGI environ key of the archive slug set by multi.MountMiddleware
+ARCHIVE_KEY = "slackviewer.archive"
+
+
+class LoadedArchive(object):
+    """
+    The conversations of an archive, ready to be rendered: channels, groups,
+    dms, dm_users, mpims, mpim_users, path, stats, attachments,
+    message_indexes and loaded_at.
+
+    in_use keeps the extraction at path from being evicted while the
+    archive is loaded, see archive.use_extraction.
+    """
+
+
+@timer.timed("load_archive")
+def load_archive(config, downloader=None, users=None):
+    """
+    Reads the archive of config into a LoadedArchive.
+
+    :param users: multi.UserTable shared with other loaded archives
+    """
+    # imported here, the views only need current()
+    from slackviewer.archive import use_extraction
+    from slackviewer.attachments import build_attachment_index
+    from slackviewer.reader import Reader
+    from slackviewer.stats import compute_stats
+
+    reader = Reader(config, downloader, users)
+
+    state = LoadedArchive()
+    state.path = reader.archive_path()
+    state.in_use = use_extraction(state.path)
+    state.channels = reader.compile_channels(config.channels)
+    state.groups = reader.compile_groups()
+    state.dms = {}
+    state.dm_users = []
+    state.mpims = {}
+    state.mpim_users = []
+    if config.show_dms:
+        state.dms = reader.compile_dm_messages()
+        state.dm_users = reader.compile_dm_users()
+        state.mpims = reader.compile_mpim_messages()
+        state.mpim_users = reader.compile_mpim_users()
+
+    reader.warn_not_found_to_hide_channels()
+
+    # remove any empty channels & groups. DM's are needed for now
+    # since the application loads the first
+    state.channels = {k: v for k, v in state.channels.items() if v}
+    state.groups = {k: v for k, v in state.groups.items() if v}
+
+    # aggregates for the /stats/ page are computed once here, so the page
+    # itself does not depend on the size of the workspace
+    with timer.phase("compute_stats"):
+        state.stats = compute_stats(state.channels, state.groups, state.dms, state.mpims)
+
+    state.message_indexes = {}
+    state.attachments = build_attachment_index(
+        state.path, list(state.channels) + list(state.groups) + list(state.dms) + list(state.mpims))
+
+    state.loaded_at = datetime.now(timezone.utc)
+    return state
+
+
+def current():
+    """
+    The archive of the current request: in --multi mode the one mounted at
+    the request's SCRIPT_NAME (404 outside of an archive), otherwise the
+    one configure_app loaded (or the watcher reloaded last).
+
+    Resolved once per request, so a request is answered from one archive
+    even if the registry unloads it or the watcher replaces it meanwhile.
+    """
+    archive = flask.g.get("_archive")
+    if archive is not None:
+        return archive
+    registry = getattr(flask.current_app, "archives", None)
+    if registry is None:
+        # a single reference, the watcher replaces the whole archive at once
+        archive = getattr(flask.current_app, "archive", None) or flask._app_ctx_stack
+    else:
+        slug = flask.request.environ.get(ARCHIVE_KEY)
+        if slug is None:
+            flask.abort(404)
+        archive = registry.get(slug)
+    flask.g._archive = archive
+    return archive
+
+
+def loaded_at():
+    """When the archive of the current request was loaded, None outside of an archive"""
+    if getattr(flask.current_app, "archives", None) is not None and ARCHIVE_KEY not in flask.request.environ:
+        return None
+    return getattr(current(), "loaded_at", None)
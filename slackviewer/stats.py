@@ -0,0 +1,112 @@
+import datetime
+
+from collections import Counter
+
+
+# Number of entries shown in the "top" tables of the statistics page
+TOP_POSTERS = 25
+
+
+def compute_stats(channels, groups, dms, mpims, top_posters=TOP_POSTERS):
+    """
+    Computes workspace wide aggregates once so the statistics page does not
+    need to walk every message on each request.
+
+    The messages of all conversations are first flattened into plain
+    timestamp, user and file arrays which are then counted in batches.
+    Every message is counted in the totals, the per day counts only
+    include messages with a timestamp.
+
+    :param dict channels: channel name -> [Message]
+    :param dict groups: group name -> [Message]
+    :param dict dms: dm id -> [Message]
+    :param dict mpims: mpim name -> [Message]
+    :param int top_posters: number of users to keep in the top posters list
+
+    :return: aggregates used by the stats.html template
+
+    :rtype: dict
+    """
+    conversations = []
+    timestamps = []
+    users = []
+    # user id -> a message of this user, used to resolve the display name
+    # only once per user instead of once per message
+    user_sample = {}
+    message_count = 0
+    file_count = 0
+    file_bytes = 0
+
+    for kind, data in (("channel", channels), ("group", groups), ("dm", dms), ("mpim", mpims)):
+        for name, messages in data.items():
+            conv_ts = []
+            conv_files = 0
+            for message in messages:
+                ts = message.ts
+                if ts is not None:
+                    conv_ts.append(float(ts))
+                user_id = message.sender_id
+                if user_id is not None:
+                    users.append(user_id)
+                    user_sample.setdefault(user_id, message)
+                files = message.files
+                conv_files += len(files)
+                file_bytes += sum(_file_size(f) for f in files)
+
+            message_count += len(messages)
+            file_count += conv_files
+            timestamps.extend(conv_ts)
+            conversations.append({
+                "kind": kind,
+                "name": name,
+                "messages": len(messages),
+                "files": conv_files,
+                "first": _format_day(min(conv_ts)) if conv_ts else None,
+                "last": _format_day(max(conv_ts)) if conv_ts else None,
+            })
+
+    conversations.sort(key=lambda c: c["messages"], reverse=True)
+
+    # Batched counting: bucket the timestamp array into days and count the
+    # user array in one pass each
+    per_day = Counter(int(ts // 86400) for ts in timestamps)
+    messages_per_day = [
+        {"day": _format_day(day * 86400), "messages": count}
+        for day, count in sorted(per_day.items())
+    ]
+
+    posters = [
+        {"name": _display_name(user_sample[user_id], user_id), "messages": count}
+        for user_id, count in Counter(users).most_common(top_posters)
+    ]
+
+    return {
+        "total_messages": message_count,
+        "total_conversations": len(conversations),
+        "total_users": len(user_sample),
+        "total_files": file_count,
+        "total_file_bytes": file_bytes,
+        "conversations": conversations,
+        "top_posters": posters,
+        "messages_per_day": messages_per_day,
+        "busiest_day": max(messages_per_day, key=lambda d: d["messages"]) if messages_per_day else None,
+    }
+
+
+def _format_day(ts):
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).strftime("%Y-%m-%d")
+
+
+def _file_size(attachment):
+    try:
+        return attachment["size"] or 0
+    except KeyError:
+        return 0
+
+
+def _display_name(message, user_id):
+    try:
+        return message.username or user_id
+    except AttributeError:
+        # unknown users (find_user returned None)
+        return user_id
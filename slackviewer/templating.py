@@ -0,0 +1,77 @@
+"""Jinja environments with a bytecode cache shared by all processes"""
+
+import os
+import stat
+
+from jinja2 import Environment, FileSystemBytecodeCache, PackageLoader
+
+from slackviewer.constants import SLACKVIEWER_TEMP_PATH
+
+
+JINJA_CACHE_PATH = os.path.join(SLACKVIEWER_TEMP_PATH, "jinja_cache")
+
+
+def _private_directory(path):
+    """
+    Creates the directory path (0700) if missing. True if it is a directory
+    of the current user that nobody else can write to. Cached bytecode is
+    executed, so a directory another user could plant files in is not used.
+    """
+    try:
+        os.makedirs(path, mode=stat.S_IRWXU, exist_ok=True)
+        info = os.lstat(path)
+    except OSError:
+        return False
+    if not stat.S_ISDIR(info.st_mode):
+        return False
+    if not hasattr(os, "getuid"):
+        # Windows, the temp directory belongs to the user
+        return True
+    return info.st_uid == os.getuid() and not info.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+class _BytecodeCache(FileSystemBytecodeCache):
+    """
+    FileSystemBytecodeCache in JINJA_CACHE_PATH. The directory is created
+    and checked when the first template is compiled, not when the cache is
+    created (on import of the app), and the cache does nothing if it is
+    not private.
+    """
+
+    def __init__(self, namespace):
+        super(_BytecodeCache, self).__init__(JINJA_CACHE_PATH, f"{namespace}-%s.cache")
+        self._usable = None
+
+    def _check(self):
+        if self._usable is None:
+            self.directory = JINJA_CACHE_PATH
+            self._usable = _private_directory(self.directory)
+        return self._usable
+
+    def load_bytecode(self, bucket):
+        if self._check():
+            super(_BytecodeCache, self).load_bytecode(bucket)
+
+    def dump_bytecode(self, bucket):
+        if self._check():
+            super(_BytecodeCache, self).dump_bytecode(bucket)
+
+
+def bytecode_cache(namespace):
+    """
+    Cache for the compiled templates, so they are only compiled once and
+    not on every start (and in every export worker). Cached code is checked
+    against the template source, so changed templates are compiled again.
+
+    :param str namespace: separates environments with different options.
+    The compiled code depends on them (e.g. autoescape), but the cache key
+    does not include them.
+
+    :return: BytecodeCache, unused if its directory is not private
+    """
+    return _BytecodeCache(namespace)
+
+
+def create_environment():
+    """Environment for the templates of the package, as used by the cli export"""
+    return Environment(loader=PackageLoader('slackviewer'), bytecode_cache=bytecode_cache("export"))
@@ -1,5 +1,7 @@
 import os
 import hashlib
+import json
+import tempfile
 import urllib.parse
 import requests
 import logging
@@ -8,13 +10,32 @@ from urllib.parse import urlparse, parse_qs
 import mimetypes
 import time
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from slackviewer.utils import thumbnails as thumbnail_images
+from slackviewer.utils.scheduler import MAX_CONCURRENCY, THROTTLE_STATUS, Scheduler, parse_retry_after
+from slackviewer.utils.timing import timer
+
+# 다운로드 인덱스 (URL -> 파일명, 내용 해시 -> 파일명), download_dir 안에 저장
+INDEX_FILE = ".index.json"
+
+# 다운로드 중인 임시 파일의 접두사
+TEMP_PREFIX = ".download-"
+
+# 읽기 단위: 한 번 읽는 데 약 CHUNK_SECONDS가 걸리도록 MIN/MAX_CHUNK_SIZE 사이에서 조절
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 8 * 1024 * 1024
+CHUNK_SECONDS = 0.25
+
 
 class ExternalResourceDownloader:
     """
     외부 리소스(이미지, 첨부파일 등)를 로컬로 다운로드하고 관리하는 클래스
     """
     
-    def __init__(self, output_dir, download_dir="external_resources", slack_token=None):
+    def __init__(self, output_dir, download_dir="external_resources", slack_token=None, scheduler=None,
+                 max_workers=MAX_CONCURRENCY, thumbnails=False):
         self.output_dir = Path(output_dir)
         self.download_dir = self.output_dir / download_dir
         
@@ -55,8 +76,24 @@ class ExternalResourceDownloader:
         # 원본 파일명과 다운로드된 파일명의 매핑 (원본 파일명 -> 다운로드된 파일명)
         self.original_filename_mapping = {}
         
+        # 축소 이미지 (Pillow가 설치된 경우): (로컬 경로, 크기) -> 축소 이미지 경로
+        self.thumbnails_enabled = thumbnails and thumbnail_images.available()
+        if thumbnails and not self.thumbnails_enabled:
+            print("WARNING: Pillow가 설치되지 않아 축소 이미지를 만들지 않습니다 (pip install Pillow)")
+        self.thumbnail_dir = self.download_dir / "thumbnails"
+        self.thumbnails = {}
+        
+        # 호스트별 요청 속도/동시 요청 수 제한과 재시도 대기
+        self.scheduler = scheduler or Scheduler()
+        self.max_workers = max_workers
+        # 여러 스레드에서 다운로드할 때 통계와 인덱스 보호
+        self._lock = threading.RLock()
+        
         # 세션 재사용으로 성능 향상
         self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
         self.session.headers.update({
             'User-Agent': 'Slack-Export-Viewer/3.3.1'
         })
@@ -73,12 +110,16 @@ class ExternalResourceDownloader:
             'total_attempted': 0,
             'total_success': 0,
             'total_failed': 0,
-            'total_skipped': 0
+            'total_skipped': 0,
+            'total_deduplicated': 0
         }
         
         # 기존 다운로드된 파일들을 캐시에 로드
         self._load_existing_files()
         
+        # 다운로드 인덱스 로드 (내용 기반 중복 제거용)
+        self._load_index()
+        
         # 기존 파일들에서 원본 파일명 매핑 재구성
         self._reconstruct_original_filenames()
         
@@ -92,7 +133,7 @@ class ExternalResourceDownloader:
         if not self.download_dir.exists():
             return
         
-        existing_files = list(self.download_dir.glob('*'))
+        existing_files = list(self._resource_files())
         if existing_files:
             logging.info(f"기존 다운로드된 파일 {len(existing_files)}개를 캐시에 로드합니다.")
             print(f"📁 기존 다운로드된 파일 {len(existing_files)}개를 캐시에 로드합니다.")
@@ -124,7 +165,7 @@ class ExternalResourceDownloader:
                                 self.download_cache[cache_key] = relative_path
                                 # downloaded_files에도 추가 (URL 매칭을 위해)
                                 self.downloaded_files[cache_key] = relative_path
-                                self.stats['total_skipped'] += 1
+                                self._count('total_skipped')
                                 logging.debug(f"캐시에 로드: {filename} -> {cache_key}")
             
             logging.info(f"캐시 로드 완료: {len(self.download_cache)}개 파일")
@@ -133,6 +174,133 @@ class ExternalResourceDownloader:
             logging.info("기존 다운로드된 파일이 없습니다.")
             print("📁 기존 다운로드된 파일이 없습니다.")
     
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+    
+    def _resource_files(self):
+        """
+        download_dir의 리소스 파일들 (인덱스와 다운로드 중인 임시 파일 제외)
+        """
+        for file_path in self.download_dir.glob('*'):
+            if file_path.name != INDEX_FILE and not file_path.name.startswith(TEMP_PREFIX):
+                yield file_path
+    
+    def _load_index(self):
+        """
+        다운로드 인덱스를 로드합니다.
+        urls: URL -> 파일명, blobs: 내용 해시 -> 대표 파일명, files: 파일명 -> 내용 해시
+        인덱스에 없는 기존 파일(이전 버전에서 다운로드된 파일)은 해시를 계산하여 추가합니다.
+        """
+        self.index = {"urls": {}, "blobs": {}, "files": {}}
+        try:
+            with open(self.download_dir / INDEX_FILE, encoding='utf-8') as f:
+                loaded = json.load(f)
+            for key in self.index:
+                self.index[key].update(loaded.get(key) or {})
+        except (OSError, ValueError):
+            pass
+        
+        existing = {p.name for p in self._resource_files() if p.is_file()}
+        for key in ("urls", "blobs"):
+            self.index[key] = {k: name for k, name in self.index[key].items() if name in existing}
+        self.index["files"] = {name: sha for name, sha in self.index["files"].items() if name in existing}
+        
+        for name in sorted(existing - set(self.index["files"])):
+            sha = self._hash_file(self.download_dir / name)
+            self.index["files"][name] = sha
+            self.index["blobs"].setdefault(sha, name)
+        
+        for url, name in self.index["urls"].items():
+            relative_path = str((self.download_dir / name).relative_to(self.output_dir))
+            self.downloaded_files[url] = relative_path
+            self.download_cache[url] = relative_path
+    
+    def save_index(self):
+        """
+        다운로드 인덱스를 저장합니다. (임시 파일에 쓴 후 교체)
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.download_dir, prefix=TEMP_PREFIX)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f, self._lock:
+                json.dump(self.index, f, ensure_ascii=False)
+            os.replace(tmp_path, self.download_dir / INDEX_FILE)
+        except OSError as e:
+            logging.warning(f"다운로드 인덱스 저장 실패: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+    
+    @staticmethod
+    def _hash_file(file_path):
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    def _store(self, tmp_path, file_path, sha):
+        """
+        다운로드된 임시 파일을 저장합니다.
+        같은 내용의 파일이 이미 있으면 하드링크로 연결하고 (하드링크를 지원하지 않으면
+        기존 파일을 그대로 사용) 임시 파일은 삭제합니다.
+        
+        :return: 저장된 파일의 경로
+        """
+        with self._lock:
+            return self._store_locked(tmp_path, file_path, sha)
+    
+    def _store_locked(self, tmp_path, file_path, sha):
+        existing = self.index["blobs"].get(sha)
+        if existing and existing != file_path.name and (self.download_dir / existing).is_file():
+            existing_path = self.download_dir / existing
+            try:
+                os.link(existing_path, file_path)
+            except OSError:
+                file_path = existing_path
+            os.unlink(tmp_path)
+            self._count('total_deduplicated')
+            logging.info(f"  ♻️  같은 내용의 파일 재사용: {file_path.name} -> {existing}")
+        else:
+            os.replace(tmp_path, file_path)
+            self.index["blobs"][sha] = file_path.name
+        self.index["files"][file_path.name] = sha
+        return file_path
+    
+    def _part_path(self, url):
+        """
+        URL의 중단된 다운로드를 저장하는 .part 파일 경로
+        """
+        return self.download_dir / f"{TEMP_PREFIX}{hashlib.md5(url.encode()).hexdigest()}.part"
+    
+    @staticmethod
+    def _content_range(response):
+        """
+        Content-Range 헤더 (bytes start-end/total)의 (start, total), 없으면 (None, None)
+        """
+        match = re.match(r'bytes (\d+)-\d+/(\d+|\*)', response.headers.get('content-range', ''))
+        if not match:
+            return None, None
+        total = match.group(2)
+        return int(match.group(1)), int(total) if total != '*' else None
+    
+    @staticmethod
+    def _iter_chunks(response):
+        """
+        응답 본문을 읽습니다. 읽기 단위는 빠른 연결에서는 커지고 느린 연결에서는 작아집니다.
+        """
+        chunk_size = MIN_CHUNK_SIZE
+        while True:
+            started = time.monotonic()
+            chunk = response.raw.read(chunk_size, decode_content=True)
+            if not chunk:
+                return
+            yield chunk
+            elapsed = time.monotonic() - started
+            if elapsed < CHUNK_SECONDS / 2:
+                chunk_size = min(chunk_size * 2, MAX_CHUNK_SIZE)
+            elif elapsed > CHUNK_SECONDS * 2:
+                chunk_size = max(chunk_size // 2, MIN_CHUNK_SIZE)
+    
     def _reconstruct_original_filenames(self):
         """
         기존 다운로드된 파일들에서 원본 파일명을 추정하여 매핑을 생성합니다.
@@ -140,7 +308,7 @@ class ExternalResourceDownloader:
         if not self.download_dir.exists():
             return
         
-        existing_files = list(self.download_dir.glob('*'))
+        existing_files = list(self._resource_files())
         reconstructed_count = 0
         
         for file_path in existing_files:
@@ -243,7 +411,7 @@ class ExternalResourceDownloader:
         
         return filename
     
-    def download_file(self, url, retry_count=3):
+    def download_file(self, url, retry_count=5):
         """
         파일을 다운로드하고 로컬 경로를 반환합니다.
         이미 다운로드된 파일은 캐시에서 반환합니다.
@@ -252,18 +420,18 @@ class ExternalResourceDownloader:
             logging.debug(f"유효하지 않은 URL 스킵: {url}")
             return None
         
-        self.stats['total_attempted'] += 1
+        self._count('total_attempted')
         
         # 이미 다운로드된 파일인지 확인
         if url in self.downloaded_files:
             logging.debug(f"이미 다운로드된 파일 스킵: {url}")
-            self.stats['total_skipped'] += 1
+            self._count('total_skipped')
             return self.downloaded_files[url]
         
         # 캐시에서 확인
         if url in self.download_cache:
             logging.debug(f"캐시에서 찾은 파일 스킵: {url}")
-            self.stats['total_skipped'] += 1
+            self._count('total_skipped')
             return self.download_cache[url]
         
         # URL에서 도메인 추출하여 로그에 표시
@@ -296,80 +464,133 @@ class ExternalResourceDownloader:
                     else:
                         logging.warning("  Slack CDN URL이지만 토큰이 없어 인증 없이 시도합니다.")
                 
-                response = self.session.get(url, timeout=10, stream=True, headers=headers)
-                response.raise_for_status()
+                # 중단된 다운로드(.part)가 있으면 이어서 받기
+                # 압축된 전송은 바이트 위치가 달라지므로 identity 인코딩만 요청
+                part_path = self._part_path(url)
+                offset = part_path.stat().st_size if part_path.exists() else 0
+                headers['Accept-Encoding'] = 'identity'
+                if offset:
+                    headers['Range'] = f'bytes={offset}-'
+                
+                with self.scheduler.slot(url) as slot:
+                    response = self.session.get(url, timeout=10, stream=True, headers=headers)
+                    if response.status_code in THROTTLE_STATUS:
+                        # 요청 제한 (429) 또는 서버 과부하 (5xx): 동시 요청 수를 줄이고 Retry-After 만큼 대기
+                        slot.throttle(parse_retry_after(response.headers.get('Retry-After')))
+                        response.close()
+                        raise IOError(f"서버가 요청을 제한함: HTTP {response.status_code}")
+                    if response.status_code == 416:
+                        # 범위가 맞지 않음 (파일이 바뀌었거나 .part가 손상됨): 처음부터 다시 받기
+                        part_path.unlink()
+                        raise IOError(f"Range {offset}- 요청이 거부되어 처음부터 다시 받습니다")
+                    response.raise_for_status()
+                
+                    range_start, range_total = self._content_range(response)
+                    if response.status_code != 206 or range_start != offset:
+                        # 서버가 Range를 지원하지 않음: 처음부터 받기
+                        offset = 0
                 
-                # Content-Type 확인
-                content_type = response.headers.get('content-type', '').split(';')[0]
-                content_length = response.headers.get('content-length')
+                    # Content-Type 확인
+                    content_type = response.headers.get('content-type', '').split(';')[0]
+                    content_length = response.headers.get('content-length')
                 
-                if content_length:
-                    logging.info(f"  파일 크기: {int(content_length):,} bytes")
+                    if content_length:
+                        logging.info(f"  파일 크기: {int(content_length):,} bytes")
                 
-                # 안전한 파일명 생성
-                filename = self.get_safe_filename(url, content_type)
-                file_path = self.download_dir / filename
+                    # 안전한 파일명 생성
+                    filename = self.get_safe_filename(url, content_type)
+                    file_path = self.download_dir / filename
                 
-                # 원본 파일명 추출 및 매핑 저장
-                parsed_url = urlparse(url)
-                original_filename = os.path.basename(parsed_url.path)
-                if original_filename:
-                    self.original_filename_mapping[original_filename] = filename
-                    logging.debug(f"원본 파일명 매핑: {original_filename} -> {filename}")
+                    # 원본 파일명 추출 및 매핑 저장
+                    parsed_url = urlparse(url)
+                    original_filename = os.path.basename(parsed_url.path)
+                    if original_filename:
+                        self.original_filename_mapping[original_filename] = filename
+                        logging.debug(f"원본 파일명 매핑: {original_filename} -> {filename}")
                 
-                print(f"  📝 파일 저장 경로: {file_path.absolute()}")
-                logging.info(f"  📝 파일 저장 경로: {file_path.absolute()}")
+                    print(f"  📝 파일 저장 경로: {file_path.absolute()}")
+                    logging.info(f"  📝 파일 저장 경로: {file_path.absolute()}")
                 
-                # 파일이 이미 존재하는지 확인 (다른 URL에서 같은 파일을 다운로드한 경우)
-                if file_path.exists():
-                    logging.info(f"  파일이 이미 존재함: {filename}")
-                    print(f"  📁 파일이 이미 존재함: {filename}")
-                    self.download_cache[url] = str(file_path.relative_to(self.output_dir))
-                    self.stats['total_skipped'] += 1
-                    return self.download_cache[url]
+                    # 파일이 이미 존재하는지 확인 (다른 URL에서 같은 파일을 다운로드한 경우)
+                    if file_path.exists():
+                        logging.info(f"  파일이 이미 존재함: {filename}")
+                        print(f"  📁 파일이 이미 존재함: {filename}")
+                        response.close()
+                        if part_path.exists():
+                            part_path.unlink()
+                        self.download_cache[url] = str(file_path.relative_to(self.output_dir))
+                        self.index["urls"][url] = filename
+                        self._count('total_skipped')
+                        return self.download_cache[url]
                 
-                # 파일 다운로드
-                downloaded_size = 0
-                print(f"  💾 파일 다운로드 시작: {filename}")
-                logging.info(f"  💾 파일 다운로드 시작: {filename}")
+                    # 파일 다운로드 (.part 파일에 저장하면서 내용 해시 계산)
+                    # 중단되면 .part 파일이 남아 다음 시도에서 이어서 받음
+                    downloaded_size = offset
+                    digest = hashlib.sha256()
+                    if offset:
+                        print(f"  ⏩ 이어받기: {filename} ({offset:,} bytes부터)")
+                        logging.info(f"  ⏩ 이어받기: {filename} ({offset:,} bytes부터)")
+                        with open(part_path, 'rb') as f:
+                            for chunk in iter(lambda: f.read(MAX_CHUNK_SIZE), b''):
+                                digest.update(chunk)
+                    else:
+                        print(f"  💾 파일 다운로드 시작: {filename}")
+                        logging.info(f"  💾 파일 다운로드 시작: {filename}")
+                
+                    if response.status_code == 206:
+                        expected_size = range_total
+                    elif content_length and response.headers.get('content-encoding', 'identity') == 'identity':
+                        expected_size = int(content_length)
+                    else:
+                        expected_size = None
                 
-                with open(file_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
+                    with open(part_path, 'ab' if offset else 'wb') as f:
+                        for chunk in self._iter_chunks(response):
                             f.write(chunk)
+                            digest.update(chunk)
                             downloaded_size += len(chunk)
                 
-                # 파일 저장 후 존재 확인
-                if file_path.exists():
-                    actual_size = file_path.stat().st_size
-                    print(f"  ✅ 다운로드 완료: {filename} ({downloaded_size:,} bytes)")
-                    print(f"  📊 실제 파일 크기: {actual_size:,} bytes")
-                    print(f"  📍 파일 존재 확인: {file_path.exists()}")
-                    logging.info(f"  ✅ 다운로드 완료: {filename} ({downloaded_size:,} bytes)")
-                    logging.info(f"  📊 실제 파일 크기: {actual_size:,} bytes")
-                    logging.info(f"  📍 파일 존재 확인: {file_path.exists()}")
-                else:
-                    print(f"  ❌ 파일 저장 실패: {filename}")
-                    logging.error(f"  ❌ 파일 저장 실패: {filename}")
-                    return None
+                    # 크기가 맞을 때만 최종 파일명으로 교체
+                    if expected_size is not None and downloaded_size != expected_size:
+                        raise IOError(f"불완전한 다운로드: {downloaded_size:,}/{expected_size:,} bytes")
+                    file_path = self._store(part_path, file_path, digest.hexdigest())
                 
-                # 성공 시 캐시에 저장
-                relative_path = str(file_path.relative_to(self.output_dir))
-                self.downloaded_files[url] = relative_path
-                self.download_cache[url] = relative_path
+                    if original_filename:
+                        self.original_filename_mapping[original_filename] = file_path.name
                 
-                self.stats['total_success'] += 1
-                return relative_path
+                    # 파일 저장 후 존재 확인
+                    if file_path.exists():
+                        actual_size = file_path.stat().st_size
+                        print(f"  ✅ 다운로드 완료: {filename} ({downloaded_size:,} bytes)")
+                        print(f"  📊 실제 파일 크기: {actual_size:,} bytes")
+                        print(f"  📍 파일 존재 확인: {file_path.exists()}")
+                        logging.info(f"  ✅ 다운로드 완료: {filename} ({downloaded_size:,} bytes)")
+                        logging.info(f"  📊 실제 파일 크기: {actual_size:,} bytes")
+                        logging.info(f"  📍 파일 존재 확인: {file_path.exists()}")
+                    else:
+                        print(f"  ❌ 파일 저장 실패: {filename}")
+                        logging.error(f"  ❌ 파일 저장 실패: {filename}")
+                        return None
+                
+                    # 성공 시 캐시에 저장
+                    relative_path = str(file_path.relative_to(self.output_dir))
+                    self.downloaded_files[url] = relative_path
+                    self.download_cache[url] = relative_path
+                    self.index["urls"][url] = file_path.name
+                
+                    self._count('total_success')
+                    return relative_path
                 
             except Exception as e:
                 logging.warning(f"  다운로드 실패 (시도 {attempt + 1}/{retry_count}): {str(e)}")
                 print(f"  ❌ 다운로드 실패 (시도 {attempt + 1}/{retry_count}): {str(e)}")
                 if attempt < retry_count - 1:
-                    time.sleep(1)  # 재시도 전 잠시 대기
+                    # 재시도 전 대기 (지수 백오프 + 지터, Retry-After는 scheduler가 처리)
+                    time.sleep(self.scheduler.backoff(url, attempt))
                 else:
                     logging.error(f"  다운로드 최종 실패: {url} - {str(e)}")
                     print(f"  💥 다운로드 최종 실패: {url} - {str(e)}")
-                    self.stats['total_failed'] += 1
+                    self._count('total_failed')
                     return None
         
         return None
@@ -388,12 +609,49 @@ class ExternalResourceDownloader:
         parsed_url = urlparse(url)
         return any(domain in parsed_url.netloc for domain in slack_domains)
     
-    def get_local_path(self, url):
+    def get_local_path(self, url, size=None):
         """
         URL에 대한 로컬 경로를 반환합니다.
         다운로드되지 않은 경우 None을 반환합니다.
+        size가 주어지고 그 크기의 축소 이미지가 있으면 축소 이미지 경로를 반환합니다.
+        """
+        local_path = self.downloaded_files.get(url) or self.download_cache.get(url)
+        if size and local_path:
+            return self.thumbnails.get((local_path, size), local_path)
+        return local_path
+    
+    def create_thumbnails(self, sized_resources):
+        """
+        다운로드된 이미지를 표시 크기로 축소합니다. (프로세스 풀 사용)
+        축소 이미지는 내용 해시로 저장되므로 같은 이미지는 크기별로 한 번만 만듭니다.
+        
+        :param sized_resources: (URL 또는 로컬 경로, 표시 크기) 목록
+        :return: 사용 가능한 축소 이미지 수
         """
-        return self.downloaded_files.get(url) or self.download_cache.get(url)
+        jobs = {}
+        for src, size in sized_resources:
+            local_path = self.get_local_path(src) or src
+            name = os.path.basename(local_path)
+            sha = self.index["files"].get(name)
+            if not sha or (local_path, size) in self.thumbnails:
+                continue
+            target = self.thumbnail_dir / f"{sha[:16]}_{size}{os.path.splitext(name)[1]}"
+            jobs.setdefault(str(target), (str(self.download_dir / name), str(target), size, []))[3].append(local_path)
+        if not jobs:
+            return 0
+        
+        self.thumbnail_dir.mkdir(exist_ok=True)
+        print(f"🖼️  축소 이미지 {len(jobs)}개 생성 중...")
+        results = thumbnail_images.make_thumbnails(job[:3] for job in jobs.values())
+        created = 0
+        for (source, target, size, local_paths), result in zip(jobs.values(), results):
+            if result:
+                created += 1
+                relative_path = str(Path(result).relative_to(self.output_dir))
+                for local_path in local_paths:
+                    self.thumbnails[(local_path, size)] = relative_path
+        print(f"✅ 축소 이미지 {created}개 사용 (나머지는 이미 충분히 작음)")
+        return created
     
     def replace_urls_in_html(self, html_content):
         """
@@ -431,7 +689,7 @@ class ExternalResourceDownloader:
             
             if original_filename:
                 # 다운로드된 파일들 중에서 매칭되는 파일 찾기
-                for file_path in self.download_dir.glob('*'):
+                for file_path in self._resource_files():
                     if file_path.is_file():
                         filename = file_path.name
                         
@@ -444,6 +702,7 @@ class ExternalResourceDownloader:
         
         print(f"📊 매칭된 URL 수: {len(self.downloaded_files)}")
     
+    @timer.timed("download_all_resources", lambda r: {"downloaded": r[0], "resources": r[1]})
     def download_all_resources(self, messages):
         """
         모든 메시지에서 외부 리소스를 찾아 다운로드합니다.
@@ -461,6 +720,8 @@ class ExternalResourceDownloader:
         
         total_resources = 0
         downloaded_count = 0
+        urls = []  # 발견된 리소스 URL (중복 포함)
+        sized = []  # 축소 이미지를 만들 (URL, 표시 크기)
         
         logging.info(f"메시지에서 외부 리소스 검색 시작... (총 {len(messages)}개 메시지)")
         print(f"🚀 메시지에서 외부 리소스 검색 시작... (총 {len(messages)}개 메시지)")
@@ -476,8 +737,8 @@ class ExternalResourceDownloader:
             if hasattr(message, 'img') and message.img:
                 total_resources += 1
                 message_resources.append(f"프로필 이미지: {message.img}")
-                if self.download_file(message.img):
-                    downloaded_count += 1
+                urls.append(message.img)
+                sized.append((message.img, message._DEFAULT_USER_ICON_SIZE))
             
             # 첨부파일들
             for j, attachment in enumerate(message.attachments):
@@ -486,22 +747,20 @@ class ExternalResourceDownloader:
                 if thumb and thumb.get('src'):
                     total_resources += 1
                     message_resources.append(f"첨부파일{j+1} 썸네일: {thumb['src']}")
-                    if self.download_file(thumb['src']):
-                        downloaded_count += 1
+                    urls.append(thumb['src'])
+                    sized.append((thumb['src'], attachment._DEFAULT_THUMBNAIL_SIZE))
                 
                 # 첨부파일 작성자 아이콘
                 if hasattr(attachment, 'author_icon') and attachment.author_icon:
                     total_resources += 1
                     message_resources.append(f"첨부파일{j+1} 작성자 아이콘: {attachment.author_icon}")
-                    if self.download_file(attachment.author_icon):
-                        downloaded_count += 1
+                    urls.append(attachment.author_icon)
                 
                 # 첨부파일 푸터 아이콘
                 if hasattr(attachment, 'footer_icon') and attachment.footer_icon:
                     total_resources += 1
                     message_resources.append(f"첨부파일{j+1} 푸터 아이콘: {attachment.footer_icon}")
-                    if self.download_file(attachment.footer_icon):
-                        downloaded_count += 1
+                    urls.append(attachment.footer_icon)
             
             # 파일들
             for k, file in enumerate(message.files):
@@ -510,16 +769,15 @@ class ExternalResourceDownloader:
                 if thumb and thumb.get('src'):
                     total_resources += 1
                     message_resources.append(f"파일{k+1} 썸네일: {thumb['src']}")
-                    if self.download_file(thumb['src']):
-                        downloaded_count += 1
+                    urls.append(thumb['src'])
+                    sized.append((thumb['src'], file._DEFAULT_THUMBNAIL_SIZE))
                 
                 # 파일 자체 다운로드 (download_url 사용)
                 file_url = getattr(file, 'download_url', None) or file.link
                 if file_url and self._is_slack_cdn_url(file_url):
                     total_resources += 1
                     message_resources.append(f"파일{k+1} 다운로드: {file_url}")
-                    if self.download_file(file_url):
-                        downloaded_count += 1
+                    urls.append(file_url)
             
             # 메시지에 리소스가 있으면 로깅
             if message_resources:
@@ -529,6 +787,19 @@ class ExternalResourceDownloader:
                     logging.info(f"  - {resource}")
                     print(f"    - {resource}")
         
+        # 고유 URL을 스레드 풀에서 다운로드 (호스트별 속도와 동시 요청 수는 scheduler가 조절)
+        unique_urls = list(dict.fromkeys(urls))
+        print(f"🚀 고유 리소스 {len(unique_urls)}개 다운로드 시작 (최대 {self.max_workers}개 동시)")
+        logging.info(f"고유 리소스 {len(unique_urls)}개 다운로드 시작 (최대 {self.max_workers}개 동시)")
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            results = dict(zip(unique_urls, pool.map(self.download_file, unique_urls)))
+        downloaded_count = sum(1 for url in urls if results[url])
+        
+        if self.thumbnails_enabled:
+            self.create_thumbnails(sized)
+        
+        self.save_index()
+        
         logging.info(f"외부 리소스 다운로드 완료!")
         print(f"✅ 외부 리소스 다운로드 완료!")
         logging.info(f"  총 발견된 리소스: {total_resources}개")
@@ -537,6 +808,7 @@ class ExternalResourceDownloader:
         print(f"📊 총 발견된 리소스: {total_resources}개")
         print(f"📊 성공적으로 다운로드: {downloaded_count}개")
         print(f"📊 다운로드 통계: 시도 {self.stats['total_attempted']}개, 성공 {self.stats['total_success']}개, 실패 {self.stats['total_failed']}개, 스킵 {self.stats['total_skipped']}개")
+        print(f"📊 중복 제거: 같은 내용의 파일 {self.stats['total_deduplicated']}개 재사용")
         
         return downloaded_count, total_resources
     
@@ -569,7 +841,7 @@ class ExternalResourceDownloader:
             print(f"🔍 기본값 사용: {external_resources_prefix}")
         
         # 디버깅: 다운로드된 파일 목록 확인
-        downloaded_files = list(self.download_dir.glob('*'))
+        downloaded_files = list(self._resource_files())
         print(f"🔍 다운로드된 파일 수: {len(downloaded_files)}")
         if downloaded_files:
             print(f"🔍 첫 번째 파일 예시: {downloaded_files[0].name}")
@@ -592,7 +864,7 @@ class ExternalResourceDownloader:
         
         # 다운로드된 파일 목록 준비
         file_map = {}
-        for file_path in self.download_dir.glob('*'):
+        for file_path in self._resource_files():
             if file_path.is_file():
                 filename = file_path.name
                 file_map[filename] = external_resources_prefix + filename
@@ -0,0 +1,39 @@
+"""Parsing the JSON files of an export from their bytes"""
+
+import json
+import mmap
+import os
+
+try:
+    import orjson
+except ImportError:  # optional, the json module is used without it
+    orjson = None
+
+
+# smaller files are read in one call, mapping them costs more than it saves
+MMAP_MIN_SIZE = 1024 * 1024
+
+
+def _loads(data):
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # integers beyond 64 bit, NaN, ... the json module accepts these
+            pass
+    return json.loads(bytes(data) if isinstance(data, memoryview) else data)
+
+
+def load_json(path):
+    """
+    Parses the JSON file at path. The file is not decoded into a str first,
+    orjson parses its bytes directly. Large files are memory mapped, so
+    processes reading the same extraction share the pages of the file.
+    """
+    with open(path, "rb") as f:
+        if orjson is None or os.fstat(f.fileno()).st_size < MMAP_MIN_SIZE:
+            return _loads(f.read())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            # released before the mapping is closed
+            with memoryview(mapped) as view:
+                return _loads(view)
@@ -0,0 +1,156 @@
+"""In-memory cache of the rendered viewer pages with validators and compression"""
+
+import gzip
+import hashlib
+import threading
+
+from collections import OrderedDict
+from functools import wraps
+
+import flask
+
+from slackviewer import state
+
+try:
+    import brotli
+except ImportError:  # optional, gzip only without it
+    brotli = None
+
+
+# upper bound for all cached bodies, including the compressed variants
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+# smaller bodies are always sent uncompressed
+MIN_COMPRESS_BYTES = 512
+
+
+def _compress(body, encoding):
+    if encoding == "gzip":
+        # mtime=0 keeps the output, and therefore the ETag, deterministic
+        return gzip.compress(body, compresslevel=6, mtime=0)
+    return brotli.compress(body, quality=5)
+
+
+class CachedPage(object):
+
+    def __init__(self, body, content_type, last_modified):
+        self.content_type = content_type
+        self.last_modified = last_modified
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.variants = {"identity": body}
+
+    @property
+    def size(self):
+        return sum(len(v) for v in self.variants.values())
+
+    def encodings(self):
+        """Encodings this page can be sent with, preferred first"""
+        if len(self.variants["identity"]) < MIN_COMPRESS_BYTES:
+            return ["identity"]
+        return (["br"] if brotli else []) + ["gzip", "identity"]
+
+
+class PageCache(object):
+    """
+    LRU cache of CachedPage objects, bounded by the total size of all
+    variants. clear() starts a new generation, pages rendered before it are
+    not stored anymore even if they finish rendering later.
+    """
+
+    def __init__(self, max_bytes=MAX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.generation = 0
+        self._pages = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._pages.clear()
+            self._size = 0
+
+    def get(self, key):
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None:
+                self._pages.move_to_end(key)
+            return page
+
+    def put(self, key, page, generation):
+        with self._lock:
+            if generation != self.generation or page.size > self.max_bytes:
+                return
+            old = self._pages.pop(key, None)
+            if old is not None:
+                self._size -= old.size
+            self._pages[key] = page
+            self._size += page.size
+            self._evict()
+
+    def variant(self, key, page, encoding):
+        """Body of page in the given encoding, compressed on first use"""
+        body = page.variants.get(encoding)
+        if body is not None:
+            return body
+        body = _compress(page.variants["identity"], encoding)
+        with self._lock:
+            if encoding not in page.variants:
+                page.variants[encoding] = body
+                # pages evicted in the meantime are not accounted anymore
+                if self._pages.get(key) is page:
+                    self._size += len(body)
+                    self._evict()
+        return body
+
+    def _evict(self):
+        while self._size > self.max_bytes and self._pages:
+            _, page = self._pages.popitem(last=False)
+            self._size -= page.size
+
+
+page_cache = PageCache()
+
+
+def cached_page(func):
+    """
+    Decorator for views that only depend on the loaded archive and the URL.
+
+    The rendered page is cached per URL (including the query string) and sent with an ETag and
+    Last-Modified (so browsers revalidate with a 304 response) and gzip or
+    brotli compressed if the client accepts it. Not used in debug mode.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        # index() renders through the other decorated views
+        if flask.current_app.debug or flask.g.get("_cached_page"):
+            return func(*args, **kwargs)
+        flask.g._cached_page = True
+
+        request = flask.request
+        key = (request.script_root, request.path, request.query_string)
+        page = page_cache.get(key)
+        if page is None:
+            generation = page_cache.generation
+            response = flask.make_response(func(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            page = CachedPage(
+                response.get_data(),
+                response.content_type,
+                state.loaded_at(),
+            )
+            page_cache.put(key, page, generation)
+
+        encoding = request.accept_encodings.best_match(page.encodings(), default="identity")
+        response = flask.Response(page_cache.variant(key, page, encoding), content_type=page.content_type)
+        if encoding != "identity":
+            response.headers["Content-Encoding"] = encoding
+        response.vary.add("Accept-Encoding")
+        # every variant needs its own strong validator
+        response.set_etag(page.etag if encoding == "identity" else f"{page.etag}-{encoding}")
+        if page.last_modified:
+            response.last_modified = page.last_modified
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+    return wrapper
@@ -0,0 +1,186 @@
+"""Per host rate limits, adaptive concurrency and retry delays for the downloader"""
+
+import random
+import threading
+import time
+
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+
+# requests per second and burst size of the token bucket of every host
+DEFAULT_RATE = 20.0
+DEFAULT_BURST = 10
+# concurrent requests per host, the limit moves between 1 and this
+MAX_CONCURRENCY = 8
+# retry delays without Retry-After: BASE_DELAY * 2 ** attempt, at most MAX_DELAY
+BASE_DELAY = 0.5
+MAX_DELAY = 60.0
+
+# answers that mean the host is overloaded
+THROTTLE_STATUS = frozenset([429, 500, 502, 503, 504])
+
+
+def parse_retry_after(value, now=None):
+    """
+    Seconds to wait from a Retry-After header (delay in seconds or HTTP
+    date), None if missing or invalid
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    now = now or datetime.now(timezone.utc)
+    return max(0.0, (date - now).total_seconds())
+
+
+class TokenBucket(object):
+    """
+    Allows `rate` requests per second on average and bursts of `burst`.
+    Not thread safe, used under the lock of its _Host.
+    """
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self._clock = clock
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def take(self):
+        """Takes a token, returns 0 or the seconds until one is available"""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class _Host(object):
+
+    def __init__(self, scheduler):
+        self.bucket = TokenBucket(scheduler.rate, scheduler.burst, scheduler.clock)
+        # AIMD: +1/limit per success (about +1 per round trip of all
+        # requests in flight), halved on throttling
+        self.limit = float(min(2, scheduler.max_concurrency))
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.throttled = 0
+        # requests started before the last decrease do not decrease again,
+        # a burst of throttled answers only halves the limit once
+        self.epoch = 0
+        self.condition = threading.Condition()
+
+
+class Slot(object):
+    """A request in flight, see Scheduler.slot"""
+
+    def __init__(self):
+        self.retry_after = None
+        self.throttled = False
+
+    def throttle(self, retry_after=None):
+        """Marks the answer as throttling (429, 5xx), with its Retry-After delay"""
+        self.throttled = True
+        self.retry_after = retry_after
+
+
+class Scheduler(object):
+    """
+    Decides when a request to a host may start.
+
+    Every host has a token bucket for the request rate and a concurrency
+    limit that is increased additively while requests succeed and halved
+    when the host throttles (AIMD). A Retry-After delay pauses all requests
+    to the host. Retries without one wait an exponentially growing delay
+    with full jitter.
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST, max_concurrency=MAX_CONCURRENCY,
+                 base_delay=BASE_DELAY, max_delay=MAX_DELAY, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.clock = clock
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _host(self, url):
+        netloc = urlparse(url).netloc
+        with self._lock:
+            host = self._hosts.get(netloc)
+            if host is None:
+                host = self._hosts[netloc] = _Host(self)
+            return host
+
+    def concurrency(self, url):
+        """Current concurrency limit for the host of url"""
+        return int(self._host(url).limit)
+
+    @contextmanager
+    def slot(self, url):
+        """
+        Waits until a request to the host of url may start and yields a Slot.
+        Call slot.throttle() on throttling answers before leaving the block.
+        Exceptions other than throttling leave the limits unchanged.
+        """
+        host = self._host(url)
+        with host.condition:
+            while True:
+                now = self.clock()
+                wait = host.blocked_until - now
+                if wait <= 0 and host.in_flight < int(host.limit):
+                    wait = host.bucket.take()
+                    if wait <= 0:
+                        break
+                # woken early when a request finishes or the limits change
+                host.condition.wait(wait if wait > 0 else None)
+            host.in_flight += 1
+            epoch = host.epoch
+
+        slot = Slot()
+        failed = False
+        try:
+            yield slot
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            with host.condition:
+                host.in_flight -= 1
+                if slot.throttled:
+                    host.throttled += 1
+                    if epoch == host.epoch:
+                        host.limit = max(1.0, host.limit / 2)
+                        host.epoch += 1
+                    if slot.retry_after:
+                        host.blocked_until = max(host.blocked_until, self.clock() + slot.retry_after)
+                elif not failed:
+                    host.limit = min(float(self.max_concurrency), host.limit + 1 / host.limit)
+                host.condition.notify_all()
+
+    def backoff(self, url, attempt):
+        """
+        Seconds to wait before retry number `attempt` (0 based) to url.
+        0 while the host is paused by Retry-After, slot() waits for that.
+        """
+        host = self._host(url)
+        if host.blocked_until > self.clock():
+            return 0.0
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
@@ -0,0 +1,70 @@
+"""Downscaled copies of downloaded images in the sizes the templates display"""
+
+import logging
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image
+except ImportError:  # optional, the originals are used without it
+    Image = None
+
+
+# formats written back as they are read, everything else is left alone
+_FORMATS = frozenset(["JPEG", "PNG", "WEBP", "GIF"])
+
+
+def available():
+    return Image is not None
+
+
+def make_thumbnail(source, target, size):
+    """
+    Writes `source` scaled down to fit into size x size pixels to `target`.
+
+    :return: target, or None if the image is not larger than size (or not
+    a still image in a supported format), the original should be used then
+    """
+    if os.path.exists(target):
+        return target
+    tmp_target = "{}.{}.tmp".format(target, os.getpid())
+    try:
+        with Image.open(source) as image:
+            if image.format not in _FORMATS or getattr(image, "is_animated", False):
+                return None
+            if image.width <= size and image.height <= size:
+                return None
+            image_format = image.format
+            image.thumbnail((size, size), Image.LANCZOS)
+            options = {"optimize": True}
+            if image_format == "JPEG":
+                options["quality"] = 85
+            image.save(tmp_target, image_format, **options)
+        os.replace(tmp_target, target)
+        return target
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        logging.warning("Could not create a thumbnail of %s: %s", source, e)
+        if os.path.exists(tmp_target):
+            os.unlink(tmp_target)
+        return None
+
+
+def _make_thumbnail(job):
+    return make_thumbnail(*job)
+
+
+def make_thumbnails(jobs, max_workers=None):
+    """
+    Creates the thumbnails in a process pool.
+
+    :param jobs: (source, target, size) tuples
+    :return: list of the results of make_thumbnail, in the order of jobs
+    """
+    jobs = list(jobs)
+    if not jobs:
+        return []
+    if len(jobs) == 1 or max_workers == 1:
+        return [_make_thumbnail(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(_make_thumbnail, jobs, chunksize=16))
@@ -0,0 +1,167 @@
+"""Phase timings and optional per phase cProfile dumps"""
+
+import cProfile
+import functools
+import json
+import os
+import re
+import sys
+import time
+
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process in KiB, None if unknown"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux KiB
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+class _NullRecord(dict):
+    """Returned by phase() while disabled, swallows all counts"""
+
+    def __setitem__(self, key, value):
+        pass
+
+    def count(self, **counts):
+        pass
+
+
+class _PhaseRecord(dict):
+
+    def count(self, **counts):
+        """Adds the given counts (messages=..., files=...) to the phase"""
+        phase_counts = self["counts"]
+        for key, value in counts.items():
+            phase_counts[key] = phase_counts.get(key, 0) + value
+
+
+class PhaseTimer(object):
+    """
+    Collects wall time, CPU time, peak RSS and counts per named phase.
+
+    Calls of the same phase are accumulated into one record. Times include
+    nested phases, while the cProfile dumps (if enabled) only contain the
+    time spent in the phase itself. Disabled by default, in which case
+    phase() and timed() cost next to nothing.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Disables the timer and drops all collected phases"""
+        self.enabled = False
+        self.profile_dir = None
+        self._phases = {}
+        self._profiles = {}
+        self._profile_stack = []
+        self._started = None
+
+    def enable(self, profile_dir=None):
+        """
+        :param str profile_dir: if set, a cProfile dump per phase is written
+        into this directory by write_report
+        """
+        self.enabled = True
+        self.profile_dir = profile_dir
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name, **counts):
+        if not self.enabled:
+            yield _NullRecord()
+            return
+
+        record = self._phases.get(name)
+        if record is None:
+            record = self._phases[name] = _PhaseRecord(
+                name=name, calls=0, wall_s=0.0, cpu_s=0.0, peak_rss_kb=None, counts={})
+        record.count(**counts)
+
+        self._push_profile(name)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record["wall_s"] += time.perf_counter() - wall
+            record["cpu_s"] += time.process_time() - cpu
+            record["calls"] += 1
+            record["peak_rss_kb"] = peak_rss_kb()
+            self._pop_profile()
+
+    def timed(self, name, counter=None):
+        """
+        Decorator version of phase()
+
+        :param callable counter: gets the return value of the function and
+        returns a dict of counts for the phase
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.phase(name) as record:
+                    result = func(*args, **kwargs)
+                    if counter:
+                        record.count(**counter(result))
+                    return result
+            return wrapper
+        return decorator
+
+    def report(self):
+        return {
+            "total_wall_s": time.perf_counter() - self._started if self._started else None,
+            "peak_rss_kb": peak_rss_kb(),
+            "phases": list(self._phases.values()),
+        }
+
+    def write_report(self, path):
+        """Writes the JSON report to path and the cProfile dumps if enabled"""
+        if not self.enabled:
+            return
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.report(), f, indent=2)
+            print(f"Timing report written to {path}")
+        if self.profile_dir:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            for name, profile in self._profiles.items():
+                profile.dump_stats(os.path.join(self.profile_dir, re.sub(r"[^\w.-]", "_", name) + ".prof"))
+            print(f"Profiles written to {self.profile_dir}")
+
+    def _push_profile(self, name):
+        if not self.profile_dir:
+            return
+        # only one profiler can be active at a time, so the enclosing phase
+        # is paused while a nested one runs
+        if self._profile_stack:
+            self._profile_stack[-1].disable()
+        profile = self._profiles.setdefault(name, cProfile.Profile())
+        self._profile_stack.append(profile)
+        profile.enable()
+
+    def _pop_profile(self):
+        if not self.profile_dir:
+            return
+        self._profile_stack.pop().disable()
+        if self._profile_stack:
+            self._profile_stack[-1].enable()
+
+
+# process wide timer used by the instrumented functions
+timer = PhaseTimer()
+
+
+def count_messages(chats):
+    """counter for the Reader.compile_* results"""
+    return {"conversations": len(chats), "messages": sum(len(m) for m in chats.values())}
@@ -0,0 +1,174 @@
+"""Reloading a served archive directory while an export job writes to it"""
+
+import logging
+import os
+import threading
+
+from datetime import datetime, timezone
+
+from slackviewer.state import LoadedArchive, load_archive
+from slackviewer.utils.timing import timer
+
+
+# seconds between two scans of the archive directory
+DEFAULT_INTERVAL = 10.0
+
+
+def snapshot(path):
+    """
+    (mtime_ns, size) of the metadata files and the day files of the archive
+    directory path, keyed by their path relative to it ("general/2020-01-01.json")
+    """
+    files = {}
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            if entry.is_dir():
+                with os.scandir(entry.path) as day_files:
+                    for day in day_files:
+                        if day.name.endswith(".json") and day.is_file():
+                            stat = day.stat()
+                            files[entry.name + "/" + day.name] = (stat.st_mtime_ns, stat.st_size)
+            elif entry.name.endswith(".json") and entry.is_file():
+                stat = entry.stat()
+                files[entry.name] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+
+def changed_conversations(old, new):
+    """
+    Names of the conversation directories with added, changed or removed day
+    files between two snapshots. None if a metadata file (users.json,
+    channels.json, ...) changed, everything has to be reloaded then.
+    """
+    changed = set()
+    for name in set(old) | set(new):
+        if old.get(name) != new.get(name):
+            directory, slash, _ = name.partition("/")
+            if not slash:
+                return None
+            changed.add(directory)
+    return changed
+
+
+def _merge(current, order, fresh, names):
+    """current with the conversations in names replaced by fresh, in the order of the reader"""
+    merged = {}
+    for name in order:
+        conversations = fresh if name in names else current
+        if name in conversations:
+            merged[name] = conversations[name]
+    return merged
+
+
+@timer.timed("reload_conversations")
+def reload_conversations(config, archive, names):
+    """
+    A copy of the LoadedArchive archive with the conversations in names read
+    again. The other conversations are shared with archive.
+    """
+    from slackviewer.attachments import build_attachment_index
+    from slackviewer.reader import Reader
+    from slackviewer.stats import compute_stats
+
+    reader = Reader(config)
+
+    def read(iterate, all_names):
+        # the iter_* methods read every conversation when given no names
+        selected = [n for n in all_names if n in names]
+        return dict(iterate(selected)) if selected else {}
+
+    state = LoadedArchive()
+    vars(state).update(vars(archive))
+
+    channel_names = reader.channel_names(config.channels)
+    channels = read(reader.iter_channels, channel_names)
+    state.channels = _merge(archive.channels, channel_names, {k: v for k, v in channels.items() if v}, names)
+    group_names = reader.group_names()
+    groups = read(reader.iter_groups, group_names)
+    state.groups = _merge(archive.groups, group_names, {k: v for k, v in groups.items() if v}, names)
+    if config.show_dms:
+        dm_ids = reader.dm_ids()
+        state.dms = _merge(archive.dms, dm_ids, read(reader.iter_dm_messages, dm_ids), names)
+        state.dm_users = reader.compile_dm_users()
+        mpim_names = reader.mpim_names()
+        state.mpims = _merge(archive.mpims, mpim_names, read(reader.iter_mpim_messages, mpim_names), names)
+        state.mpim_users = reader.compile_mpim_users()
+
+    with timer.phase("compute_stats"):
+        state.stats = compute_stats(state.channels, state.groups, state.dms, state.mpims)
+
+    # indexes of replaced conversations are rebuilt on first use, see app._message_index
+    state.message_indexes = dict(archive.message_indexes)
+    state.attachments = {k: v for k, v in archive.attachments.items() if k[0] not in names}
+    state.attachments.update(build_attachment_index(state.path, names))
+
+    state.loaded_at = datetime.now(timezone.utc)
+    return state
+
+
+class ArchiveWatcher(object):
+    """
+    Polls the directory of a served archive and reloads the conversations
+    whose day files were added or changed. Everything is reloaded when a
+    metadata file changes.
+
+    Changes are applied once the directory stayed unchanged for one
+    interval, so files still being written are not read. The reloaded
+    archive is passed to install, which has to make it the served one.
+    """
+
+    def __init__(self, config, archive, install, interval=DEFAULT_INTERVAL):
+        self.archive = archive
+        self.interval = interval
+        self._config = config
+        self._install = install
+        self._files = snapshot(archive.path)
+        self._pending = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def check(self):
+        """Scans the directory once, returns the reloaded archive or None"""
+        files = snapshot(self.archive.path)
+        if files == self._files:
+            self._pending = None
+            return None
+        if files != self._pending:
+            self._pending = files
+            return None
+
+        changed = changed_conversations(self._files, files)
+        try:
+            if changed is None:
+                archive = load_archive(self._config)
+            else:
+                archive = reload_conversations(self._config, self.archive, changed)
+        finally:
+            # a file that can not be read is only tried again once it changes
+            self._files, self._pending = files, None
+
+        self.archive = archive
+        self._install(archive)
+        if changed is None:
+            print("Reloaded {}".format(archive.path))
+        else:
+            print("Reloaded {} of {}".format(", ".join(sorted(changed)), archive.path))
+        return archive
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                logging.exception("Could not reload %s", self.archive.path)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="archive-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
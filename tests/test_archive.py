@@ -1,5 +1,8 @@
 import hashlib
 import io
+import os
+import time
+import zipfile
 from os import path
 
 import pytest
@@ -21,3 +24,173 @@ def test_SHA1_file():
     expected = SHA1_file(filepath, version)
     actual = archive.SHA1_file(filepath, version)
     assert actual == expected
+
+
+def test_fingerprint_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "SLACKVIEWER_TEMP_PATH", str(tmp_path / "cache"))
+    filepath = path.join("tests", "testarchive.zip")
+    version = to_bytes(slackviewer.__version__)
+
+    fingerprint = archive.fingerprint_file(filepath, version)
+    assert fingerprint != archive.SHA1_file(filepath, version)
+
+    # unchanged archives are answered from the sidecar cache without opening the zip
+    def fail(*args, **kwargs):
+        raise AssertionError("zip file was opened")
+
+    with monkeypatch.context() as m:
+        m.setattr(archive.zipfile, "ZipFile", fail)
+        assert archive.fingerprint_file(filepath, version) == fingerprint
+
+    assert archive.fingerprint_file(filepath, b"other version") != fingerprint
+
+
+def test_fingerprint_file_changes_with_content(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "SLACKVIEWER_TEMP_PATH", str(tmp_path / "cache"))
+    filepath = str(tmp_path / "export.zip")
+
+    with zipfile.ZipFile(filepath, "w") as z:
+        z.writestr("channels.json", "[]")
+    first = archive.fingerprint_file(filepath)
+
+    with zipfile.ZipFile(filepath, "w") as z:
+        z.writestr("channels.json", "[{}]")
+    assert archive.fingerprint_file(filepath) != first
+
+
+def test_lazy_extract_archive(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "SLACKVIEWER_TEMP_PATH", str(tmp_path))
+    filepath = path.join("tests", "testarchive.zip")
+
+    extracted = archive.extract_archive(filepath, lazy=True)
+    assert sorted(os.listdir(extracted)) == [
+        archive.ARCHIVE_INFO, archive.MEMBER_MANIFEST, "channels.json", "integration_logs.json", "users.json"]
+
+    archive.extract_conversations(filepath, extracted, ["enrique"])
+    assert os.path.isfile(os.path.join(extracted, "enrique", "2016-01-14.json"))
+    assert not os.path.exists(os.path.join(extracted, "traveling-sailor"))
+
+    # a full extraction completes the lazy one in place
+    assert archive.extract_archive(filepath) == extracted
+    assert os.path.isdir(os.path.join(extracted, "traveling-sailor"))
+    with zipfile.ZipFile(filepath) as z:
+        for name in z.namelist():
+            assert os.path.exists(os.path.join(extracted, name))
+
+
+def _set_last_access(extracted, timestamp):
+    info_path = os.path.join(extracted, archive.ARCHIVE_INFO)
+    archive_info = archive._read_json(info_path)
+    archive_info["last_access"] = timestamp
+    archive._write_json(info_path, archive_info)
+
+
+def test_extraction_cache_eviction(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "SLACKVIEWER_TEMP_PATH", str(tmp_path / "cache"))
+
+    extracted = []
+    for i in range(3):
+        filepath = str(tmp_path / "export{}.zip".format(i))
+        with zipfile.ZipFile(filepath, "w") as z:
+            z.writestr("channels.json", "[]")
+            z.writestr("general/2020-01-01.json", "[]" + " " * 1000 * i)
+        extracted.append(archive.extract_archive(filepath))
+    _set_last_access(extracted[0], 1000)
+    _set_last_access(extracted[1], 2000)
+    entries = archive.cached_extractions()
+    assert [e["path"] for e in entries] == [os.path.dirname(p) for p in extracted]
+    assert [e["size"] for e in entries] == [4, 1004, 2004]
+
+    stale = archive.evict_extractions(max_age=24 * 60 * 60, dry_run=True)
+    assert [e["path"] for e in stale] == [os.path.dirname(p) for p in extracted[:2]]
+    assert all(os.path.isdir(p) for p in extracted)
+
+    # the least recently used extractions go first, the new one is always kept
+    filepath = str(tmp_path / "export3.zip")
+    with zipfile.ZipFile(filepath, "w") as z:
+        z.writestr("channels.json", "[]" + " " * 3000)
+    latest = archive.extract_archive(filepath, cache_max_size=4000)
+    assert [e["path"] for e in archive.cached_extractions()] == [os.path.dirname(latest)]
+    assert not any(os.path.exists(p) for p in extracted)
+
+
+@pytest.mark.skipif(archive.fcntl is None, reason="needs fcntl")
+def test_extraction_in_use_is_not_evicted(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "SLACKVIEWER_TEMP_PATH", str(tmp_path / "cache"))
+    filepath = str(tmp_path / "export.zip")
+    with zipfile.ZipFile(filepath, "w") as z:
+        z.writestr("channels.json", "[]")
+    extracted = archive.extract_archive(filepath)
+
+    in_use = archive.use_extraction(extracted)
+    assert archive.evict_extractions(max_size=0) == []
+    assert archive.evict_extractions(max_age=0) == []
+    assert os.path.isdir(extracted)
+
+    in_use.close()
+    assert len(archive.evict_extractions(max_size=0)) == 1
+    assert not os.path.exists(extracted)
+    # directories that are not cached extractions are left alone
+    assert archive.use_extraction(str(tmp_path)) is None
+
+
+def test_extract_members_shares_directories(tmp_path, monkeypatch):
+    filepath = str(tmp_path / "export.zip")
+    with zipfile.ZipFile(filepath, "w") as z:
+        for channel in range(4):
+            for day in range(1, 29):
+                z.writestr("channel-{}/2020-02-{:02}.json".format(channel, day), "[{}]".format(day))
+
+    # widens the window between ZipFile.extract checking for a directory and creating it
+    makedirs = os.makedirs
+
+    def slow_makedirs(name, *args, **kwargs):
+        time.sleep(0.01)
+        makedirs(name, *args, **kwargs)
+    monkeypatch.setattr(os, "makedirs", slow_makedirs)
+
+    extracted = str(tmp_path / "extracted")
+    with zipfile.ZipFile(filepath) as z:
+        archive._extract_members(filepath, z.infolist(), extracted, workers=8)
+    for channel in range(4):
+        assert len(os.listdir(path.join(extracted, "channel-{}".format(channel)))) == 28
+
+
+def test_extraction_reuses_previous_export(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "SLACKVIEWER_TEMP_PATH", str(tmp_path / "cache"))
+
+    first = str(tmp_path / "export-january.zip")
+    with zipfile.ZipFile(first, "w") as z:
+        z.writestr("channels.json", "[]")
+        z.writestr("general/2020-01-01.json", "[1]")
+        z.writestr("general/2020-01-02.json", "[2]")
+    previous = archive.extract_archive(first)
+
+    # the next export has one changed and one new day file
+    second = str(tmp_path / "export-february.zip")
+    with zipfile.ZipFile(second, "w") as z:
+        z.writestr("channels.json", "[]")
+        z.writestr("general/2020-01-01.json", "[1]")
+        z.writestr("general/2020-01-02.json", "[2, 3]")
+        z.writestr("general/2020-02-01.json", "[4]")
+    extracted = archive.extract_archive(second)
+
+    def same(name):
+        return os.path.samefile(path.join(previous, name), path.join(extracted, name))
+    assert same("channels.json") and same("general/2020-01-01.json")
+    assert not same("general/2020-01-02.json")
+    with open(path.join(extracted, "general", "2020-01-02.json")) as f:
+        assert f.read() == "[2, 3]"
+    with open(path.join(extracted, "general", "2020-02-01.json")) as f:
+        assert f.read() == "[4]"
+    assert archive._read_json(path.join(extracted, archive.ARCHIVE_INFO))["reused_from"] == previous
+
+    # linked files count once towards the cache size
+    on_disk = {}
+    for extraction in (previous, extracted):
+        for root, dirs, names in os.walk(extraction):
+            for name in names:
+                stat = os.stat(path.join(root, name))
+                on_disk[stat.st_ino] = stat.st_size
+    assert archive.evict_extractions(max_size=sum(on_disk.values()), dry_run=True) == []
+    assert len(archive.evict_extractions(max_size=sum(on_disk.values()) - 1, dry_run=True)) == 1
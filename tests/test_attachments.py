@@ -0,0 +1,83 @@
+import zipfile
+
+from slackviewer.app import app
+from slackviewer.attachments import build_attachment_index
+from slackviewer.config import Config
+from slackviewer.main import configure_app
+
+
+def test_build_attachment_index(tmp_path):
+    (tmp_path / "general" / "attachments").mkdir(parents=True)
+    (tmp_path / "general" / "attachments" / "F1-report.pdf").write_bytes(b"%PDF")
+    (tmp_path / "hidden" / "attachments").mkdir(parents=True)
+    (tmp_path / "hidden" / "attachments" / "F2-secret.pdf").write_bytes(b"%PDF")
+    (tmp_path / "users.json").write_text("[]")
+
+    index = build_attachment_index(str(tmp_path), ["general", "random"])
+
+    assert index == {("general", "F1-report.pdf"): str(tmp_path / "general" / "attachments" / "F1-report.pdf")}
+    # only files of loaded conversations can be looked up
+    assert ("hidden", "F2-secret.pdf") not in index
+    assert ("general", "../../users.json") not in index
+
+
+CLIP = bytes(range(256)) * 4
+
+
+def _client(tmp_path, **options):
+    export = tmp_path / "export"
+    with zipfile.ZipFile("tests/testarchive.zip") as z:
+        z.extractall(export)
+    (export / "enrique" / "attachments").mkdir()
+    (export / "enrique" / "attachments" / "F1-clip.mp4").write_bytes(CLIP)
+    configure_app(app, Config(dict({
+        "archive": str(export),
+        "show_dms": True,
+        "thread_note": True,
+        "debug": False,
+        "no_sidebar": False,
+        "no_external_references": False,
+    }, **options)))
+    return app.test_client()
+
+
+def test_send_attachment(tmp_path):
+    client = _client(tmp_path)
+
+    response = client.get("/channel/enrique/attachments/F1-clip.mp4")
+    assert response.status_code == 200
+    assert response.data == CLIP
+    assert response.headers["Accept-Ranges"] == "bytes"
+    assert response.mimetype == "video/mp4"
+
+    response = client.get("/channel/enrique/attachments/F1-clip.mp4", headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.data == CLIP[100:200]
+    assert response.headers["Content-Range"] == "bytes 100-199/{}".format(len(CLIP))
+
+    response = client.get("/channel/enrique/attachments/F1-clip.mp4", headers={"Range": "bytes=5000-"})
+    assert response.status_code == 416
+
+    etag = client.get("/channel/enrique/attachments/F1-clip.mp4").headers["ETag"]
+    response = client.get("/channel/enrique/attachments/F1-clip.mp4", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+
+    for url in ("/channel/enrique/attachments/F2-missing.mp4", "/channel/nobody/attachments/F1-clip.mp4",
+                "/channel/enrique/attachments/..%2F2016-03-28.json"):
+        assert client.get(url).status_code == 404
+
+
+def test_send_attachment_offloaded(tmp_path):
+    client = _client(tmp_path, x_accel_prefix="/protected/")
+    response = client.get("/channel/enrique/attachments/F1-clip.mp4")
+    assert response.status_code == 200
+    assert response.data == b""
+    assert response.headers["X-Accel-Redirect"] == "/protected/enrique/attachments/F1-clip.mp4"
+    assert "Content-Type" not in response.headers
+
+    client = _client(tmp_path / "sendfile", x_sendfile=True)
+    response = client.get("/channel/enrique/attachments/F1-clip.mp4")
+    assert response.status_code == 200
+    assert response.headers["X-Sendfile"] == str(tmp_path / "sendfile" / "export" / "enrique" / "attachments" / "F1-clip.mp4")
+    assert response.data == b""
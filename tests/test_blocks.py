@@ -0,0 +1,128 @@
+import logging
+
+import pytest
+
+from slackviewer import blocks
+from slackviewer.blocks import BlockRenderer, register_block, register_element
+
+
+class FakeUser(object):
+    display_name = "alice"
+
+
+class FakeFormatter(object):
+
+    def find_user(self, message):
+        return FakeUser() if message["user"] == "U1" else None
+
+    def find_channel(self, channel_id):
+        return "general" if channel_id == "C1" else None
+
+
+def render(block_list):
+    return BlockRenderer(FakeFormatter(), "acme").render(block_list)
+
+
+def rich_text(*elements):
+    return [{"type": "rich_text", "elements": list(elements)}]
+
+
+def section(*elements):
+    return {"type": "rich_text_section", "elements": list(elements)}
+
+
+@pytest.mark.parametrize("element, expected", [
+    ({"type": "text", "text": "plain"}, "plain"),
+    ({"type": "text", "text": "both", "style": {"bold": True, "italic": True}}, "<i><b>both</b></i>"),
+    ({"type": "link", "url": "https://a.b/c_d"}, "<a href='https://a.b/c_d'>https://a.b/c&#95;d</a>"),
+    ({"type": "link", "url": "https://a.b", "text": "a_b"}, "<a href='https://a.b'>a&#95;b</a>"),
+    ({"type": "user", "user_id": "U1"}, "<b>@alice</b>"),
+    ({"type": "user", "user_id": "U2"}, "<b>[ Unknown user U2 ]</b>"),
+    ({"type": "channel", "channel_id": "C1"}, "<a href='https://acme.slack.com/archives/C1'>general</a>"),
+    ({"type": "channel", "channel_id": "C2"}, "<a href='https://acme.slack.com/archives/C2'>[ Unknown channel C2 ]</a>"),
+    ({"type": "emoji", "name": "smile", "unicode": "1f604"}, "\U0001f604"),
+    ({"type": "emoji", "name": "custom"}, "custom"),
+    ({"type": "broadcast", "range": "here"}, ""),
+])
+def test_rich_text_elements(element, expected):
+    assert render(rich_text(section(element))) == expected
+
+
+def test_rich_text_containers():
+    assert render(rich_text(
+        {"type": "rich_text_quote", "elements": [{"type": "text", "text": "quoted"}]},
+        {"type": "rich_text_list", "style": "bullet", "elements": [
+            section({"type": "text", "text": "one"}),
+            section({"type": "text", "text": "two"}),
+        ]},
+        {"type": "rich_text_list", "style": "ordered", "elements": [section({"type": "text", "text": "first"})]},
+        {"type": "rich_text_list", "style": "unknown", "elements": []},
+        {"type": "rich_text_preformatted", "elements": [{"type": "text", "text": "snake_case"}]},
+    )) == (
+        "<blockquote>quoted</blockquote>"
+        "<ul><li>one</li>\n<li>two</li></ul>\n"
+        "<ol><li>first</li></ol>\n"
+        "<pre>snake&#95;case</pre>"
+    )
+    assert render([{"type": "rich_text_quote", "elements": [{"type": "text", "text": "block"}]}]) == "block"
+
+
+def test_preformatted_does_not_modify_message():
+    element = {"type": "text", "text": "a_b"}
+    render(rich_text({"type": "rich_text_preformatted", "elements": [element]}))
+    assert element["text"] == "a_b"
+
+
+def test_blocks():
+    assert render([
+        {"type": "image", "image_url": "https://a.b/i.png", "alt_text": "alt", "title": {"text": "title"}},
+        {"type": "section", "fields": [{"type": "mrkdwn", "text": "*field*"}, {"type": "plain_text", "text": "plain"}]},
+        {"type": "context", "elements": [
+            {"type": "image", "image_url": "https://a.b/c.png", "alt_text": "c"},
+            {"type": "mrkdwn", "text": "small"},
+        ]},
+        {"type": "actions", "elements": [{"type": "button", "text": {"type": "plain_text", "text": "Go"}}]},
+        {"type": "header", "elements": [{"type": "plain_text", "text": "Head"}]},
+        {"type": "divider"},
+    ]) == (
+        "<img src='https://a.b/i.png' alt='alt' title='title'>\n"
+        "*field*\n\n"
+        "plain\n\n"
+        "<img src='https://a.b/c.png' alt='c'>\n"
+        "<small>small</small>\n"
+        "Slack_Action(Slack_Button(Go))\n"
+        "*Head*\n\n"
+        "---\n"
+    )
+
+
+def test_unsupported_blocks():
+    assert render([{"type": "image"}]) == "unsupported_block(image: {'type': 'image'})\n\n"
+    assert render([{"type": "section", "fields": [{"type": "video", "text": "v"}]}]) == "unsupported_block(section: v)\n\n"
+    assert render([{"type": "section", "fields": [{"type": "mrkdwn"}]}]) == "unsupported_block(section: {'type': 'mrkdwn'})\n\n"
+    assert render([{"type": "file", "file_id": "F1"}]) == ""
+
+
+def test_warnings_are_rate_limited(caplog, monkeypatch):
+    monkeypatch.setattr(blocks, "_warning_counts", {})
+    with caplog.at_level(logging.WARNING):
+        for _ in range(10):
+            render([{"type": "file", "file_id": "F1"}])
+    assert len(caplog.records) == blocks.WARNING_LIMIT
+    assert "suppressed" in caplog.records[-1].getMessage()
+
+
+def test_registration(monkeypatch):
+    monkeypatch.setattr(blocks, "_BLOCK_HANDLERS", dict(blocks._BLOCK_HANDLERS))
+    monkeypatch.setattr(blocks, "_ELEMENT_HANDLERS", dict(blocks._ELEMENT_HANDLERS))
+
+    @register_block("file")
+    def render_file(renderer, block, out):
+        out.append(f"[file {block['file_id']}]")
+
+    @register_element("date")
+    def render_date(renderer, element, out):
+        out.append(element["fallback"])
+
+    assert render([{"type": "file", "file_id": "F1"}]) == "[file F1]"
+    assert render(rich_text(section({"type": "date", "fallback": "today"}))) == "today"
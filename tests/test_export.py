@@ -0,0 +1,78 @@
+import os
+import pkgutil
+import re
+from datetime import datetime
+
+from click.testing import CliRunner
+
+from slackviewer import archive
+from slackviewer.cli import cli
+from slackviewer.config import Config
+from slackviewer.export import _shard_filename
+from slackviewer.reader import Reader
+from slackviewer.templating import create_environment
+
+
+def _blocks(html):
+    """The channel blocks of an export, without the header with the generation time"""
+    return [block.split("</body>")[0].strip() for block in html.split('<div class="channel-block">')[1:]]
+
+
+def test_sharded_export_matches_single_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "SLACKVIEWER_TEMP_PATH", str(tmp_path / "cache"))
+    monkeypatch.chdir(tmp_path)
+    testarchive = os.path.join(os.path.dirname(__file__), "testarchive.zip")
+    runner = CliRunner()
+
+    result = runner.invoke(cli, ["export", testarchive])
+    assert result.exit_code == 0, result.output
+    with open(tmp_path / "testarchive.html", encoding="utf-8") as f:
+        single = _blocks(f.read())
+
+    result = runner.invoke(cli, ["export", "--shards", "shards", "--jobs", "2", testarchive])
+    assert result.exit_code == 0, result.output
+    sharded = []
+    for name in ("enrique", "traveling-sailor"):
+        with open(tmp_path / "shards" / _shard_filename("channel", name), encoding="utf-8") as f:
+            sharded.extend(_blocks(f.read()))
+
+    assert len(single) == 2
+    assert sharded == single
+
+
+def test_shard_filenames_do_not_collide():
+    names = ["a.b", "a_b", "a b", "a/b", "a:b"]
+    filenames = {_shard_filename("channel", name) for name in names}
+    assert len(filenames) == len(names)
+    # names that are safe already are kept as they are
+    assert _shard_filename("channel", "a_b") == "channel-a_b.html"
+    assert _shard_filename("dm", "D024BE91L") == "dm-D024BE91L.html"
+
+
+def test_streaming_export_matches_render(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "SLACKVIEWER_TEMP_PATH", str(tmp_path / "cache"))
+    monkeypatch.chdir(tmp_path)
+    testarchive = os.path.join(os.path.dirname(__file__), "testarchive.zip")
+
+    result = CliRunner().invoke(cli, ["export", testarchive])
+    assert result.exit_code == 0, result.output
+    with open(tmp_path / "testarchive.html", "rb") as f:
+        streamed = f.read()
+
+    # everything loaded up front and rendered in one piece
+    reader = Reader(Config({"archive": testarchive}))
+    css = pkgutil.get_data("slackviewer", "static/viewer.css").decode("utf-8")
+    rendered = create_environment().get_template("export_single.html").render(
+        css=css,
+        generated_on=datetime.now(),
+        workspace_name=reader.slack_name(),
+        source_file="testarchive.zip",
+        channels=[{"channel_name": k, "messages": v} for k, v in sorted(reader.compile_channels().items())],
+        dms=[],
+        mpims=[],
+    ).encode("utf-8")
+
+    def without_date(html):
+        return re.sub(rb"Generated on:</td><td> <b>[^<]*", b"", html)
+    assert b"Messages in #enrique" in streamed
+    assert without_date(streamed) == without_date(rendered)
@@ -0,0 +1,170 @@
+import io
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from slackviewer.utils import downloader as downloader_module
+from slackviewer.utils.downloader import ExternalResourceDownloader, INDEX_FILE
+
+
+IMAGE = b"\x89PNG" + bytes(range(256)) * 800
+
+RESOURCES = {
+    "/files-pri/T1-F1/cat.png": IMAGE,
+    "/files-tmb/T1-F1-abc/cat_360.png": IMAGE,
+    "/other/dog.png": IMAGE[::-1],
+}
+
+WINDOW_REQUESTS = 5
+
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        body = RESOURCES.get(self.path)
+        if self.path.startswith("/throttled/"):
+            body = IMAGE + self.path.encode()
+        if body is None:
+            self.send_error(404)
+            return
+        if self.path.startswith("/throttled/") and self._throttle():
+            return
+        self.server.requests.append((self.path, self.headers.get("Range")))
+
+        start = 0
+        if self.headers.get("Range"):
+            start = int(self.headers["Range"][len("bytes="):].rstrip("-"))
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes {}-{}/{}".format(start, len(body) - 1, len(body)))
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(body) - start))
+        self.end_headers()
+
+        # simulates a dropped connection after the given number of bytes
+        cut = self.server.cut_after.pop(self.path, None)
+        self.wfile.write(body[start:cut])
+
+    def _throttle(self):
+        # like a CDN rate limit: WINDOW_REQUESTS per second, 429 with Retry-After above that
+        with self.server.lock:
+            now = time.monotonic()
+            self.server.arrivals.append(now)
+            window = self.server.window
+            if now - window["start"] >= 1:
+                window.update(start=now, count=0)
+            window["count"] += 1
+            if window["count"] <= WINDOW_REQUESTS:
+                return False
+            self.server.throttled.append((now, math.ceil(window["start"] + 1 - now)))
+        retry_after = self.server.throttled[-1][1]
+        self.send_response(429)
+        self.send_header("Retry-After", str(retry_after))
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+        return True
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    httpd.requests = []
+    httpd.cut_after = {}
+    httpd.lock = threading.Lock()
+    httpd.window = {"start": time.monotonic(), "count": 0}
+    httpd.throttled = []
+    httpd.arrivals = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def url(server, path):
+    return "http://127.0.0.1:{}{}".format(server.server_port, path)
+
+
+def test_identical_content_is_stored_once(tmp_path, server):
+    downloader = ExternalResourceDownloader(tmp_path)
+    paths = [downloader.download_file(url(server, p)) for p in RESOURCES]
+    assert all(paths)
+    assert len(set(paths)) == 3
+
+    files = [tmp_path / p for p in paths]
+    assert [f.read_bytes() for f in files] == list(RESOURCES.values())
+    assert os.path.samefile(files[0], files[1])
+    assert not os.path.samefile(files[0], files[2])
+    assert downloader.stats["total_deduplicated"] == 1
+
+    # the index maps the urls of the next run to the files without requests
+    downloader.save_index()
+    assert (tmp_path / "external_resources" / INDEX_FILE).is_file()
+    downloader = ExternalResourceDownloader(tmp_path)
+    assert [downloader.download_file(url(server, p)) for p in RESOURCES] == paths
+    assert len(server.requests) == 3
+
+
+def test_interrupted_download_is_resumed(tmp_path, server):
+    path = "/other/dog.png"
+    server.cut_after[path] = 100000
+    downloader = ExternalResourceDownloader(tmp_path)
+    local_path = downloader.download_file(url(server, path))
+
+    assert (tmp_path / local_path).read_bytes() == RESOURCES[path]
+    # the first complete chunk was kept
+    assert server.requests == [(path, None), (path, "bytes={}-".format(downloader_module.MIN_CHUNK_SIZE))]
+    assert os.listdir(tmp_path / "external_resources") == [os.path.basename(local_path)]
+
+
+def test_throttled_downloads(tmp_path, server, monkeypatch):
+    messages = [FakeMessage(url(server, "/throttled/{}.png".format(i))) for i in range(12)]
+    downloader = ExternalResourceDownloader(tmp_path)
+    started = time.monotonic()
+    assert downloader.download_all_resources(messages) == (12, 12)
+
+    # every 429 paused the host for its Retry-After, and the run took about
+    # as long as the rate limit requires
+    assert 1 <= len(server.throttled) <= 2 * downloader.max_workers
+    for throttled_at, retry_after in server.throttled:
+        assert not [t for t in server.arrivals if throttled_at + 0.1 < t < throttled_at + retry_after - 0.1]
+    assert time.monotonic() - started < 5
+    assert downloader.stats["total_failed"] == 0
+
+
+class FakeMessage(object):
+    _DEFAULT_USER_ICON_SIZE = 72
+    attachments = []
+    files = []
+
+    def __init__(self, img):
+        self.img = img
+
+
+def test_thumbnails(tmp_path, server):
+    Image = pytest.importorskip("PIL.Image")
+    for name, width in [("/images/big.png", 300), ("/images/small.png", 50)]:
+        body = io.BytesIO()
+        Image.new("RGB", (width, width // 2), "red").save(body, "PNG")
+        RESOURCES[name] = body.getvalue()
+    try:
+        downloader = ExternalResourceDownloader(tmp_path, thumbnails=True)
+        big, small = url(server, "/images/big.png"), url(server, "/images/small.png")
+        downloader.download_all_resources([FakeMessage(big), FakeMessage(small)])
+    finally:
+        del RESOURCES["/images/big.png"], RESOURCES["/images/small.png"]
+
+    thumbnail = downloader.get_local_path(big, 72)
+    assert thumbnail.startswith(os.path.join("external_resources", "thumbnails"))
+    with Image.open(tmp_path / thumbnail) as image:
+        assert image.size == (72, 36)
+    # images already small enough are used as they are
+    assert downloader.get_local_path(small, 72) == downloader.get_local_path(small)
@@ -0,0 +1,51 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+
+# modules the entry points must not import before a command needs them
+HEAVY_MODULES = ["emoji", "flask", "flask_frozen", "jinja2", "markdown2", "requests", "werkzeug"]
+
+# generous, the import of the entry points takes about 50ms without the
+# heavy modules and several times that with them
+BUDGET_SECONDS = 0.5
+
+SCRIPT = """
+import json, sys
+import {module} as entry
+try:
+    entry.{command}({args}, standalone_mode=False)
+except SystemExit:
+    pass
+print(json.dumps(sorted(m for m in {heavy} if m in sys.modules)))
+"""
+
+
+def _run(module, command, args):
+    script = SCRIPT.format(module=module, command=command, args=args, heavy=HEAVY_MODULES)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", script],
+        capture_output=True, text=True, check=True,
+    )
+    # "import time: self [us] | cumulative | imported package"
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, total, name = line.split("|")
+            if total.strip().isdigit():
+                cumulative[name.strip()] = int(total) / 1e6
+    return json.loads(result.stdout.splitlines()[-1]), cumulative[module]
+
+
+@pytest.mark.parametrize("module, command, args", [
+    ("slackviewer.cli", "cli", ["--help"]),
+    ("slackviewer.cli", "cli", ["export", "--help"]),
+    ("slackviewer.cli", "cli", ["clean"]),
+    ("slackviewer.main", "main", ["--help"]),
+])
+def test_entry_point_imports(module, command, args):
+    loaded, seconds = _run(module, command, args)
+    assert loaded == []
+    assert seconds < BUDGET_SECONDS
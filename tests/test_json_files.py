@@ -0,0 +1,15 @@
+import json
+
+from slackviewer.utils import json_files
+
+
+def test_load_json(tmp_path, monkeypatch):
+    path = tmp_path / "2020-01-01.json"
+    messages = [{"ts": "1577836800.000100", "text": "café \U0001f600", "big": 2 ** 70}]
+    path.write_text(json.dumps(messages, ensure_ascii=False), encoding="utf-8")
+    assert json_files.load_json(str(path)) == messages
+
+    monkeypatch.setattr(json_files, "MMAP_MIN_SIZE", 0)
+    assert json_files.load_json(str(path)) == messages
+    monkeypatch.setattr(json_files, "orjson", None)
+    assert json_files.load_json(str(path)) == messages
@@ -0,0 +1,98 @@
+import shutil
+
+import pytest
+
+from slackviewer import archive
+from slackviewer.app import app
+from slackviewer.config import Config
+from slackviewer.main import configure_multi_app
+from slackviewer.multi import find_archives
+
+
+@pytest.fixture
+def archives(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "SLACKVIEWER_TEMP_PATH", str(tmp_path / "cache"))
+    directory = tmp_path / "exports"
+    directory.mkdir()
+    shutil.copy("tests/testarchive.zip", directory / "2024 Q1.zip")
+    shutil.copy("tests/testarchive.zip", directory / "2024-q2.zip")
+    (directory / "notes.txt").write_text("not an archive")
+    return directory
+
+
+@pytest.fixture
+def client(archives, monkeypatch):
+    # restored after the test, configure_multi_app replaces them
+    monkeypatch.setattr(app, "wsgi_app", app.wsgi_app)
+    monkeypatch.setattr(app, "archives", None)
+    configure_multi_app(app, Config({
+        "archive": str(archives),
+        "multi": True,
+        "max_loaded_archives": 1,
+        "show_dms": True,
+        "thread_note": True,
+        "debug": False,
+        "no_sidebar": False,
+        "no_external_references": False,
+    }))
+    return app.test_client()
+
+
+def test_find_archives(archives):
+    (archives / "static.zip").write_bytes(b"")
+    (archives / "2024_q2").mkdir()
+    (archives / "2024_q2" / "users.json").write_text("[]")
+    assert list(find_archives(str(archives))) == ["2024-q1", "2024-q2", "2024-q2-2", "static-2"]
+
+
+def test_multi_archive_mode(client):
+    index = client.get("/")
+    assert b'href="/2024-q1/"' in index.data and b'href="/2024-q2/"' in index.data
+    assert client.get("/channel/general/").status_code == 404
+    assert client.get("/2024-q1").headers["Location"].endswith("/2024-q1/")
+
+    page = client.get("/2024-q1/")
+    assert page.status_code == 200
+    assert b'href="/2024-q1/channel/' in page.data
+    assert b'href="/2024-q1/static/viewer.css"' in page.data
+    assert client.get("/2024-q1/static/viewer.css").status_code == 200
+    assert app.archives.loaded() == ["2024-q1"]
+
+    q1 = app.archives.get("2024-q1")
+    assert client.get("/2024-q2/").status_code == 200
+    # only one archive stays loaded, its users are shared with the other one
+    assert app.archives.loaded() == ["2024-q2"]
+    q2 = app.archives.get("2024-q2")
+    name = next(iter(q1.channels))
+    assert q1.channels[name][0].user is q2.channels[name][0].user
+
+
+def test_failed_load_is_retried(client, monkeypatch):
+    from slackviewer import multi
+
+    def broken(config, users=None):
+        raise ValueError("broken export")
+
+    with monkeypatch.context() as m:
+        m.setattr(multi, "load_archive", broken)
+        with pytest.raises(ValueError):
+            app.archives.get("2024-q1")
+    assert app.archives._loading == {}
+    assert app.archives.get("2024-q1").channels
+
+
+def test_archive_resolved_once_per_request(client, monkeypatch):
+    lookups = []
+    get = app.archives.get
+
+    def counting(slug):
+        lookups.append(slug)
+        return get(slug)
+    monkeypatch.setattr(app.archives, "get", counting)
+
+    channel = next(iter(app.archives.get("2024-q1").channels))
+    lookups.clear()
+    # the page, its message index and the Last-Modified of the cached page
+    response = client.get("/2024-q1/channel/{}/".format(channel))
+    assert response.status_code == 200 and response.last_modified
+    assert lookups == ["2024-q1"]
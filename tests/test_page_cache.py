@@ -0,0 +1,55 @@
+import gzip
+
+import flask
+import pytest
+
+from slackviewer import archive
+from slackviewer.app import app
+from slackviewer.config import Config
+from slackviewer.main import configure_app
+from slackviewer.utils.page_cache import page_cache
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "SLACKVIEWER_TEMP_PATH", str(tmp_path))
+    configure_app(app, Config({
+        "archive": "tests/testarchive.zip",
+        "show_dms": True,
+        "thread_note": True,
+        "debug": False,
+        "no_sidebar": False,
+        "no_external_references": False,
+    }))
+    return app.test_client()
+
+
+def test_cached_page(client):
+    name = next(iter(flask._app_ctx_stack.channels))
+    url = f"/channel/{name}/"
+
+    first = client.get(url)
+    assert first.status_code == 200
+    assert first.headers["Vary"] == "Accept-Encoding"
+    etag = first.headers["ETag"]
+
+    second = client.get(url)
+    assert second.data == first.data
+    assert second.headers["ETag"] == etag
+
+    not_modified = client.get(url, headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not not_modified.data
+
+    compressed = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert compressed.headers["ETag"] != etag
+    assert gzip.decompress(compressed.data) == first.data
+
+
+def test_cache_cleared_on_configure(client):
+    client.get("/")
+    generation = page_cache.generation
+    configure_app(app, Config({"archive": "tests/testarchive.zip", "debug": False}))
+    assert page_cache.generation == generation + 1
+    assert page_cache.get(("", "/", b"")) is None
@@ -0,0 +1,32 @@
+from slackviewer.pagination import MessageIndex
+
+
+class FakeMessage(object):
+
+    def __init__(self, ts, is_thread_msg=False):
+        self._message = {"ts": ts}
+        self.is_thread_msg = is_thread_msg
+
+
+def test_pages_keep_threads_and_equal_timestamps():
+    messages = [
+        FakeMessage("1.000000"),
+        FakeMessage("2.000000"),
+        FakeMessage("2.500000", is_thread_msg=True),
+        FakeMessage("3.000000"),
+        FakeMessage("3.000000"),
+        FakeMessage("4.000000"),
+    ]
+    index = MessageIndex(messages)
+
+    page, before = index.page(limit=2)
+    # both messages with ts 3 are on the first page
+    assert page == messages[3:]
+    assert before == "3.000000"
+
+    page, before = index.page(float(before), limit=1)
+    assert page == messages[1:3]
+
+    page, before = index.page(float(before), limit=1)
+    assert page == messages[:1]
+    assert before is None
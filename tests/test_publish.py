@@ -0,0 +1,95 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from slackviewer import archive
+from slackviewer.config import Config
+from slackviewer.formatter import SlackFormatter
+from slackviewer.message import Message
+from slackviewer.publish import PublishError, PublishState, Publisher, plan
+from slackviewer.reader import Reader
+from slackviewer.utils.scheduler import Scheduler
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        card = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        answer = self.server.answers.pop(0) if self.server.answers else (200, "1")
+        if answer[0] == 200 and answer[1] == "1":
+            self.server.cards.append(card)
+        body = answer[1].encode()
+        self.send_response(answer[0])
+        if answer[0] == 429:
+            self.send_header("Retry-After", "0")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def webhook():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), WebhookHandler)
+    server.cards = []
+    server.answers = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _publish(state, server):
+    url = "http://127.0.0.1:{}/webhook".format(server.server_port)
+    publisher = Publisher(state, url, limits=((1, 1000),), scheduler=Scheduler(rate=1000, burst=100),
+                          sleep=lambda seconds: None)
+    return publisher.run(max_attempts=3)
+
+
+def test_publish_resumes_and_skips_sent_messages(tmp_path, monkeypatch, webhook):
+    monkeypatch.setattr(archive, "SLACKVIEWER_TEMP_PATH", str(tmp_path / "cache"))
+    reader = Reader(Config({"archive": "tests/testarchive.zip"}))
+    channels = dict(reader.iter_channels(["enrique"]))
+    messages = channels["enrique"]
+
+    state = PublishState(str(tmp_path / "state.sqlite3"))
+    assert plan(state, "#enrique", "channel/enrique", messages, batch_size=4) == len(messages)
+    batches = (len(messages) + 3) // 4
+    assert state.stats() == (0, batches)
+
+    # throttled (also the 200 answer Teams sends instead of 429), then accepted, then a hard error
+    webhook.answers = [(429, ""), (200, "Webhook message delivery failed with error: HTTP error 429"),
+                       (200, "1"), (400, "Bad payload")]
+    with pytest.raises(PublishError):
+        _publish(state, webhook)
+    assert len(webhook.cards) == 1
+    assert state.stats() == (1, batches - 1)
+
+    # a new run neither queues nor sends anything twice
+    state = PublishState(str(tmp_path / "state.sqlite3"))
+    assert plan(state, "#enrique", "channel/enrique", messages, batch_size=4) == 0
+    assert _publish(state, webhook) == batches - 1
+    sections = [s for card in webhook.cards for s in card["sections"]]
+    assert [s["activityTitle"] for s in sections] == [
+        "{}**{}** ({})".format("↳ " if m.is_thread_msg else "", m.username, m.time) for m in messages]
+    assert all(card["@type"] == "MessageCard" and card["title"] == "#enrique" for card in webhook.cards)
+
+
+def test_plan_skips_repeated_and_missing_ts(tmp_path):
+    formatter = SlackFormatter({}, {})
+    messages = [Message(formatter, m, "C1", "acme") for m in (
+        {"text": "first", "ts": "1459220000.000001"},
+        {"text": "no ts"},
+        {"text": "first again", "ts": "1459220000.000001"},
+        {"text": "second", "ts": "1459220001.000001"},
+    )]
+
+    state = PublishState(str(tmp_path / "state.sqlite3"))
+    assert plan(state, "#general", "channel/general", messages, batch_size=1, legacy=set(), file_urls={}) == 2
+    assert state.known("channel/general") == {"1459220000.000001", "1459220001.000001"}
+    assert plan(state, "#general", "channel/general", messages) == 0
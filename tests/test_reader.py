@@ -0,0 +1,34 @@
+import json
+
+from slackviewer.config import Config
+from slackviewer.reader import Reader
+
+
+def test_sidebar_conversations_without_reading_messages(tmp_path):
+    def write(name, data):
+        path = tmp_path / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(json.dumps(data))
+
+    write("users.json", [
+        {"id": "U1", "name": "ada", "real_name": "Ada Lovelace"},
+        {"id": "U2", "name": "bob"},
+    ])
+    write("channels.json", [])
+    write("dms.json", [{"id": "D1", "members": ["U1", "U2"]}, {"id": "D2", "members": ["U1", "U3"]}])
+    write("mpims.json", [
+        {"id": "G1", "name": "mpdm-ada--bob-1", "members": ["U1", "U2"]},
+        {"id": "G2", "name": "mpdm-ada--bob-2", "members": ["U1", "U2"]},
+    ])
+    # not valid JSON, listing the conversations must not read it
+    (tmp_path / "D1").mkdir()
+    (tmp_path / "D1" / "2020-01-01.json").write_text("[")
+    (tmp_path / "D2").mkdir()
+    (tmp_path / "mpdm-ada--bob-1").mkdir()
+    (tmp_path / "mpdm-ada--bob-1" / "2020-01-01.json").write_text("[")
+
+    reader = Reader(Config({"archive": str(tmp_path)}))
+    assert reader.conversation_index() == {"D1", "mpdm-ada--bob-1"}
+    assert [(d["id"], d["names"]) for d in reader.compile_dm_users()] == [("D1", ["Ada Lovelace", "bob"])]
+    assert [(m["name"], m["names"]) for m in reader.compile_mpim_users()] == [
+        ("mpdm-ada--bob-1", ["Ada Lovelace", "bob"])]
@@ -0,0 +1,58 @@
+from datetime import datetime, timezone
+
+from slackviewer.utils.scheduler import Scheduler, TokenBucket, parse_retry_after
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_parse_retry_after():
+    now = datetime(2024, 1, 1, 12, 0, 0, tzinfo=timezone.utc)
+    assert parse_retry_after("7") == 7
+    assert parse_retry_after("Mon, 01 Jan 2024 12:00:30 GMT", now) == 30
+    assert parse_retry_after("Mon, 01 Jan 2024 11:00:00 GMT", now) == 0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+
+def test_token_bucket():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=10, burst=2, clock=clock)
+    assert bucket.take() == 0
+    assert bucket.take() == 0
+    assert abs(bucket.take() - 0.1) < 1e-9
+    clock.now += 0.2
+    assert bucket.take() == 0
+
+
+def test_aimd_and_retry_after():
+    clock = FakeClock()
+    scheduler = Scheduler(burst=100, max_concurrency=8, clock=clock)
+    url = "https://files.slack.com/files-pri/T1-F1/a.png"
+
+    for _ in range(20):
+        with scheduler.slot(url):
+            pass
+    assert scheduler.concurrency(url) == 6
+
+    # answers to requests started before the decrease do not decrease again
+    first, second = scheduler.slot(url), scheduler.slot(url)
+    for context in (first, second):
+        slot = context.__enter__()
+        slot.throttle(retry_after=5)
+    for context in (first, second):
+        context.__exit__(None, None, None)
+    assert scheduler.concurrency(url) == 3
+
+    # the host is paused, retries wait for the slot instead of backing off
+    assert scheduler.backoff(url, 3) == 0
+    clock.now += 5
+    assert 0 <= scheduler.backoff(url, 3) <= scheduler.base_delay * 8
+    # other hosts are independent
+    assert scheduler.concurrency("https://a.slack-edge.com/x.png") == 2
@@ -0,0 +1,63 @@
+import gc
+
+import flask
+import pytest
+
+from slackviewer import server
+
+
+@pytest.fixture
+def gc_state():
+    enabled = gc.isenabled()
+    yield
+    gc.unfreeze()
+    if enabled:
+        gc.enable()
+    else:
+        gc.disable()
+
+
+def test_serve_falls_back_to_one_process(monkeypatch, gc_state):
+    app = flask.Flask(__name__)
+    app.debug = True
+    runs = []
+    monkeypatch.setattr(app, "run", lambda host, port: runs.append((host, port, gc.isenabled())))
+
+    gc.disable()
+    server.serve(app, "127.0.0.1", 5000, workers=4)
+    # the collector disabled for the workers is on again
+    assert runs == [("127.0.0.1", 5000, True)]
+
+
+def test_serve_respawns_workers_with_backoff(monkeypatch, gc_state):
+    app = flask.Flask("slackviewer")
+    clock = [0.0]
+    pids = iter(range(100, 200))
+    # worker 100 keeps running, the replacements of 101 die right away twice,
+    # then one dies after running for a while
+    exits = iter([(101, 1.0), (102, 1.0), (103, 60.0), (104, None)])
+    sleeps, killed = [], []
+
+    def wait():
+        pid, uptime = next(exits)
+        if uptime is None:
+            raise KeyboardInterrupt
+        clock[0] += uptime
+        return pid, 256
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        clock[0] += seconds
+
+    monkeypatch.setattr(server.os, "fork", lambda: next(pids))
+    monkeypatch.setattr(server.os, "wait", wait)
+    monkeypatch.setattr(server.os, "kill", lambda pid, signum: killed.append(pid))
+    monkeypatch.setattr(server.os, "waitpid", lambda pid, options: (pid, 0))
+    monkeypatch.setattr(server.signal, "signal", lambda signum, handler: None)
+    monkeypatch.setattr(server.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(server.time, "sleep", sleep)
+
+    server.serve(app, "127.0.0.1", 0, workers=2)
+    assert sleeps == [server.RESPAWN_DELAY, server.RESPAWN_DELAY * 2]
+    # the started workers that did not exit are terminated
+    assert sorted(killed) == [100, 104]
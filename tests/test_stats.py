@@ -0,0 +1,39 @@
+import datetime
+import json
+import zipfile
+from collections import Counter
+
+from slackviewer import archive
+from slackviewer.config import Config
+from slackviewer.reader import Reader
+from slackviewer.stats import compute_stats
+
+
+def _raw_messages():
+    with zipfile.ZipFile("tests/testarchive.zip") as z:
+        return [m for name in z.namelist() if name.count("/") == 1 and name.endswith(".json")
+                for m in json.loads(z.read(name))]
+
+
+def test_compute_stats(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "SLACKVIEWER_TEMP_PATH", str(tmp_path))
+    reader = Reader(Config({"archive": "tests/testarchive.zip"}))
+    channels = reader.compile_channels()
+    stats = compute_stats(channels, {}, {}, {})
+
+    raw = _raw_messages()
+    assert stats["total_messages"] == len(raw)
+    assert stats["total_messages"] == sum(c["messages"] for c in stats["conversations"])
+    assert {c["name"]: c["messages"] for c in stats["conversations"]} == {k: len(v) for k, v in channels.items()}
+
+    assert stats["total_files"] == sum(len(m.get("files") or ([m["file"]] if "file" in m else [])) for m in raw)
+
+    senders = Counter(m.get("user") or m.get("bot_id") for m in raw)
+    senders.pop(None, None)
+    assert stats["total_users"] == len(senders)
+    assert [p["messages"] for p in stats["top_posters"]] == sorted(senders.values(), reverse=True)
+
+    days = Counter(datetime.datetime.fromtimestamp(float(m["ts"]), datetime.timezone.utc).strftime("%Y-%m-%d")
+                   for m in raw)
+    assert {d["day"]: d["messages"] for d in stats["messages_per_day"]} == dict(days)
+    assert stats["busiest_day"]["messages"] == max(days.values())
@@ -0,0 +1,55 @@
+import os
+
+from jinja2 import DictLoader, Environment
+
+from slackviewer import templating
+from slackviewer.formatter import SlackFormatter
+from slackviewer.message import Message
+
+
+def test_message_msg_is_rendered_once(monkeypatch):
+    message = Message(SlackFormatter({}, {}), {"text": "hello *world*", "ts": "1459220000.000001"}, "C1", "acme")
+    rendered = []
+    render_msg = Message._render_msg
+
+    def counting(self):
+        rendered.append(self)
+        return render_msg(self)
+    monkeypatch.setattr(Message, "_render_msg", counting)
+
+    assert message.msg == message.msg
+    assert "world" in message.msg
+    assert len(rendered) == 1
+
+
+def test_bytecode_cache_namespaces(tmp_path, monkeypatch):
+    monkeypatch.setattr(templating, "JINJA_CACHE_PATH", str(tmp_path / "jinja_cache"))
+    loader = DictLoader({"page.html": "{{ text }}"})
+
+    def render(namespace, autoescape):
+        env = Environment(loader=loader, autoescape=autoescape, bytecode_cache=templating.bytecode_cache(namespace))
+        return env.get_template("page.html").render(text="<b>")
+
+    # nothing is created before a template is compiled
+    templating.bytecode_cache("viewer")
+    assert not os.path.exists(templating.JINJA_CACHE_PATH)
+
+    assert render("viewer", True) == "&lt;b&gt;"
+    assert render("export", False) == "<b>"
+    # same template source, the code compiled with autoescape is not reused
+    assert render("viewer", True) == "&lt;b&gt;"
+    assert render("export", False) == "<b>"
+    names = sorted(os.listdir(templating.JINJA_CACHE_PATH))
+    assert [n.split("-")[0] for n in names] == ["export", "viewer"]
+    assert os.stat(templating.JINJA_CACHE_PATH).st_mode & 0o777 == 0o700
+
+
+def test_bytecode_cache_refuses_shared_directory(tmp_path, monkeypatch):
+    directory = tmp_path / "jinja_cache"
+    directory.mkdir()
+    directory.chmod(0o777)
+    monkeypatch.setattr(templating, "JINJA_CACHE_PATH", str(directory))
+
+    env = Environment(loader=DictLoader({"page.html": "{{ 1 + 1 }}"}), bytecode_cache=templating.bytecode_cache("viewer"))
+    assert env.get_template("page.html").render() == "2"
+    assert os.listdir(str(directory)) == []
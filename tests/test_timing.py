@@ -0,0 +1,66 @@
+import json
+import os
+
+import pytest
+from click.testing import CliRunner
+
+from slackviewer import archive
+from slackviewer.cli import cli
+from slackviewer.utils.timing import PhaseTimer, timer
+
+
+@pytest.fixture
+def reset_timer():
+    yield
+    timer.reset()
+
+
+def test_phase_timer_nesting_and_counts(tmp_path):
+    phases = PhaseTimer()
+
+    @phases.timed("load", lambda result: {"messages": len(result)})
+    def load(n):
+        with phases.phase("parse", files=1):
+            return list(range(n))
+
+    # disabled, nothing is recorded
+    load(3)
+    assert phases.report()["phases"] == []
+
+    phases.enable(str(tmp_path / "profiles"))
+    with phases.phase("outer", files=2) as outer:
+        load(3)
+        load(4)
+        outer.count(files=1)
+
+    records = {r["name"]: r for r in phases.report()["phases"]}
+    assert list(records) == ["outer", "load", "parse"]
+    assert [records[n]["calls"] for n in records] == [1, 2, 2]
+    assert records["outer"]["counts"] == {"files": 3}
+    assert records["load"]["counts"] == {"messages": 7}
+    assert records["parse"]["counts"] == {"files": 2}
+    # times of nested phases are included in the enclosing ones
+    assert records["outer"]["wall_s"] >= records["load"]["wall_s"] >= records["parse"]["wall_s"]
+
+    phases.write_report(None)
+    assert sorted(os.listdir(str(tmp_path / "profiles"))) == ["load.prof", "outer.prof", "parse.prof"]
+
+
+def test_timings_report(tmp_path, monkeypatch, reset_timer):
+    monkeypatch.setattr(archive, "SLACKVIEWER_TEMP_PATH", str(tmp_path / "cache"))
+    monkeypatch.chdir(tmp_path)
+    testarchive = os.path.join(os.path.dirname(__file__), "testarchive.zip")
+
+    result = CliRunner().invoke(cli, ["export", "--timings", "timings.json", testarchive])
+    assert result.exit_code == 0, result.output
+    with open(tmp_path / "timings.json") as f:
+        report = json.load(f)
+
+    assert set(report) == {"total_wall_s", "peak_rss_kb", "phases"}
+    phases = {p["name"]: p for p in report["phases"]}
+    assert {"extract_archive", "archive_hash", "extract_members", "render", "parse_day_files"} <= set(phases)
+    for phase in report["phases"]:
+        assert set(phase) == {"name", "calls", "wall_s", "cpu_s", "peak_rss_kb", "counts"}
+        assert phase["calls"] >= 1 and phase["wall_s"] >= 0
+    assert phases["extract_members"]["counts"]["files"] > 0
+    assert phases["parse_day_files"]["counts"]["messages"] == 158
@@ -0,0 +1,55 @@
+import json
+import os
+import zipfile
+
+import pytest
+
+from slackviewer.app import app
+from slackviewer.config import Config
+from slackviewer.main import _install_archive, configure_app
+from slackviewer.watch import ArchiveWatcher
+
+
+@pytest.fixture
+def export(tmp_path):
+    directory = tmp_path / "export"
+    with zipfile.ZipFile("tests/testarchive.zip") as z:
+        z.extractall(directory)
+    return directory
+
+
+def _append_message(path, text):
+    with open(path) as f:
+        messages = json.load(f)
+    messages.append(dict(messages[-1], text=text, ts="1459220000.000001"))
+    with open(path, "w") as f:
+        json.dump(messages, f)
+    # a later mtime even on file systems with coarse timestamps
+    os.utime(path, ns=(os.stat(path).st_mtime_ns + 10 ** 9,) * 2)
+
+
+def test_watch_reloads_changed_conversations(export):
+    config = Config({
+        "archive": str(export),
+        "watch": True,
+        "show_dms": True,
+        "thread_note": True,
+        "debug": False,
+        "no_sidebar": False,
+        "no_external_references": False,
+    })
+    configure_app(app, config)
+    client = app.test_client()
+    before = app.archive
+    assert b"freshly appended" not in client.get("/channel/enrique/").data
+
+    watcher = ArchiveWatcher(config, app.archive, lambda archive: _install_archive(app, archive))
+    _append_message(export / "enrique" / "2016-03-28.json", "freshly appended")
+    # applied once the directory did not change for one interval
+    assert watcher.check() is None
+    assert watcher.check() is app.archive
+
+    assert b"freshly appended" in client.get("/channel/enrique/").data
+    assert app.archive.channels["traveling-sailor"] is before.channels["traveling-sailor"]
+    assert len(app.archive.channels["enrique"]) == len(before.channels["enrique"]) + 1
+    assert watcher.check() is None